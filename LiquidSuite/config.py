@@ -2,6 +2,7 @@
 LSuite Configuration - WITH OFFLINE/ONLINE MODE SUPPORT
 """
 import os
+import tempfile
 from datetime import timedelta
 from pathlib import Path
 
@@ -65,6 +66,26 @@ class Config:
     # Upload settings
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     
+    # PDF text extraction processes per document (0 = one per CPU core)
+    PDF_EXTRACT_WORKERS = int(os.environ.get('PDF_EXTRACT_WORKERS', 1))
+    
+    # Extracted page text cache - re-parsing a statement skips PDF decryption (0 MB = disabled).
+    # Text of password-protected PDFs is stored encrypted with a key derived from the password.
+    PDF_TEXT_CACHE_DIR = os.environ.get('PDF_TEXT_CACHE_DIR') or str(Path(__file__).parent / 'data' / 'pdf_text_cache')
+    PDF_TEXT_CACHE_MAX_BYTES = int(os.environ.get('PDF_TEXT_CACHE_MAX_MB', 64)) * 1024 * 1024
+    
+    # Content-addressed store for statement and document PDFs
+    BLOB_STORE_BACKEND = os.environ.get('BLOB_STORE_BACKEND') or 'local'
+    BLOB_STORE_DIR = os.environ.get('BLOB_STORE_DIR') or str(Path(__file__).parent / 'data' / 'blobs')
+    
+    # Gmail import - mailboxes imported in parallel, and the per-mailbox
+    # quota budget (Gmail allows 250 units per user per second, 0 = unlimited)
+    GMAIL_IMPORT_WORKERS = int(os.environ.get('GMAIL_IMPORT_WORKERS', 4))
+    GMAIL_QUOTA_UNITS_PER_SECOND = int(os.environ.get('GMAIL_QUOTA_UNITS_PER_SECOND', 250))
+    
+    # Built Gmail API clients are cached for this many credentials
+    GMAIL_SERVICE_CACHE_SIZE = int(os.environ.get('GMAIL_SERVICE_CACHE_SIZE', 32))
+    
     # Pagination
     ITEMS_PER_PAGE = 50
     
@@ -111,6 +132,15 @@ class TestConfig(Config):
     # Disable external services in tests
     CELERY_TASK_ALWAYS_EAGER = True
     CELERY_TASK_EAGER_PROPAGATES = True
+    
+    # Keep parser tests independent of earlier runs
+    PDF_TEXT_CACHE_MAX_BYTES = 0
+    
+    # Blobs are content-addressed, so runs can share a directory outside the tree
+    BLOB_STORE_DIR = os.path.join(tempfile.gettempdir(), 'lsuite_test_blobs')
+    
+    # Fake mailboxes have no quota to respect
+    GMAIL_QUOTA_UNITS_PER_SECOND = 0
 
 
 # Update config dictionary
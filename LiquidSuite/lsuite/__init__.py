@@ -108,6 +108,18 @@ def register_cli_commands(app):
     from lsuite.utils.db_checker import register_db_commands
     register_db_commands(app)
 
+    from lsuite.utils.batch_parser import register_batch_commands
+    register_batch_commands(app)
+
+    from lsuite.gmail.ingest import register_ingest_commands
+    register_ingest_commands(app)
+
+    from lsuite.utils.blob_store import register_blob_commands
+    register_blob_commands(app)
+
+    from lsuite.utils.daily_rollup import register_rollup_commands
+    register_rollup_commands(app)
+
 
 def auto_create_missing_tables(app):
     """Automatically create missing tables on startup"""
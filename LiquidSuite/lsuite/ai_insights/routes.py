@@ -3,13 +3,14 @@ AI Insights Routes - Fixed import path
 """
 from flask import render_template, request, jsonify
 from flask_login import login_required, current_user
-from sqlalchemy import func, extract
 from datetime import datetime, timedelta
 from collections import defaultdict
 from lsuite.ai_insights import ai_insights_bp
+from lsuite.insights import queries
 from lsuite.extensions import db
 from lsuite.models import BankTransaction, TransactionCategory, ERPNextSyncLog
 from lsuite.ai_insights.ai_service import get_ai_service  # FIXED: Correct import path
+from lsuite.utils.daily_rollup import period_totals, category_totals, uncategorized_totals, monthly_totals
 import calendar
 import logging
 
@@ -24,97 +25,37 @@ def dashboard():
     days = request.args.get('days', 90, type=int)
     start_date = datetime.now() - timedelta(days=days)
     
-    transactions = BankTransaction.query.filter(
-        BankTransaction.user_id == current_user.id,
-        BankTransaction.date >= start_date.date()
-    ).all()
-    
     # Top suppliers
-    supplier_stats = defaultdict(lambda: {'count': 0, 'total': 0})
-    for t in transactions:
-        if t.withdrawal and t.withdrawal > 0:
-            desc = t.description[:50]
-            supplier_stats[desc]['count'] += 1
-            supplier_stats[desc]['total'] += float(t.withdrawal)
-    
-    top_suppliers = sorted(
-        [{'name': k, 'count': v['count'], 'total': v['total']} 
-         for k, v in supplier_stats.items()],
-        key=lambda x: x['count'],
-        reverse=True
-    )[:10]
+    top_suppliers = queries.top_suppliers(current_user.id, start_date.date())
     
     # Recurring transactions
-    recurring = defaultdict(lambda: {'count': 0, 'amounts': []})
-    for t in transactions:
-        desc = t.description[:50]
-        recurring[desc]['count'] += 1
-        recurring[desc]['amounts'].append(float(t.withdrawal or t.deposit or 0))
-    
-    recurring_transactions = [
-        {
-            'description': k,
-            'count': v['count'],
-            'avg_amount': sum(v['amounts']) / len(v['amounts']),
-            'total': sum(v['amounts'])
-        }
-        for k, v in recurring.items() if v['count'] >= 3
-    ]
-    recurring_transactions = sorted(recurring_transactions, key=lambda x: x['count'], reverse=True)[:10]
+    recurring_transactions = queries.recurring_transactions(current_user.id, start_date.date())
     
     # Category breakdown
-    category_stats = db.session.query(
-        TransactionCategory.name,
-        func.count(BankTransaction.id).label('count'),
-        func.sum(BankTransaction.withdrawal).label('expenses'),
-        func.sum(BankTransaction.deposit).label('income')
-    ).join(
-        BankTransaction
-    ).filter(
-        BankTransaction.user_id == current_user.id,
-        BankTransaction.date >= start_date.date()
-    ).group_by(
-        TransactionCategory.name
-    ).all()
-    
     categories = [
         {
             'name': c.name,
-            'count': c.count,
+            'count': int(c.count),
             'expenses': float(c.expenses or 0),
             'income': float(c.income or 0)
         }
-        for c in category_stats
+        for c in category_totals(current_user.id, start_date.date())
     ]
     
     # Uncategorized
-    uncategorized_count = BankTransaction.query.filter(
-        BankTransaction.user_id == current_user.id,
-        BankTransaction.category_id == None,
-        BankTransaction.date >= start_date.date()
-    ).count()
+    uncategorized = uncategorized_totals(current_user.id, start_date.date())
+    uncategorized_count = uncategorized['count']
     
     # Monthly trends
-    monthly_data = db.session.query(
-        extract('year', BankTransaction.date).label('year'),
-        extract('month', BankTransaction.date).label('month'),
-        func.sum(BankTransaction.withdrawal).label('expenses'),
-        func.sum(BankTransaction.deposit).label('income'),
-        func.count(BankTransaction.id).label('count')
-    ).filter(
-        BankTransaction.user_id == current_user.id,
-        BankTransaction.date >= start_date.date()
-    ).group_by('year', 'month').order_by('year', 'month').all()
-    
     monthly_trends = [
         {
             'month': calendar.month_abbr[int(m.month)],
             'year': int(m.year),
             'expenses': float(m.expenses or 0),
             'income': float(m.income or 0),
-            'count': m.count
+            'count': int(m.count)
         }
-        for m in monthly_data
+        for m in monthly_totals(current_user.id, start_date.date())
     ]
     
     # ERPNext sync status
@@ -133,22 +74,38 @@ def dashboard():
     ).count()
     
     # Summary stats
-    total_expenses = sum(float(t.withdrawal or 0) for t in transactions)
-    total_income = sum(float(t.deposit or 0) for t in transactions)
-    total_transactions = len(transactions)
+    totals = period_totals(current_user.id, start_date.date())
+    total_expenses = totals['expenses']
+    total_income = totals['income']
+    total_transactions = totals['count']
     avg_transaction = (total_expenses + total_income) / total_transactions if total_transactions > 0 else 0
     
-    # Prepare AI analysis data
-    transaction_data = [{
-        'date': t.date.isoformat(),
-        'description': t.description,
-        'withdrawal': float(t.withdrawal or 0),
-        'deposit': float(t.deposit or 0),
-        'category': t.category.name if t.category else 'Uncategorized'
-    } for t in transactions]
-    
-    ai_service = get_ai_service()
-    summary = ai_service.prepare_transaction_summary(transaction_data)
+    # AI analysis summary, in the shape of AIService.prepare_transaction_summary
+    first_date, last_date = db.session.query(
+        db.func.min(BankTransaction.date),
+        db.func.max(BankTransaction.date)
+    ).filter(
+        BankTransaction.user_id == current_user.id,
+        BankTransaction.date >= start_date.date()
+    ).one()
+    category_breakdown = {
+        c['name']: {'count': c['count'], 'amount': c['expenses'] + c['income']}
+        for c in categories
+    }
+    if uncategorized_count:
+        category_breakdown['Uncategorized'] = {'count': uncategorized['count'], 'amount': uncategorized['total']}
+    summary = {
+        'total_transactions': total_transactions,
+        'total_expenses': total_expenses,
+        'total_income': total_income,
+        'net_cashflow': total_income - total_expenses,
+        'average_transaction': avg_transaction,
+        'categories': category_breakdown,
+        'date_range': {
+            'start': first_date.isoformat() if first_date else None,
+            'end': last_date.isoformat() if last_date else None
+        }
+    }
     
     return render_template('ai_insights/dashboard.html',
         days=days,
@@ -165,7 +122,6 @@ def dashboard():
         total_income=total_income,
         total_transactions=total_transactions,
         avg_transaction=avg_transaction,
-        transaction_data=transaction_data,
         transaction_summary=summary
     )
 
@@ -455,49 +411,25 @@ def categories():
     days = request.args.get('days', 90, type=int)
     start_date = datetime.now() - timedelta(days=days)
     
-    category_data = db.session.query(
-        TransactionCategory.id,
-        TransactionCategory.name,
-        TransactionCategory.transaction_type,
-        func.count(BankTransaction.id).label('count'),
-        func.sum(BankTransaction.withdrawal).label('expenses'),
-        func.sum(BankTransaction.deposit).label('income')
-    ).outerjoin(
-        BankTransaction
-    ).filter(
-        BankTransaction.user_id == current_user.id,
-        BankTransaction.date >= start_date.date()
-    ).group_by(
-        TransactionCategory.id,
-        TransactionCategory.name,
-        TransactionCategory.transaction_type
-    ).all()
-    
     categories_list = [
         {
             'id': c.id,
             'name': c.name,
             'type': c.transaction_type,
-            'count': c.count,
+            'count': int(c.count),
             'expenses': float(c.expenses or 0),
             'income': float(c.income or 0),
             'total': float(c.expenses or 0) + float(c.income or 0)
         }
-        for c in category_data
+        for c in category_totals(current_user.id, start_date.date())
     ]
     
-    uncategorized = BankTransaction.query.filter(
-        BankTransaction.user_id == current_user.id,
-        BankTransaction.category_id == None,
-        BankTransaction.date >= start_date.date()
-    ).all()
-    
-    uncategorized_total = sum(float(t.withdrawal or t.deposit or 0) for t in uncategorized)
+    uncategorized = uncategorized_totals(current_user.id, start_date.date())
     
     return render_template('ai_insights/categories.html',
         categories=categories_list,
-        uncategorized_count=len(uncategorized),
-        uncategorized_total=uncategorized_total,
+        uncategorized_count=uncategorized['count'],
+        uncategorized_total=uncategorized['total'],
         days=days
     )
 
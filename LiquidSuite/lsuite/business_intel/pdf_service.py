@@ -5,7 +5,7 @@ import re
 import logging
 from datetime import datetime
 from decimal import Decimal
-import PyPDF2
+from lsuite.utils.pdf_text import extract_text, map_file
 from lsuite.ai_insights.ai_service import get_ai_service
 
 logger = logging.getLogger(__name__)
@@ -14,17 +14,26 @@ logger = logging.getLogger(__name__)
 class DocumentExtractor:
     """Extract data from PDF invoices and purchase orders"""
     
-    def __init__(self):
+    def __init__(self, workers=1):
         self.ai_service = get_ai_service()
+        self.workers = workers
     
     def extract_from_pdf(self, pdf_path):
-        """Extract text and data from PDF"""
+        """Extract text and data from a PDF file, memory-mapped rather than read"""
         try:
-            with open(pdf_path, 'rb') as file:
-                reader = PyPDF2.PdfReader(file)
-                text = ""
-                for page in reader.pages:
-                    text += page.extract_text() + "\n"
+            with map_file(pdf_path) as pdf_data:
+                return self.extract_from_buffer(pdf_data)
+        except Exception as e:
+            logger.error(f"PDF extraction failed: {e}")
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    def extract_from_buffer(self, pdf_data):
+        """Extract text and data from PDF bytes, a memoryview or an mmap"""
+        try:
+            text = extract_text(pdf_data, workers=self.workers)
             
             # Try rule-based extraction first
             extracted = self._rule_based_extraction(text)
@@ -4,13 +4,15 @@ Business Intelligence Routes - Fixed with PostgreSQL storage
 import logging
 from datetime import datetime, timedelta
 from werkzeug.utils import secure_filename
-from flask import render_template, request, jsonify, redirect, url_for, flash
+from flask import render_template, request, jsonify, redirect, url_for, flash, current_app
 from flask_login import login_required, current_user
 from lsuite.business_intel import bi_bp
 from lsuite.extensions import db
 from lsuite.models import BankTransaction, UploadedDocument, DocumentTransaction, CashFlowForecast, BusinessStatement
 from lsuite.business_intel.pdf_service import DocumentExtractor
 from lsuite.business_intel.forecast_service import CashFlowForecaster
+from lsuite.utils.blob_store import get_blob_store, send_blob
+from lsuite.utils.daily_rollup import period_totals
 
 logger = logging.getLogger(__name__)
 
@@ -29,7 +31,7 @@ def dashboard():
     days = request.args.get('days', 90, type=int)
     start_date = datetime.now() - timedelta(days=days)
     
-    # Get transactions
+    # Transactions for the forecast and fee analysis
     transactions = BankTransaction.query.filter(
         BankTransaction.user_id == current_user.id,
         BankTransaction.date >= start_date.date()
@@ -40,9 +42,10 @@ def dashboard():
         user_id=current_user.id
     ).order_by(UploadedDocument.created_at.desc()).limit(20).all()
     
-    # Calculate summary stats
-    total_income = sum(float(t.deposit or 0) for t in transactions)
-    total_expenses = sum(float(t.withdrawal or 0) for t in transactions)
+    # Summary stats from the daily rollups
+    totals = period_totals(current_user.id, start_date.date())
+    total_income = totals['income']
+    total_expenses = totals['expenses']
     
     total_invoices = sum(
         float(d.total_amount) for d in documents 
@@ -116,14 +119,14 @@ def upload_document():
                 flash(f'File too large. Maximum size is {MAX_FILE_SIZE // (1024*1024)}MB', 'danger')
                 return redirect(request.url)
             
-            # Create document record with binary data
+            # Create document record - the PDF itself goes to the blob store
             try:
                 document = UploadedDocument(
                     user_id=current_user.id,
                     filename=filename,
                     document_type=doc_type,
                     file_size=file_size,
-                    file_data=file_data,  # Store in PostgreSQL
+                    file_sha256=get_blob_store(current_app).put(file_data),
                     total_amount=0,
                     processing_status='uploaded'
                 )
@@ -132,19 +135,9 @@ def upload_document():
                 
                 # Extract data
                 try:
-                    import tempfile
-                    import os
-                    
-                    # Create temporary file for extraction
-                    with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp:
-                        tmp.write(file_data)
-                        tmp_path = tmp.name
-                    
-                    extractor = DocumentExtractor()
-                    result = extractor.extract_from_pdf(tmp_path)
-                    
-                    # Clean up temp file
-                    os.unlink(tmp_path)
+                    # Extract from the bytes already in memory
+                    extractor = DocumentExtractor(workers=current_app.config.get('PDF_EXTRACT_WORKERS', 1))
+                    result = extractor.extract_from_buffer(file_data)
                     
                     if result['success']:
                         data = result['data']
@@ -222,7 +215,7 @@ def document_detail(id):
     
     # Get AI analysis
     try:
-        extractor = DocumentExtractor()
+        extractor = DocumentExtractor(workers=current_app.config.get('PDF_EXTRACT_WORKERS', 1))
         analysis = extractor.analyze_document_with_context(document, transactions)
     except Exception as e:
         logger.error(f"Analysis error: {e}")
@@ -242,7 +235,7 @@ def document_detail(id):
 @bi_bp.route('/documents/<int:id>/download')
 @login_required
 def download_document(id):
-    """Download original PDF from PostgreSQL"""
+    """Download original PDF from the blob store"""
     from flask import send_file
     import io
     
@@ -252,6 +245,11 @@ def download_document(id):
         flash('Unauthorized', 'danger')
         return redirect(url_for('business_intel.documents'))
     
+    store = get_blob_store(current_app)
+    if store.exists(document.file_sha256):
+        return send_blob(store, document.file_sha256, 'application/pdf', document.filename)
+    
+    # Documents uploaded before the blob store keep the PDF inline
     if not document.file_data:
         flash('File not found', 'danger')
         return redirect(url_for('business_intel.document_detail', id=id))
@@ -279,7 +277,7 @@ def analyze_document(id):
     ).order_by(BankTransaction.date.desc()).limit(100).all()
     
     try:
-        extractor = DocumentExtractor()
+        extractor = DocumentExtractor(workers=current_app.config.get('PDF_EXTRACT_WORKERS', 1))
         analysis = extractor.analyze_document_with_context(document, transactions)
         
         return jsonify({
@@ -0,0 +1,162 @@
+"""
+Balance Chain Ordering - Rebuild statement order from running balances
+Each row's opening balance (balance minus its own movement) is the previous
+row's closing balance, so rows are linked through a hash map keyed on cents
+"""
+import logging
+from bisect import bisect_left
+
+logger = logging.getLogger(__name__)
+
+
+class BalanceGap:
+    """A break in the balance chain - rows are missing or were misread here"""
+
+    __slots__ = ('after', 'before', 'missing_cents')
+
+    def __init__(self, after, before, missing_cents):
+        """
+        Args:
+            after: Last transaction before the break
+            before: First transaction after the break
+            missing_cents: Net movement of the rows that would close the break
+        """
+        self.after = after
+        self.before = before
+        self.missing_cents = missing_cents
+
+    def __repr__(self):
+        return f"<BalanceGap {self.after.date} -> {self.before.date} missing {self.missing_cents / 100:.2f}>"
+
+
+def _is_fee_row(main, row):
+    """Check whether row is the separate fee row emitted for main"""
+    return (
+        main.fee_cents > 0 and row.type == 'debit' and row.amount_cents == main.fee_cents
+        and row.balance_cents == main.balance_cents and row.date == main.date
+        and row.description.endswith(' (Fee)')
+    )
+
+
+def order_by_balance(transactions):
+    """
+    Order transactions by following the running balance
+
+    Rows are chained where a row's opening balance equals another's closing
+    balance. Openings are looked up in a dict keyed on cents, so ordering is
+    linear in the number of rows rather than a sort. When several rows could
+    follow (the balance returns to an earlier value), the earliest dated one
+    at or after the current date is taken, then statement order. A fee row
+    travels with the transaction it was charged on.
+
+    Chains that cannot be joined are laid out by date and each break is
+    reported as a BalanceGap - usually a row the parser missed or misread.
+    Statements without balances are simply ordered by date.
+
+    Args:
+        transactions: ParsedTransaction records in statement order
+
+    Returns:
+        (transactions newest first, list of BalanceGap in chronological order)
+    """
+    transactions = list(transactions)
+    if not any(trans.balance_cents for trans in transactions):
+        ordered = sorted(transactions, key=lambda trans: trans.date.toordinal(), reverse=True)
+        return ordered, []
+
+    # Links are kept as parallel lists of ints - one object per row would
+    # leave the cyclic garbage collector scanning them all on large statements
+    starts, days, openings, closings = [], [], [], []
+    count = len(transactions)
+    position = 0
+    while position < count:
+        main = transactions[position]
+        movement = main.amount_cents if main.type == 'credit' else -main.amount_cents
+        starts.append(position)
+        days.append(main.date.toordinal())
+        closings.append(main.balance_cents)
+        # The printed balance is after both the amount and its fee
+        openings.append(main.balance_cents - movement + main.fee_cents)
+        position += 2 if position + 1 < count and _is_fee_row(main, transactions[position + 1]) else 1
+    starts.append(count)
+
+    first_opening = {}
+    more_openings = {}
+    closing_counts = {}
+    for link, opening in enumerate(openings):
+        if opening in first_opening:
+            more_openings.setdefault(opening, []).append(link)
+        else:
+            first_opening[opening] = link
+        closing = closings[link]
+        closing_counts[closing] = closing_counts.get(closing, 0) + 1
+
+    visited = bytearray(len(openings))
+
+    # Rows sharing an opening balance, earliest first, with pointers that skip
+    # past visited rows so each lookup does not rescan rows already chained
+    shared = {}
+    for opening, links in more_openings.items():
+        links = sorted([first_opening[opening]] + links, key=lambda other: (days[other], other))
+        shared[opening] = (links, [days[other] for other in links], list(range(1, len(links) + 1)))
+
+    def first_unvisited(links, skip, index):
+        start = index
+        while index < len(links) and visited[links[index]]:
+            index = skip[index]
+        while start != index:
+            skip[start], start = index, skip[start]
+        return index
+
+    def successor(link):
+        balance = closings[link]
+        if balance not in shared:
+            candidate = first_opening.get(balance)
+            return candidate if candidate is not None and not visited[candidate] else None
+        links, link_days, skip = shared[balance]
+        # The earliest row dated on or after this one, else the earliest left
+        index = first_unvisited(links, skip, bisect_left(link_days, days[link]))
+        if index == len(links):
+            index = first_unvisited(links, skip, 0)
+        return links[index] if index < len(links) else None
+
+    def follow(link):
+        chain = []
+        while link is not None:
+            chain.append(link)
+            visited[link] = 1
+            link = successor(link)
+        return chain
+
+    def has_predecessor(link):
+        closed = closing_counts.get(openings[link], 0)
+        # A zero-movement row closes on its own opening balance
+        return closed > 1 or (closed == 1 and closings[link] != openings[link])
+
+    # Chains normally start at rows nothing leads into; whatever is left over
+    # sits on a balance cycle and starts wherever it is first dated
+    chains = [follow(link) for link in range(len(openings)) if not has_predecessor(link)]
+    if len(visited) != sum(visited):
+        for link in sorted(range(len(openings)), key=lambda link: (days[link], link)):
+            if not visited[link]:
+                chains.append(follow(link))
+    chains.sort(key=lambda chain: (days[chain[0]], chain[0]))
+
+    gaps = []
+    for previous, chain in zip(chains, chains[1:]):
+        last, first = previous[-1], chain[0]
+        gaps.append(BalanceGap(
+            transactions[starts[last]], transactions[starts[first]], openings[first] - closings[last]
+        ))
+
+    if gaps:
+        logger.warning(f"Balance chain has {len(gaps)} gap(s) - rows may be missing or misread")
+        for gap in gaps:
+            logger.debug(f"Balance gap between {gap.after.date} and {gap.before.date}: "
+                         f"R{gap.missing_cents / 100:.2f} unaccounted for")
+
+    ordered = []
+    for chain in reversed(chains):
+        for link in reversed(chain):
+            ordered.extend(transactions[starts[link]:starts[link + 1]])
+    return ordered, gaps
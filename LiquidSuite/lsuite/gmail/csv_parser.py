@@ -25,8 +25,16 @@ class CSVParser:
         Returns:
             List of transaction dictionaries
         """
-        transactions = []
+        transactions = list(self.iter_csv(csv_data, encoding))
+        logger.info(f"Successfully parsed {len(transactions)} transactions from CSV")
+        return transactions
+    
+    def iter_csv(self, csv_data, encoding='utf-8'):
+        """
+        Yield transaction dictionaries one CSV row at a time
         
+        Rows that cannot be parsed are logged and skipped.
+        """
         try:
             # Convert bytes to string if needed
             if isinstance(csv_data, bytes):
@@ -41,19 +49,15 @@ class CSVParser:
             for row in reader:
                 try:
                     transaction = self._parse_row(row)
-                    if transaction:
-                        transactions.append(transaction)
                 except Exception as e:
                     logger.warning(f"Failed to parse CSV row: {e}")
                     continue
-            
-            logger.info(f"Successfully parsed {len(transactions)} transactions from CSV")
+                if transaction:
+                    yield transaction
             
         except Exception as e:
             logger.error(f"CSV parsing error: {e}")
             raise
-        
-        return transactions
     
     def _parse_row(self, row):
         """Parse a single CSV row into transaction dictionary"""
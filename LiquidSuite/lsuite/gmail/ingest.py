@@ -0,0 +1,438 @@
+"""
+Statement Ingest Pipeline - Gmail to bank transactions in overlapping stages
+Location: lsuite/gmail/ingest.py
+
+list -> fetch metadata -> download attachments -> parse -> insert
+
+Each stage runs on its own thread and hands work on through a bounded queue,
+so listing and downloads (network), parsing (a process pool) and inserts
+(the database) proceed at the same time instead of one after another.
+
+Run: flask ingest
+     flask ingest --user-id 1 --full-scan --workers 4
+     flask reparse-statements --bank capitec    (roll a parser upgrade out)
+"""
+import os
+import time
+import queue
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import click
+
+from lsuite.extensions import db
+from lsuite.models import EmailStatement, GoogleCredential
+from lsuite.gmail.services import GmailService, GMAIL_BATCH_SIZE
+from lsuite.utils.bulk_insert import BankTransactionWriter, statement_row
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('list', 'metadata', 'download', 'parse', 'insert')
+
+# Items waiting between two stages - bounds the PDFs held in memory
+DEFAULT_QUEUE_SIZE = 16
+
+_DONE = object()
+
+
+def parse_statement(pdfs, bank_name, password=None):
+    """Parse the PDFs of one statement email - runs inside a worker process"""
+    from lsuite.gmail.parsers import PDFParser
+    parser = PDFParser()
+    return [trans for pdf_data in pdfs for trans in parser.parse_pdf(pdf_data, bank_name, password)]
+
+
+class StageStats:
+    """
+    Throughput counters for one pipeline stage
+
+    Items are what the stage passed on - message ID batches for the list
+    stage, statements for the others.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.errors = 0
+        # Time spent working - waits on the neighbouring queues are not counted
+        self.busy = 0.0
+
+    @property
+    def rate(self):
+        """Items per busy second"""
+        return self.items / self.busy if self.busy else 0.0
+
+
+class IngestPipeline:
+    """
+    Import new statement emails and their transactions in one pass
+
+    Every message travels through the stages as a dict holding its
+    credential, email_statements row, downloaded PDFs,
+    parsed transactions and first error. Stage threads push their own app
+    context, so each has its own database session; only the insert stage
+    writes. History watermarks are advanced once the pipeline has drained,
+    for credentials whose messages were all fetched.
+    """
+
+    def __init__(self, app, credential_ids, full_scan=False, parse_workers=None,
+                 queue_size=DEFAULT_QUEUE_SIZE):
+        """
+        Args:
+            app: Flask application
+            credential_ids: GoogleCredential IDs to import
+            full_scan: Ignore history watermarks and run every search
+            parse_workers: Parser processes (1 = parse on the stage thread, None = one per CPU core)
+            queue_size: Capacity of each queue between stages
+        """
+        self.app = app
+        self.gmail = GmailService(app)
+        self.credential_ids = list(credential_ids)
+        self.full_scan = full_scan
+        self.parse_workers = parse_workers
+        self.queue_size = queue_size
+        self.stats = {name: StageStats(name) for name in STAGES}
+        self.skipped = 0
+        self.history_ids = {}
+        self.failed_credentials = set()
+        self.wall_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def run(self):
+        """
+        Run the pipeline until every stage has drained
+
+        Returns:
+            Dict of StageStats keyed on stage name
+        """
+        started = time.perf_counter()
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(STAGES) + 1)]
+        work = [self._list, self._fetch_metadata, self._download, self._parse, self._insert]
+        threads = [
+            threading.Thread(target=self._run_stage, args=(name, stage, queues[i], queues[i + 1]),
+                             name=f'ingest-{name}', daemon=True)
+            for i, (name, stage) in enumerate(zip(STAGES, work))
+        ]
+        for thread in threads:
+            thread.start()
+        for credential_id in self.credential_ids:
+            queues[0].put(credential_id)
+        queues[0].put(_DONE)
+
+        # The insert stage emits nothing worth keeping - drain its output
+        while queues[-1].get() is not _DONE:
+            pass
+        for thread in threads:
+            thread.join()
+
+        self._save_watermarks()
+        self.wall_seconds = time.perf_counter() - started
+        return self.stats
+
+    def _run_stage(self, name, stage, inbox, outbox):
+        """
+        Feed a stage generator from its inbox and pass its output on
+
+        Busy time is the time spent inside the generator less the time it
+        waited on the inbox.
+        """
+        stats = self.stats[name]
+        waited = [0.0]
+
+        def inputs():
+            while True:
+                wait_started = time.perf_counter()
+                item = inbox.get()
+                waited[0] += time.perf_counter() - wait_started
+                if item is _DONE:
+                    return
+                yield item
+
+        with self.app.app_context():
+            outputs = stage(inputs(), stats)
+            try:
+                while True:
+                    waited[0] = 0.0
+                    step_started = time.perf_counter()
+                    try:
+                        item = next(outputs)
+                    except StopIteration:
+                        break
+                    finally:
+                        stats.busy += time.perf_counter() - step_started - waited[0]
+                    stats.items += 1
+                    outbox.put(item)
+            except Exception as e:
+                logger.exception(f"Ingest stage {name} stopped: {str(e)}")
+                stats.errors += 1
+                # Keep upstream stages from blocking on a full queue
+                for _ in inputs():
+                    pass
+            finally:
+                outbox.put(_DONE)
+
+    def _fail(self, item, stats, stage, error):
+        stats.errors += 1
+        if item['error'] is None:
+            item['error'] = f"{stage}: {error}"
+        logger.error(f"Ingest {stage} failed for {item['row']['gmail_id']}: {error}")
+
+    def _credentials(self):
+        """Credentials loaded into the calling stage's own session"""
+        loaded = {}
+
+        def get(credential_id):
+            if credential_id not in loaded:
+                loaded[credential_id] = db.session.get(GoogleCredential, credential_id)
+            return loaded[credential_id]
+        return get
+
+    def _saved_passwords(self):
+        """PDF passwords saved for each user and bank, looked up once per run"""
+        loaded = {}
+
+        def get(user_id, bank_name):
+            if (user_id, bank_name) not in loaded:
+                loaded[(user_id, bank_name)] = self.gmail.saved_pdf_password(user_id, bank_name)
+            return loaded[(user_id, bank_name)]
+        return get
+
+    def _list(self, credential_ids, stats):
+        """Stage 1 - new statement message IDs per credential, in batch-sized chunks"""
+        credentials = self._credentials()
+        for credential_id in credential_ids:
+            credential = credentials(credential_id)
+            try:
+                with self.gmail.gmail_service(credential) as service:
+                    new_ids, skipped, history_id = self.gmail.new_message_ids(
+                        service, credential, self.full_scan, self.gmail.quota_bucket(credential)
+                    )
+            except Exception as e:
+                stats.errors += 1
+                self.failed_credentials.add(credential_id)
+                logger.error(f"Ingest listing failed for credential {credential_id}: {str(e)}")
+                continue
+
+            with self._lock:
+                self.skipped += skipped
+                self.history_ids[credential_id] = history_id
+            for start in range(0, len(new_ids), GMAIL_BATCH_SIZE):
+                yield credential_id, new_ids[start:start + GMAIL_BATCH_SIZE]
+        db.session.commit()
+
+    def _fetch_metadata(self, chunks, stats):
+        """Stage 2 - fetch each chunk in one batch request and build its statement rows"""
+        credentials = self._credentials()
+        passwords = self._saved_passwords()
+        for credential_id, message_ids in chunks:
+            credential = credentials(credential_id)
+            try:
+                with self.gmail.gmail_service(credential) as service:
+                    messages = list(self.gmail._get_messages(
+                        service, message_ids, quota=self.gmail.quota_bucket(credential)
+                    ))
+            except Exception as e:
+                stats.errors += len(message_ids)
+                self.failed_credentials.add(credential_id)
+                logger.error(f"Ingest metadata fetch failed for credential {credential_id}: {str(e)}")
+                continue
+            for message_id, msg_data in messages:
+                if msg_data is None:
+                    stats.errors += 1
+                    self.failed_credentials.add(credential_id)
+                    continue
+                try:
+                    row = self.gmail._statement_row(credential, msg_data)
+                except Exception as e:
+                    stats.errors += 1
+                    logger.error(f"Error importing message {message_id}: {str(e)}")
+                    continue
+                # Only handed to the parser - the password is not copied onto the new statement
+                yield {
+                    'credential_id': credential_id,
+                    'row': row,
+                    'password': passwords(row['user_id'], row['bank_name']),
+                    'pdfs': None,
+                    'transactions': None,
+                    'error': None,
+                }
+        db.session.commit()
+
+    def _download(self, items, stats):
+        """Stage 3 - download the PDF attachments of each statement, one batch per email, into the blob store"""
+        credentials = self._credentials()
+        for item in items:
+            if item['row']['attachments']:
+                credential = credentials(item['credential_id'])
+                try:
+                    with self.gmail.gmail_service(credential) as service:
+                        item['pdfs'] = self.gmail.download_attachments(
+                            service, item['row']['gmail_id'], item['row']['attachments'],
+                            quota=self.gmail.quota_bucket(credential)
+                        )
+                    item['row']['attachments'] = self.gmail.store_attachments(item['row']['attachments'], item['pdfs'])
+                except Exception as e:
+                    self._fail(item, stats, 'download', e)
+            yield item
+        db.session.commit()
+
+    def _parse(self, items, stats):
+        """
+        Stage 4 - parse downloaded PDFs in a process pool
+
+        Up to two PDFs per worker are in flight; results are passed on in
+        arrival order.
+        """
+        if self.parse_workers == 1:
+            for item in items:
+                if item['pdfs'] is not None:
+                    try:
+                        item['transactions'] = parse_statement(item['pdfs'], item['row']['bank_name'], item['password'])
+                    except Exception as e:
+                        self._fail(item, stats, 'parse', e)
+                    item['pdfs'] = None
+                yield item
+            return
+
+        workers = self.parse_workers or os.cpu_count() or 1
+        # Forking while the other stage threads hold locks can hang the workers
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            pending = deque()
+            lookahead = 2 * workers
+            for item in items:
+                future = None
+                if item['pdfs'] is not None:
+                    future = pool.submit(parse_statement, item['pdfs'], item['row']['bank_name'], item['password'])
+                    item['pdfs'] = None
+                pending.append((item, future))
+                while len(pending) > lookahead:
+                    yield self._parsed(*pending.popleft(), stats)
+            while pending:
+                yield self._parsed(*pending.popleft(), stats)
+
+    def _parsed(self, item, future, stats):
+        if future is not None:
+            try:
+                item['transactions'] = future.result()
+            except Exception as e:
+                self._fail(item, stats, 'parse', e)
+        return item
+
+    def _insert(self, items, stats):
+        """Stage 5 - insert each statement with its transactions in one commit"""
+        for item in items:
+            statement = EmailStatement(**item['row'])
+            if item['error']:
+                statement.state = 'error'
+                statement.error_message = item['error']
+            elif item['transactions'] is not None:
+                statement.state = 'parsed'
+                statement.transaction_count = len(item['transactions'])
+            try:
+                db.session.add(statement)
+                db.session.flush()
+                if item['transactions']:
+                    bank_account = self.gmail._get_or_create_bank_account(statement)
+                    with BankTransactionWriter(
+                        user_id=statement.user_id,
+                        bank_account_id=bank_account.id,
+                        statement_id=statement.id,
+                        currency='ZAR'
+                    ) as writer:
+                        writer.write(map(statement_row, item['transactions']))
+                    statement.transaction_count = writer.rows
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                stats.errors += 1
+                self.failed_credentials.add(item['credential_id'])
+                logger.error(f"Ingest insert failed for {item['row']['gmail_id']}: {str(e)}")
+                continue
+            yield statement.id
+
+    def _save_watermarks(self):
+        """Advance history watermarks of credentials with no failed fetches"""
+        with self.app.app_context():
+            for credential_id, history_id in self.history_ids.items():
+                if credential_id in self.failed_credentials:
+                    continue
+                credential = db.session.get(GoogleCredential, credential_id)
+                credential.history_id = history_id
+                credential.last_sync_date = datetime.utcnow()
+            db.session.commit()
+
+
+def register_ingest_commands(app):
+    """Register the ingest pipeline commands with Flask CLI"""
+
+    @app.cli.command('ingest')
+    @click.option('--user-id', type=int, help='Only import the credentials of this user')
+    @click.option('--full-scan', is_flag=True, help='Ignore history watermarks and search the whole mailbox')
+    @click.option('--workers', '-w', default=0, type=int, help='Parser processes (0 = one per CPU core)')
+    @click.option('--queue-size', default=DEFAULT_QUEUE_SIZE, type=int, help='Items buffered between stages')
+    def ingest_command(user_id, full_scan, workers, queue_size):
+        """Import new statements from Gmail and parse their PDFs"""
+        with app.app_context():
+            query = GoogleCredential.query.filter_by(is_authenticated=True)
+            if user_id:
+                query = query.filter_by(user_id=user_id)
+            credential_ids = [credential.id for credential in query.order_by(GoogleCredential.id)]
+
+        if not credential_ids:
+            click.echo("No authenticated Google credentials found", err=True)
+            return
+
+        click.echo(f"Ingesting {len(credential_ids)} mailbox(es)...", err=True)
+        pipeline = IngestPipeline(app, credential_ids, full_scan=full_scan,
+                                  parse_workers=workers or None, queue_size=queue_size)
+        stats = pipeline.run()
+
+        click.echo(f"\n{'Stage':<10} {'Items':>7} {'Errors':>7} {'Busy s':>8} {'Items/s':>9}")
+        for name in STAGES:
+            stage = stats[name]
+            click.echo(f"{name:<10} {stage.items:>7} {stage.errors:>7} {stage.busy:>8.2f} {stage.rate:>9.1f}")
+        click.echo(f"\nImported {stats['insert'].items} statements, skipped {pipeline.skipped} "
+                   f"already imported, in {pipeline.wall_seconds:.2f}s")
+
+    @app.cli.command('reparse-statements')
+    @click.option('--user-id', type=int, help='Only re-parse statements of this user')
+    @click.option('--bank', help='Only re-parse statements of this bank')
+    def reparse_statements_command(user_id, bank):
+        """Parse already-parsed statements again, applying only what changed"""
+        with app.app_context():
+            query = EmailStatement.query.filter_by(state='parsed', has_pdf=True)
+            if user_id:
+                query = query.filter_by(user_id=user_id)
+            if bank:
+                query = query.filter_by(bank_name=bank.lower())
+            statement_ids = [statement.id for statement in query.order_by(EmailStatement.id)]
+
+            gmail = GmailService(app)
+            credentials = {}
+            failed = skipped = 0
+            for number, statement_id in enumerate(statement_ids, 1):
+                statement = db.session.get(EmailStatement, statement_id)
+                # Uploads and batch loads made before PDFs were stored have nothing to parse
+                if not gmail.can_reparse(statement):
+                    skipped += 1
+                    click.echo(f"Statement {statement_id} skipped: PDF is not stored", err=True)
+                    continue
+                if statement.user_id not in credentials:
+                    credentials[statement.user_id] = GoogleCredential.query.filter_by(
+                        user_id=statement.user_id, is_authenticated=True
+                    ).first()
+                try:
+                    gmail.download_and_parse_pdf(credentials[statement.user_id], statement)
+                except Exception as e:
+                    failed += 1
+                    click.echo(f"Statement {statement_id} failed: {str(e)}", err=True)
+                if number % 100 == 0:
+                    click.echo(f"Re-parsed {number}/{len(statement_ids)} statements...", err=True)
+
+        click.echo(f"Re-parsed {len(statement_ids) - failed - skipped} statements "
+                   f"({failed} failed, {skipped} skipped)")
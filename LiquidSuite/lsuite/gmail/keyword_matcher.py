@@ -0,0 +1,74 @@
+"""
+Keyword Matching - Prebuilt keyword classifiers and category suffix lookup
+Built once per parser and shared by every transaction it classifies
+"""
+import re
+from functools import lru_cache
+
+
+class KeywordClassifier:
+    """
+    Label text by the highest priority keyword group found in it
+
+    Each group's keywords are compiled into one alternation, so a group is
+    checked in a single scan by the regex engine instead of one substring
+    search per keyword. Results are memoised because statement descriptions
+    repeat (the same merchants and transfers every month).
+    """
+
+    def __init__(self, groups, ignore_case=True, cache_size=4096):
+        """
+        Args:
+            groups: (label, keywords) pairs in priority order
+            ignore_case: Lowercase text before matching (keywords are lowercase)
+            cache_size: Distinct texts remembered per classifier
+        """
+        self.ignore_case = ignore_case
+        self._patterns = [
+            (label, re.compile('|'.join(
+                re.escape(keyword) for keyword in sorted(set(keywords), key=len, reverse=True)
+            )))
+            for label, keywords in groups if keywords
+        ]
+        self.classify = lru_cache(maxsize=cache_size)(self._classify)
+
+    def _classify(self, text):
+        """Return the label of the first group with a keyword in text, or None"""
+        if self.ignore_case:
+            text = text.lower()
+        for label, pattern in self._patterns:
+            if pattern.search(text):
+                return label
+        return None
+
+
+class SuffixIndex:
+    """
+    Find which of a list of phrases a string ends with
+
+    Phrases are bucketed by their last few characters - a reversed-suffix
+    trie cut off at the depth every phrase shares - so a lookup compares only
+    the handful of phrases that can possibly match. When several phrases
+    match, the one listed first wins, as with a linear endswith() scan.
+    """
+
+    def __init__(self, phrases, depth=3):
+        self.phrases = [phrase for phrase in phrases if phrase]
+        self.depth = min([depth] + [len(phrase) for phrase in self.phrases])
+        self._buckets = {}
+        for phrase in self.phrases:
+            self._buckets.setdefault(phrase[-self.depth:], []).append(phrase)
+
+    def match(self, text):
+        """Return the phrase text ends with, or None"""
+        for phrase in self._buckets.get(text[-self.depth:], ()):
+            if text.endswith(phrase):
+                return phrase
+        return None
+
+    def split(self, text):
+        """Split a matching phrase off the end: (rest stripped, phrase) or (text, None)"""
+        phrase = self.match(text)
+        if phrase is None:
+            return text, None
+        return text[:-len(phrase)].strip(), phrase
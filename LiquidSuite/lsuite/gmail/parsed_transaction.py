@@ -0,0 +1,141 @@
+"""
+Parsed Transaction - Compact record emitted by the statement parsers
+Amounts are kept as integer cents and references are formatted on demand
+"""
+from decimal import Decimal
+
+# Fields of the dictionaries the parsers used to return, in their order
+FIELDS = ('date', 'description', 'amount', 'type', 'reference', 'category', 'fee', 'balance')
+
+
+def parse_cents(amount_str, limit=None):
+    """
+    Convert an amount string such as '-1,234.56' to integer cents
+
+    Args:
+        amount_str: Amount as printed on the statement ('-' or blank for none)
+        limit: Largest accepted absolute amount in cents, larger values give 0
+
+    Returns:
+        Amount in cents, 0 if the string is not an amount
+    """
+    if not amount_str or amount_str == '-':
+        return 0
+    cleaned = amount_str.replace(',', '').replace(' ', '').strip()
+    negative = cleaned.startswith('-')
+    whole, _, fraction = cleaned.lstrip('-').partition('.')
+    try:
+        if len(fraction) > 2:
+            cents = round(float(f"{whole}.{fraction}") * 100)
+        else:
+            cents = int(whole or '0') * 100 + int(fraction.ljust(2, '0'))
+    except ValueError:
+        return 0
+    if limit is not None and cents > limit:
+        return 0
+    return -cents if negative else cents
+
+
+def cents_to_decimal(cents):
+    """Exact Decimal value of an amount in cents"""
+    return Decimal(cents).scaleb(-2)
+
+
+class ParsedTransaction:
+    """
+    One transaction read from a statement
+
+    A slotted record instead of an 8-key dict per row. The reference is built
+    from a format shared by every row of a parser (e.g. 'CAP-{date:%Y%m%d}-{seq:04d}')
+    and the row's sequence number only when it is read. Item access
+    (trans['amount'], trans.get('category')) is kept for code written against
+    the old dictionaries.
+    """
+
+    __slots__ = (
+        'date', 'description', 'amount_cents', 'type', 'category',
+        'fee_cents', 'balance_cents', 'reference_format', 'sequence'
+    )
+
+    def __init__(self, date, description, amount_cents, type, balance_cents=0,
+                 category=None, fee_cents=0, reference_format='', sequence=None):
+        """
+        Args:
+            date: Transaction date
+            description: Description without the category
+            amount_cents: Unsigned amount in cents
+            type: 'credit' or 'debit'
+            balance_cents: Balance after the transaction in cents
+            category: Category printed on the statement (Capitec only)
+            fee_cents: Fee charged with the transaction in cents
+            reference_format: str.format template for the reference, given date and seq
+            sequence: Row number within the statement, used by the reference
+        """
+        self.date = date
+        self.description = description
+        self.amount_cents = amount_cents
+        self.type = type
+        self.balance_cents = balance_cents
+        self.category = category
+        self.fee_cents = fee_cents
+        self.reference_format = reference_format
+        self.sequence = sequence
+
+    @property
+    def amount(self):
+        return self.amount_cents / 100
+
+    @property
+    def fee(self):
+        return self.fee_cents / 100
+
+    @property
+    def balance(self):
+        return self.balance_cents / 100
+
+    @property
+    def reference(self):
+        return self.reference_format.format(date=self.date, seq=self.sequence)
+
+    @property
+    def is_credit(self):
+        return self.type == 'credit'
+
+    @property
+    def deposit(self):
+        """Money in as a Decimal, ready for a Numeric column"""
+        return cents_to_decimal(self.amount_cents) if self.type == 'credit' else Decimal('0.00')
+
+    @property
+    def withdrawal(self):
+        """Money out as a Decimal, ready for a Numeric column"""
+        return cents_to_decimal(self.amount_cents) if self.type == 'debit' else Decimal('0.00')
+
+    @property
+    def balance_decimal(self):
+        return cents_to_decimal(self.balance_cents)
+
+    def to_dict(self):
+        """Plain dictionary in the parsers' original format"""
+        return {field: getattr(self, field) for field in FIELDS}
+
+    def __getitem__(self, key):
+        if key not in FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        if key not in FIELDS:
+            return default
+        return getattr(self, key)
+
+    def __eq__(self, other):
+        if not isinstance(other, ParsedTransaction):
+            return NotImplemented
+        return all(getattr(self, slot) == getattr(other, slot) for slot in self.__slots__)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return (f"<ParsedTransaction {self.date} {self.type} {self.amount:.2f} "
+                f"{self.description[:30]!r}>")
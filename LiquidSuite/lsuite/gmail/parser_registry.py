@@ -0,0 +1,74 @@
+"""
+Statement Parser Registry - Detect the bank from the first page and pick its parser
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+GENERIC = 'other'
+
+
+class StatementFormat:
+    """A bank statement layout, the markers that identify it and its parser"""
+
+    def __init__(self, bank_name, version, markers=(), machine_class=None):
+        """
+        Args:
+            bank_name: Bank identifier (capitec, tymebank, other)
+            version: Parser version, bumped whenever parsing output changes
+            markers: Lowercase substrings that identify the bank on the first page
+            machine_class: StatementMachine subclass, or None for generic parsing
+        """
+        self.bank_name = bank_name
+        self.version = version
+        self.markers = tuple(markers)
+        self.machine_class = machine_class
+
+    @property
+    def label(self):
+        return f"{self.bank_name}-v{self.version}"
+
+    def matches(self, first_page):
+        """Check a lowercased first page for this bank's markers"""
+        return any(marker in first_page for marker in self.markers)
+
+    def __repr__(self):
+        return f'<StatementFormat {self.label}>'
+
+
+class ParserRegistry:
+    """Registered statement formats, looked up by name or first-page fingerprint"""
+
+    def __init__(self):
+        self._formats = {}
+
+    def register(self, statement_format):
+        """Add a format - later registrations replace earlier ones for a bank"""
+        self._formats[statement_format.bank_name] = statement_format
+        return statement_format
+
+    def formats(self):
+        """All registered formats in registration order"""
+        return list(self._formats.values())
+
+    def get(self, bank_name):
+        """Format for a bank name, falling back to generic parsing"""
+        return self._formats.get(bank_name) or self._formats[GENERIC]
+
+    def detect(self, first_page, fallback=None):
+        """
+        Identify the statement format from the first page's text
+
+        Only the first page is inspected. When no bank's markers are found,
+        the fallback bank name (e.g. from the email sender) is used.
+        """
+        first_page = (first_page or '').lower()
+        for statement_format in self._formats.values():
+            if statement_format.matches(first_page):
+                logger.info(f"Detected statement format {statement_format.label}")
+                return statement_format
+        return self.get(fallback)
+
+
+# Populated by lsuite.gmail.parsers
+STATEMENT_FORMATS = ParserRegistry()
@@ -2,17 +2,134 @@
 IMPROVED PDF Parser - Extract ALL transactions from bank statement PDFs
 Fixed version with proper chronological ordering using balance
 """
-import io
 import re
 import logging
 from datetime import datetime
+from itertools import chain
+
+from lsuite.utils.pdf_text import extract_text, iter_pages
+from lsuite.gmail.parser_registry import STATEMENT_FORMATS, StatementFormat, GENERIC
+from lsuite.gmail.keyword_matcher import KeywordClassifier, SuffixIndex
+from lsuite.gmail.parsed_transaction import ParsedTransaction, parse_cents
+from lsuite.gmail.balance_chain import order_by_balance
+from lsuite.gmail.statement_lexer import (
+    LineLexer, StatementMachine, parse_date, AMOUNT,
+    ANY, AMOUNTS, DATE_ROW, DATE_START, NOISE
+)
 
 logger = logging.getLogger(__name__)
 
 
+# Capitec transaction categories printed at the end of the description
+CAPITEC_CATEGORIES = [
+    'Other Income', 'Investment Income', 'Transfer', 'Cash Withdrawal',
+    'Digital Payments', 'Cellphone', 'Groceries', 'Takeaways', 
+    'Online Store', 'Furniture & Appliances', 'Uncategorised',
+    'Investments', 'Savings', 'Fees', 'Interest', 'Alcohol',
+    'Other Personal & Family', 'Transfers'
+]
+
+# Strong credit indicators
+CREDIT_KEYWORDS = [
+    'payment received', 'received', 'payshap payment received',
+    'deposit', 'interest', 'transfer received', 'refund',
+    'dispute', 'set-off', 'received:', 'income', 'sweep'
+]
+
+# Strong debit indicators
+DEBIT_KEYWORDS = [
+    'purchase', 'payment:', 'cash sent', 'cash withdrawal',
+    'prepaid purchase', 'voucher', 'debit order',
+    'transfer to', 'external payment', 'immediate payment',
+    'card replacement', 'admin fee', 'withdrawal', 'capitec pay',
+    'fee', 'charge', 'round-up'
+]
+
+CAPITEC_LEXER = LineLexer(
+    date_pattern=r'\d{2}/\d{2}/\d{4}',
+    amounts_pattern=rf'^({AMOUNT})(?:\s+({AMOUNT}))?(?:\s+({AMOUNT}))?',
+    tail_amounts=(2, 3),
+    header_markers=(
+        'Transaction History', 'Money In', 'Money Out', 'Date Description Category',
+        '* Includes VAT', 'Spending Summary', 'Fee Summary'
+    ),
+    header_pairs=(('Page ', ' of '),),
+)
+
+TYMEBANK_AMOUNT = r'(?:\d{1,3}(?:,\d{3})*|\d+)(?:\.\d{2})?'
+
+TYMEBANK_LEXER = LineLexer(
+    date_pattern=r'\d{1,2}\s+\w{3}\s+\d{4}',
+    # Fees | Money Out | Money In | Balance
+    amounts_pattern=(
+        rf'^(-|{TYMEBANK_AMOUNT})\s+(-|{TYMEBANK_AMOUNT})\s+(-|{TYMEBANK_AMOUNT})\s+({TYMEBANK_AMOUNT})\s*$'
+    ),
+    noise_pattern=r'^\d{10,}$',
+)
+
+# Generic layouts in priority order: (date | description | amount, date format)
+GENERIC_PATTERNS = [
+    (re.compile(r'(\d{2}/\d{2}/\d{4})\s*[|\|]\s*([^|\|]+?)\s*[|\|]\s*(-?R?[\d,]+\.\d{2})', re.MULTILINE), '%d/%m/%Y'),
+    (re.compile(r'(\d{2}/\d{2}/\d{4})\s+([^\d\-\+\$R]+?)\s+(-?R?[\d,]+\.\d{2})', re.MULTILINE), '%d/%m/%Y'),
+    (re.compile(r'(\d{4}-\d{2}-\d{2})\s+([^\d\-\+\$R]+?)\s+(-?R?[\d,]+\.\d{2})', re.MULTILINE), '%Y-%m-%d'),
+    (re.compile(r'(\d{2}\s+\w{3}\s+\d{4})\s+([^\d\-\+\$R]+?)\s+(-?R?[\d,]+\.\d{2})', re.MULTILINE), '%d %b %Y'),
+]
+
+# All generic layouts in one alternation, so an unknown statement is scanned once.
+# Layout i owns capture groups 3i+1 to 3i+3.
+GENERIC_ANY_PATTERN = re.compile('|'.join(f'(?:{pattern.pattern})' for pattern, _ in GENERIC_PATTERNS), re.MULTILINE)
+
+_DECIMAL_RE = re.compile(r'\d+\.\d{2}')
+_EMBEDDED_AMOUNT_RE = re.compile(r'(?:R\s*)?(-?\d{1,3}(?:,\d{3})*\.\d{2})')
+
+# TymeBank amounts above R10 million are misread columns, not transactions
+TYMEBANK_MAX_CENTS = 10_000_000 * 100
+
+# Reference templates, formatted with the row's date and sequence number when read
+CAPITEC_REFERENCE = 'CAP-{date:%Y%m%d}-{seq:04d}'
+CAPITEC_FEE_REFERENCE = 'CAP-{date:%Y%m%d}-{seq:04d}-FEE'
+TYMEBANK_REFERENCE = 'TYME-{date:%Y%m%d}-{seq}'
+GENERIC_REFERENCE = 'GEN-{date:%Y%m%d}-{seq}'
+
+
+# Category words that decide the direction when the description has no keyword
+CREDIT_CATEGORY_WORDS = ['income', 'interest', 'received']
+DEBIT_CATEGORY_WORDS = ['withdrawal', 'fees', 'payments', 'purchase']
+
+DESCRIPTION_CLASSIFIER = KeywordClassifier([('credit', CREDIT_KEYWORDS), ('debit', DEBIT_KEYWORDS)])
+CATEGORY_CLASSIFIER = KeywordClassifier([('credit', CREDIT_CATEGORY_WORDS), ('debit', DEBIT_CATEGORY_WORDS)])
+CATEGORY_SUFFIXES = SuffixIndex(CAPITEC_CATEGORIES)
+
+
+def is_credit_transaction(description, category):
+    """Determine if transaction is a credit based on keywords"""
+    # Description keywords win, then the category
+    direction = DESCRIPTION_CLASSIFIER.classify(description)
+    if direction is None and category:
+        direction = CATEGORY_CLASSIFIER.classify(category)
+    return direction == 'credit'
+
+
+def extract_category(text_str):
+    """Extract category from end of description"""
+    return CATEGORY_SUFFIXES.split(text_str)
+
+
 class PDFParser:
     """PDF statement parser with improved Capitec parsing and balance-based ordering"""
     
+    def __init__(self, workers=1, text_cache=None):
+        """
+        Args:
+            workers: Processes used to extract page text (0 = all cores)
+            text_cache: Optional PageTextCache of previously extracted pages
+        """
+        self.workers = workers
+        self.text_cache = text_cache
+        self.statement_format = None
+        self.parser_version = None
+        self.balance_gaps = []
+    
     def parse_pdf(self, pdf_data, bank_name, password=None):
         """
         Parse PDF and extract transactions
@@ -23,87 +140,81 @@ class PDFParser:
             password: PDF password if protected
             
         Returns:
-            List of transaction dictionaries sorted chronologically
+            List of ParsedTransaction records sorted chronologically
         """
-        text = self._extract_text_from_pdf(pdf_data, password)
+        pages = list(iter_pages(pdf_data, password, workers=self.workers, cache=self.text_cache))
+        first_page = pages[0] if pages else ''
+        text = ''.join(page + "\n" for page in pages)
         
         # Log extracted text for debugging
         logger.info(f"Extracted text length: {len(text)} characters")
         logger.debug(f"First 500 chars: {text[:500]}")
         
-        if bank_name == 'tymebank':
-            transactions = self._parse_tymebank(text)
-        elif bank_name == 'capitec':
-            transactions = self._parse_capitec_improved(text)
+        statement_format = self.detect_format(first_page, bank_name)
+        
+        if statement_format.machine_class is None:
+            transactions = self._parse_generic(text, self._generic_patterns(first_page))
         else:
-            transactions = self._parse_generic(text)
+            transactions = statement_format.machine_class().run(text.split('\n'))
+            logger.info(f"Successfully parsed {len(transactions)} {statement_format.label} transactions")
         
-        # Sort transactions chronologically using balance
+        # Order transactions by following the running balance
         return self._sort_by_balance(transactions)
     
+    def iter_transactions(self, pdf_data, bank_name, password=None):
+        """
+        Extract and parse the PDF page by page, yielding transactions as found
+        
+        Rows come out in statement order rather than sorted. Unknown banks
+        need the whole text and are parsed once extraction finishes.
+        
+        Args:
+            pdf_data: Binary PDF data
+            bank_name: Bank identifier used when the first page is not recognised
+            password: PDF password if protected
+            
+        Yields:
+            ParsedTransaction records
+        """
+        pages = iter_pages(pdf_data, password, workers=self.workers, cache=self.text_cache)
+        first_page = next(pages, '')
+        statement_format = self.detect_format(first_page, bank_name)
+        
+        if statement_format.machine_class is None:
+            text = first_page + "\n" + ''.join(page + "\n" for page in pages)
+            yield from self._parse_generic(text, self._generic_patterns(first_page))
+            return
+        
+        machine = statement_format.machine_class()
+        yield from machine.stream(chain([first_page], pages))
+        logger.info(f"Streamed {machine.emitted} {statement_format.label} transactions")
+    
+    def detect_format(self, first_page, bank_name=None):
+        """
+        Pick the statement format from the first page, falling back to bank_name
+        
+        The format is kept in statement_format, so callers learn the detected
+        bank from the parse instead of reading the first page again.
+        """
+        statement_format = STATEMENT_FORMATS.detect(first_page, bank_name)
+        self.statement_format = statement_format
+        self.parser_version = statement_format.label
+        return statement_format
+    
     def _sort_by_balance(self, transactions):
         """
-        Sort transactions chronologically using date and balance.
-        Lower balance = later transaction (balance decreases through the day)
-        Matches exact PDF order
+        Order transactions newest first by chaining their running balances
+        
+        Breaks in the chain are kept in self.balance_gaps.
         """
-        if not transactions:
-            return transactions
-        
-        # Sort by: date (newest first), then balance (lowest first = chronological order)
-        sorted_trans = sorted(
-            transactions,
-            key=lambda x: (
-                -x['date'].toordinal(),  # Newest date first
-                float(x.get('balance', 0)) if x.get('balance') is not None else 0  # Lowest balance first
-            )
-        )
-        
-        logger.info(f"Sorted {len(sorted_trans)} transactions by date and balance")
-        return sorted_trans
+        ordered, self.balance_gaps = order_by_balance(transactions)
+        logger.info(f"Ordered {len(ordered)} transactions by balance chain ({len(self.balance_gaps)} gaps)")
+        return ordered
     
     def _extract_text_from_pdf(self, pdf_data, password=None):
         """Extract text from PDF using available library"""
-        text = ""
-        
-        try:
-            # Try PyPDF2 first
-            import PyPDF2
-            pdf_file = io.BytesIO(pdf_data)
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            
-            # Handle encrypted PDFs
-            if pdf_reader.is_encrypted:
-                if not password:
-                    raise ValueError("PDF is password protected but no password provided")
-                
-                decrypt_result = pdf_reader.decrypt(password)
-                if decrypt_result == 0:
-                    raise ValueError("Incorrect PDF password")
-            
-            # Extract text from all pages
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-            
-            logger.info(f"Extracted {len(text)} characters using PyPDF2")
-            
-        except ImportError:
-            # Fallback to pdfplumber
-            try:
-                import pdfplumber
-                pdf_file = io.BytesIO(pdf_data)
-                
-                with pdfplumber.open(pdf_file, password=password) as pdf:
-                    for page in pdf.pages:
-                        page_text = page.extract_text()
-                        if page_text:
-                            text += page_text + "\n"
-                
-                logger.info(f"Extracted {len(text)} characters using pdfplumber")
-                
-            except ImportError:
-                raise ImportError("No PDF library available. Install PyPDF2 or pdfplumber")
-        
+        text = extract_text(pdf_data, password, workers=self.workers, cache=self.text_cache)
+        logger.info(f"Extracted {len(text)} characters from PDF")
         return text
     
     def _parse_capitec_improved(self, text):
@@ -111,463 +222,310 @@ class PDFParser:
         IMPROVED Capitec PDF parser - captures ALL transactions
         Maintains proper order using balance field
         """
-        transactions = []
-        lines = text.split('\n')
-        
-        def parse_amount(amount_str):
-            """Convert amount string to float"""
-            if not amount_str or amount_str == '-' or amount_str.strip() == '':
-                return 0.0
-            try:
-                cleaned = amount_str.replace(',', '').replace(' ', '').strip()
-                # Handle negative amounts
-                if cleaned.startswith('-'):
-                    return -float(cleaned[1:])
-                return float(cleaned)
-            except (ValueError, AttributeError):
-                return 0.0
-        
-        def is_credit_transaction(description, category):
-            """Determine if transaction is a credit based on keywords"""
-            desc_lower = description.lower()
-            cat_lower = (category or '').lower()
-            
-            # Strong credit indicators
-            credit_keywords = [
-                'payment received', 'received', 'payshap payment received',
-                'deposit', 'interest', 'transfer received', 'refund',
-                'dispute', 'set-off', 'received:', 'income', 'sweep'
-            ]
-            
-            # Strong debit indicators
-            debit_keywords = [
-                'purchase', 'payment:', 'cash sent', 'cash withdrawal',
-                'prepaid purchase', 'voucher', 'debit order',
-                'transfer to', 'external payment', 'immediate payment',
-                'card replacement', 'admin fee', 'withdrawal', 'capitec pay',
-                'fee', 'charge', 'round-up'
-            ]
-            
-            # Check description
-            if any(kw in desc_lower for kw in credit_keywords):
-                return True
-            if any(kw in desc_lower for kw in debit_keywords):
-                return False
-            
-            # Check category
-            if any(word in cat_lower for word in ['income', 'interest', 'received']):
-                return True
-            if any(word in cat_lower for word in ['withdrawal', 'fees', 'payments', 'purchase']):
-                return False
-            
-            return False
-        
-        def extract_category(text_str):
-            """Extract category from end of description"""
-            categories = [
-                'Other Income', 'Investment Income', 'Transfer', 'Cash Withdrawal',
-                'Digital Payments', 'Cellphone', 'Groceries', 'Takeaways', 
-                'Online Store', 'Furniture & Appliances', 'Uncategorised',
-                'Investments', 'Savings', 'Fees', 'Interest', 'Alcohol',
-                'Other Personal & Family', 'Transfers'
-            ]
-            
-            for cat in categories:
-                if text_str.endswith(cat):
-                    description = text_str[:-(len(cat))].strip()
-                    return description, cat
-            
-            return text_str, None
-        
-        i = 0
-        
-        while i < len(lines):
-            line = lines[i].strip()
-            
-            # Skip empty lines and headers
-            if (not line or 
-                'Transaction History' in line or 
-                'Money In' in line or 'Money Out' in line or
-                'Date Description Category' in line or
-                '* Includes VAT' in line or
-                'Spending Summary' in line or
-                'Fee Summary' in line or
-                'Page ' in line and ' of ' in line):
-                i += 1
-                continue
-            
-            # Match date at start of line
-            date_match = re.match(r'^(\d{2}/\d{2}/\d{4})\s+(.+)', line)
-            
-            if date_match:
-                try:
-                    date_str = date_match.group(1)
-                    rest_of_line = date_match.group(2).strip()
-                    trans_date = datetime.strptime(date_str, '%d/%m/%Y').date()
-                    
-                    # Skip notification lines without amounts
-                    if ('insufficient funds' in rest_of_line.lower() or 
-                        'authentication fee' in rest_of_line.lower()) and \
-                       not re.search(r'\d+\.\d{2}', rest_of_line):
-                        i += 1
-                        continue
-                    
-                    # Pattern 1: Three amounts (main amount, fee, balance)
-                    pattern_3amt = re.search(
-                        r'(.+?)\s+(-?\d{1,3}(?:,\d{3})*\.\d{2})\s+(-?\d{1,3}(?:,\d{3})*\.\d{2})\s+(-?\d{1,3}(?:,\d{3})*\.\d{2})\s*$',
-                        rest_of_line
-                    )
-                    
-                    # Pattern 2: Two amounts (amount and balance, OR fee and balance)
-                    pattern_2amt = re.search(
-                        r'(.+?)\s+(-?\d{1,3}(?:,\d{3})*\.\d{2})\s+(-?\d{1,3}(?:,\d{3})*\.\d{2})\s*$',
-                        rest_of_line
-                    )
-                    
-                    trans_amount = 0.0
-                    fee = 0.0
-                    balance = 0.0
-                    description = ""
-                    category = None
-                    
-                    if pattern_3amt:
-                        # Three amounts: description | amount | fee | balance
-                        desc_and_cat = pattern_3amt.group(1).strip()
-                        amount_str = pattern_3amt.group(2).strip()
-                        fee_str = pattern_3amt.group(3).strip()
-                        balance_str = pattern_3amt.group(4).strip()
-                        
-                        trans_amount = parse_amount(amount_str)
-                        fee = abs(parse_amount(fee_str))
-                        balance = parse_amount(balance_str)
-                        description, category = extract_category(desc_and_cat)
-                        
-                        # Create main transaction if amount > 0
-                        if abs(trans_amount) > 0:
-                            is_credit = is_credit_transaction(description, category)
-                            transactions.append({
-                                'date': trans_date,
-                                'description': description,
-                                'amount': abs(trans_amount),
-                                'type': 'credit' if is_credit else 'debit',
-                                'reference': f"CAP-{trans_date.strftime('%Y%m%d')}-{len(transactions):04d}",
-                                'category': category,
-                                'fee': fee,
-                                'balance': balance
-                            })
-                            logger.debug(f"[3AMT] {trans_date} | Bal:{balance:>8.2f} | {description[:40]:<40} | R{abs(trans_amount):>8.2f} | {'CR' if is_credit else 'DR'}")
-                        
-                        # Create separate fee transaction if fee > 0
-                        # Fee happens AFTER main transaction, so balance is lower
-                        if fee > 0:
-                            fee_balance = balance
-                            transactions.append({
-                                'date': trans_date,
-                                'description': f"{description} (Fee)",
-                                'amount': fee,
-                                'type': 'debit',
-                                'reference': f"CAP-{trans_date.strftime('%Y%m%d')}-{len(transactions):04d}-FEE",
-                                'category': 'Fees',
-                                'fee': 0.0,
-                                'balance': fee_balance
-                            })
-                            logger.debug(f"[FEE]  {trans_date} | Bal:{fee_balance:>8.2f} | {description[:40]:<40} (Fee) | R{fee:>8.2f} | DR")
-                    
-                    elif pattern_2amt:
-                        # Two amounts: could be (amount, balance) OR (fee, balance)
-                        desc_and_cat = pattern_2amt.group(1).strip()
-                        amount1_str = pattern_2amt.group(2).strip()
-                        amount2_str = pattern_2amt.group(3).strip()
-                        
-                        amount1 = parse_amount(amount1_str)
-                        amount2 = parse_amount(amount2_str)
-                        description, category = extract_category(desc_and_cat)
-                        
-                        # If 'fee' in description or category, treat first amount as fee
-                        if 'fee' in description.lower() or (category and 'fee' in category.lower()):
-                            trans_amount = abs(amount1)
-                            fee = 0.0
-                            balance = amount2
-                        else:
-                            trans_amount = amount1
-                            fee = 0.0
-                            balance = amount2
-                        
-                        if abs(trans_amount) > 0:
-                            is_credit = is_credit_transaction(description, category)
-                            transactions.append({
-                                'date': trans_date,
-                                'description': description,
-                                'amount': abs(trans_amount),
-                                'type': 'credit' if is_credit else 'debit',
-                                'reference': f"CAP-{trans_date.strftime('%Y%m%d')}-{len(transactions):04d}",
-                                'category': category,
-                                'fee': fee,
-                                'balance': balance
-                            })
-                            logger.debug(f"[2AMT] {trans_date} | Bal:{balance:>8.2f} | {description[:40]:<40} | R{abs(trans_amount):>8.2f} | {'CR' if is_credit else 'DR'}")
-                    
-                    else:
-                        # Description only - check if amounts are on next line(s)
-                        desc_and_cat = rest_of_line.strip()
-                        
-                        # Look ahead for amounts
-                        j = i + 1
-                        found_amounts = False
-                        while j < len(lines) and j < i + 3:  # Look ahead max 3 lines
-                            next_line = lines[j].strip()
-                            
-                            # Stop if we hit another date
-                            if re.match(r'^\d{2}/\d{2}/\d{4}', next_line):
-                                break
-                            
-                            # Try to find amounts
-                            amounts_match = re.search(
-                                r'^(-?\d{1,3}(?:,\d{3})*\.\d{2})(?:\s+(-?\d{1,3}(?:,\d{3})*\.\d{2}))?(?:\s+(-?\d{1,3}(?:,\d{3})*\.\d{2}))?',
-                                next_line
-                            )
-                            
-                            if amounts_match:
-                                found_amounts = True
-                                amt1 = parse_amount(amounts_match.group(1))
-                                amt2 = parse_amount(amounts_match.group(2)) if amounts_match.group(2) else 0
-                                amt3 = parse_amount(amounts_match.group(3)) if amounts_match.group(3) else 0
-                                
-                                description, category = extract_category(desc_and_cat)
-                                
-                                # Determine structure based on number of amounts
-                                if amt3 != 0:
-                                    # Three amounts
-                                    trans_amount = amt1
-                                    fee = abs(amt2)
-                                    balance = amt3
-                                elif amt2 != 0:
-                                    # Two amounts
-                                    trans_amount = amt1
-                                    fee = 0
-                                    balance = amt2
-                                else:
-                                    # One amount
-                                    trans_amount = amt1
-                                    fee = 0
-                                    balance = 0
-                                
-                                if abs(trans_amount) > 0:
-                                    is_credit = is_credit_transaction(description, category)
-                                    transactions.append({
-                                        'date': trans_date,
-                                        'description': description,
-                                        'amount': abs(trans_amount),
-                                        'type': 'credit' if is_credit else 'debit',
-                                        'reference': f"CAP-{trans_date.strftime('%Y%m%d')}-{len(transactions):04d}",
-                                        'category': category,
-                                        'fee': fee,
-                                        'balance': balance
-                                    })
-                                    logger.debug(f"[MLNE] {trans_date} | Bal:{balance:>8.2f} | {description[:40]:<40} | R{abs(trans_amount):>8.2f} | {'CR' if is_credit else 'DR'}")
-                                
-                                # Add fee transaction if exists
-                                if fee > 0:
-                                    fee_balance = balance
-                                    transactions.append({
-                                        'date': trans_date,
-                                        'description': f"{description} (Fee)",
-                                        'amount': fee,
-                                        'type': 'debit',
-                                        'reference': f"CAP-{trans_date.strftime('%Y%m%d')}-{len(transactions):04d}-FEE",
-                                        'category': 'Fees',
-                                        'fee': 0.0,
-                                        'balance': fee_balance
-                                    })
-                                    logger.debug(f"[FEE]  {trans_date} | Bal:{fee_balance:>8.2f} | {description[:40]:<40} (Fee) | R{fee:>8.2f} | DR")
-                                
-                                i = j
-                                break
-                            
-                            j += 1
-                        
-                        if not found_amounts:
-                            # Try to extract amounts from description itself
-                            embedded_amounts = re.findall(r'(?:R\s*)?(-?\d{1,3}(?:,\d{3})*\.\d{2})', desc_and_cat)
-                            if embedded_amounts and len(embedded_amounts) >= 1:
-                                # Found amounts in description
-                                if len(embedded_amounts) == 1:
-                                    # Only one amount - assume it's the transaction amount, no balance
-                                    trans_amount = parse_amount(embedded_amounts[0])
-                                    balance = 0
-                                else:
-                                    # Multiple amounts - first is transaction, last is balance
-                                    trans_amount = parse_amount(embedded_amounts[0])
-                                    balance = parse_amount(embedded_amounts[-1])
-                                
-                                # Clean description - remove amounts
-                                clean_desc = desc_and_cat
-                                for amt_str in embedded_amounts:
-                                    clean_desc = clean_desc.replace(f'R{amt_str}', '').replace(amt_str, '')
-                                clean_desc = ' '.join(clean_desc.split())
-                                description, category = extract_category(clean_desc)
-                                
-                                if abs(trans_amount) > 0:
-                                    is_credit = is_credit_transaction(description, category)
-                                    transactions.append({
-                                        'date': trans_date,
-                                        'description': description,
-                                        'amount': abs(trans_amount),
-                                        'type': 'credit' if is_credit else 'debit',
-                                        'reference': f"CAP-{trans_date.strftime('%Y%m%d')}-{len(transactions):04d}",
-                                        'category': category,
-                                        'fee': 0.0,
-                                        'balance': balance
-                                    })
-                                    logger.debug(f"[EMBD] {trans_date} | Bal:{balance:>8.2f} | {description[:40]:<40} | R{abs(trans_amount):>8.2f} | {'CR' if is_credit else 'DR'}")
-                            else:
-                                logger.warning(f"No amounts found for: {desc_and_cat[:60]}")
-                
-                except (ValueError, IndexError) as e:
-                    logger.warning(f"Parse error: {line[:80]} | {e}")
-            
-            i += 1
-        
+        transactions = CapitecMachine().run(text.split('\n'))
         logger.info(f"Successfully parsed {len(transactions)} Capitec transactions")
         return transactions
     
     def _parse_tymebank(self, text):
         """Parse TymeBank PDF format"""
-        transactions = []
-        lines = text.split('\n')
-        
-        i = 0
-        while i < len(lines):
-            line = lines[i].strip()
-            date_match = re.match(r'^(\d{1,2}\s+\w{3}\s+\d{4})\s+(.+)', line)
-            
-            if date_match:
-                try:
-                    date_str = date_match.group(1)
-                    rest_of_line = date_match.group(2).strip()
-                    trans_date = datetime.strptime(date_str, '%d %b %Y').date()
-                    
-                    description_parts = [rest_of_line]
-                    j = i + 1
-                    amounts_found = False
-                    fees = money_out = money_in = balance = None
-                    
-                    while j < len(lines) and j < i + 6:
-                        next_line = lines[j].strip()
-                        if re.match(r'^\d{1,2}\s+\w{3}\s+\d{4}', next_line):
-                            break
-                        
-                        amount_pattern = r'^(-|(?:\d{1,3}(?:,\d{3})*|\d+)(?:\.\d{2})?)\s+(-|(?:\d{1,3}(?:,\d{3})*|\d+)(?:\.\d{2})?)\s+(-|(?:\d{1,3}(?:,\d{3})*|\d+)(?:\.\d{2})?)\s+((?:\d{1,3}(?:,\d{3})*|\d+)(?:\.\d{2})?)\s*$'
-                        amount_match = re.match(amount_pattern, next_line)
-                        
-                        if amount_match:
-                            fees = amount_match.group(1).strip()
-                            money_out = amount_match.group(2).strip()
-                            money_in = amount_match.group(3).strip()
-                            balance = amount_match.group(4).strip()
-                            amounts_found = True
-                            i = j
-                            break
-                        elif next_line and not re.match(r'^\d{10,}$', next_line):
-                            if len(next_line) > 0 and not next_line.startswith('-'):
-                                description_parts.append(next_line)
-                        
-                        j += 1
-                    
-                    if amounts_found:
-                        description = ' '.join(description_parts)
-                        description = ' '.join(description.split())
-                        
-                        if len(description) < 3 or 'Description' in description:
-                            i += 1
-                            continue
-                        
-                        def parse_amount_safe(amount_str):
-                            if not amount_str or amount_str == '-':
-                                return 0
-                            try:
-                                cleaned = amount_str.replace(',', '').replace(' ', '').strip()
-                                val = float(cleaned)
-                                if val > 10_000_000:
-                                    return 0
-                                return val
-                            except (ValueError, AttributeError):
-                                return 0
-                        
-                        amount = 0
-                        trans_type = 'debit'
-                        
-                        money_in_val = parse_amount_safe(money_in)
-                        if money_in_val > 0:
-                            amount = money_in_val
-                            trans_type = 'credit'
-                        
-                        money_out_val = parse_amount_safe(money_out)
-                        if amount == 0 and money_out_val > 0:
-                            amount = money_out_val
-                            trans_type = 'debit'
-                        
-                        fees_val = parse_amount_safe(fees)
-                        if amount == 0 and fees_val > 0:
-                            amount = fees_val
-                            trans_type = 'debit'
-                            description = f"{description} (Fee)"
-                        
-                        if amount > 0:
-                            transactions.append({
-                                'date': trans_date,
-                                'description': description,
-                                'amount': amount,
-                                'type': trans_type,
-                                'reference': f"TYME-{trans_date.strftime('%Y%m%d')}-{len(transactions)}",
-                                'balance': parse_amount_safe(balance)
-                            })
-                
-                except (ValueError, IndexError) as e:
-                    logger.warning(f"Failed to parse TymeBank transaction: {e}")
-            
-            i += 1
-        
+        transactions = TymeBankMachine().run(text.split('\n'))
         logger.info(f"Successfully parsed {len(transactions)} TymeBank transactions")
         return transactions
     
-    def _parse_generic(self, text):
-        """Generic PDF parsing for unknown banks"""
-        transactions = []
+    def _generic_patterns(self, first_page):
+        """Order the generic layouts so the one seen on the first page is preferred"""
+        for index, (pattern, date_format) in enumerate(GENERIC_PATTERNS):
+            if pattern.search(first_page):
+                return [GENERIC_PATTERNS[index]] + GENERIC_PATTERNS[:index] + GENERIC_PATTERNS[index + 1:]
+        return GENERIC_PATTERNS
+    
+    def _parse_generic(self, text, patterns=GENERIC_PATTERNS):
+        """
+        Generic PDF parsing for unknown banks
         
-        patterns = [
-            (r'(\d{2}/\d{2}/\d{4})\s*[|\|]\s*([^|\|]+?)\s*[|\|]\s*(-?R?[\d,]+\.\d{2})', '%d/%m/%Y'),
-            (r'(\d{2}/\d{2}/\d{4})\s+([^\d\-\+\$R]+?)\s+(-?R?[\d,]+\.\d{2})', '%d/%m/%Y'),
-            (r'(\d{4}-\d{2}-\d{2})\s+([^\d\-\+\$R]+?)\s+(-?R?[\d,]+\.\d{2})', '%Y-%m-%d'),
-            (r'(\d{2}\s+\w{3}\s+\d{4})\s+([^\d\-\+\$R]+?)\s+(-?R?[\d,]+\.\d{2})', '%d %b %Y'),
-        ]
+        The text is scanned once for every layout; rows of the first layout in
+        patterns that yields any are returned.
+        """
+        matches = [[] for _ in GENERIC_PATTERNS]
+        for match in GENERIC_ANY_PATTERN.finditer(text):
+            layout = (match.lastindex - 1) // 3
+            matches[layout].append(match.group(3 * layout + 1, 3 * layout + 2, 3 * layout + 3))
         
-        for pattern, date_format in patterns:
-            matches = re.findall(pattern, text, re.MULTILINE)
-            
-            if matches:
-                for match in matches:
-                    try:
-                        trans_date = datetime.strptime(match[0].strip(), date_format).date()
-                        description = match[1].strip()
-                        amount_str = match[2].replace('R', '').replace('$', '').replace(',', '').strip()
-                        amount = float(amount_str)
-                        
-                        if len(description) < 3:
-                            continue
-                        
-                        transactions.append({
-                            'date': trans_date,
-                            'description': description,
-                            'amount': abs(amount),
-                            'type': 'debit' if amount < 0 else 'credit',
-                            'reference': f"GEN-{trans_date.strftime('%Y%m%d')}-{len(transactions)}",
-                            'balance': 0
-                        })
-                    except (ValueError, IndexError) as e:
-                        continue
+        for layout in patterns:
+            transactions = self._generic_rows(matches[GENERIC_PATTERNS.index(layout)], layout[1])
+            if transactions:
+                return transactions
+        return []
+    
+    def _generic_rows(self, matches, date_format):
+        """Transactions from (date, description, amount) matches of one generic layout"""
+        transactions = []
+        for match in matches:
+            try:
+                trans_date = datetime.strptime(match[0].strip(), date_format).date()
+                description = match[1].strip()
+                amount = parse_cents(match[2].replace('R', '').replace('$', ''))
                 
-                if transactions:
-                    break
-        
+                if len(description) < 3:
+                    continue
+                
+                transactions.append(ParsedTransaction(
+                    trans_date, description, abs(amount), 'debit' if amount < 0 else 'credit',
+                    reference_format=GENERIC_REFERENCE, sequence=len(transactions)
+                ))
+            except (ValueError, IndexError):
+                continue
         return transactions
+
+
+class CapitecMachine(StatementMachine):
+    """
+    Capitec statement state machine
+
+    A dated line either carries its amounts (DATE_ROW) or waits up to
+    LOOKAHEAD lines for an amounts line. Rows that never get one fall back to
+    amounts embedded in the description.
+    """
+    
+    LEXER = CAPITEC_LEXER
+    LOOKAHEAD = 2
+    TRANSITIONS = {
+        ('scan', DATE_ROW): '_on_row',
+        ('scan', DATE_START): '_on_open',
+        ('await_amounts', AMOUNTS): '_on_amounts',
+        ('await_amounts', ANY): '_on_pending',
+    }
+    
+    def __init__(self):
+        super().__init__()
+        self._debug = logger.isEnabledFor(logging.DEBUG)
+        self._pending = None
+        self._window = 0
+    
+    def _on_row(self, token):
+        """Date line with two or three trailing amounts"""
+        try:
+            trans_date = parse_date(token.date, '%d/%m/%Y')
+        except ValueError as e:
+            logger.warning(f"Parse error: {token.text[:80]} | {e}")
+            return 'scan'
+        
+        description, category = extract_category(token.description)
+        
+        if len(token.amounts) == 3:
+            # Three amounts: description | amount | fee | balance
+            trans_amount = parse_cents(token.amounts[0])
+            fee = abs(parse_cents(token.amounts[1]))
+            balance = parse_cents(token.amounts[2])
+            self._add(trans_date, description, category, trans_amount, fee, balance, '3AMT')
+        else:
+            # Two amounts: (amount, balance) OR (fee, balance)
+            trans_amount = parse_cents(token.amounts[0])
+            balance = parse_cents(token.amounts[1])
+            self._add(trans_date, description, category, trans_amount, 0, balance, '2AMT', fee_row=False)
+        
+        return 'scan'
+    
+    def _on_open(self, token):
+        """Date line without amounts - wait for them on the next lines"""
+        try:
+            trans_date = parse_date(token.date, '%d/%m/%Y')
+        except ValueError as e:
+            logger.warning(f"Parse error: {token.text[:80]} | {e}")
+            return 'scan'
+        
+        # Skip notification lines without amounts
+        rest_lower = token.rest.lower()
+        if ('insufficient funds' in rest_lower or 'authentication fee' in rest_lower) and \
+           not _DECIMAL_RE.search(token.rest):
+            return 'scan'
+        
+        self._pending = (trans_date, token.rest)
+        self._window = self.LOOKAHEAD
+        return 'await_amounts'
+    
+    def _on_amounts(self, token):
+        """Amounts line completing the pending row"""
+        trans_date, desc_and_cat = self._pending
+        self._pending = None
+        
+        amt1 = parse_cents(token.amounts[0])
+        amt2 = parse_cents(token.amounts[1]) if token.amounts[1] else 0
+        amt3 = parse_cents(token.amounts[2]) if token.amounts[2] else 0
+        
+        description, category = extract_category(desc_and_cat)
+        
+        # Determine structure based on number of amounts
+        if amt3 != 0:
+            trans_amount, fee, balance = amt1, abs(amt2), amt3
+        elif amt2 != 0:
+            trans_amount, fee, balance = amt1, 0, amt2
+        else:
+            trans_amount, fee, balance = amt1, 0, 0
+        
+        self._add(trans_date, description, category, trans_amount, fee, balance, 'MLNE')
+        return 'scan'
+    
+    def _on_pending(self, token):
+        """Any other line while a row is waiting for amounts"""
+        if token.date is not None:
+            # Next dated line - the pending row never got its amounts
+            self._flush_pending()
+            return self.dispatch('scan', token)
+        
+        self._window -= 1
+        if self._window == 0:
+            self._flush_pending()
+            return 'scan'
+        return 'await_amounts'
+    
+    def close(self):
+        if self.state == 'await_amounts':
+            self._flush_pending()
+        super().close()
+    
+    def _flush_pending(self):
+        """Try to extract amounts from the pending description itself"""
+        trans_date, desc_and_cat = self._pending
+        self._pending = None
+        
+        embedded_amounts = _EMBEDDED_AMOUNT_RE.findall(desc_and_cat)
+        if not embedded_amounts:
+            logger.warning(f"No amounts found for: {desc_and_cat[:60]}")
+            return
+        
+        if len(embedded_amounts) == 1:
+            # Only one amount - assume it's the transaction amount, no balance
+            trans_amount = parse_cents(embedded_amounts[0])
+            balance = 0
+        else:
+            # Multiple amounts - first is transaction, last is balance
+            trans_amount = parse_cents(embedded_amounts[0])
+            balance = parse_cents(embedded_amounts[-1])
+        
+        # Clean description - remove amounts
+        clean_desc = desc_and_cat
+        for amt_str in embedded_amounts:
+            clean_desc = clean_desc.replace(f'R{amt_str}', '').replace(amt_str, '')
+        clean_desc = ' '.join(clean_desc.split())
+        description, category = extract_category(clean_desc)
+        
+        self._add(trans_date, description, category, trans_amount, 0, balance, 'EMBD', fee_row=False)
+    
+    def _add(self, trans_date, description, category, trans_amount, fee, balance, tag, fee_row=True):
+        """Emit the main transaction and, when charged, a separate fee transaction (amounts in cents)"""
+        if abs(trans_amount) > 0:
+            is_credit = is_credit_transaction(description, category)
+            self.emit(ParsedTransaction(
+                trans_date, description, abs(trans_amount), 'credit' if is_credit else 'debit',
+                balance_cents=balance, category=category, fee_cents=fee,
+                reference_format=CAPITEC_REFERENCE, sequence=self.emitted
+            ))
+            if self._debug:
+                logger.debug(f"[{tag}] {trans_date} | Bal:{balance / 100:>8.2f} | {description[:40]:<40} | R{abs(trans_amount) / 100:>8.2f} | {'CR' if is_credit else 'DR'}")
+        
+        # Fee happens AFTER main transaction, so balance is lower
+        if fee_row and fee > 0:
+            self.emit(ParsedTransaction(
+                trans_date, f"{description} (Fee)", fee, 'debit',
+                balance_cents=balance, category='Fees',
+                reference_format=CAPITEC_FEE_REFERENCE, sequence=self.emitted
+            ))
+            if self._debug:
+                logger.debug(f"[FEE]  {trans_date} | Bal:{balance / 100:>8.2f} | {description[:40]:<40} (Fee) | R{fee / 100:>8.2f} | DR")
+
+
+class TymeBankMachine(StatementMachine):
+    """
+    TymeBank statement state machine
+
+    A dated line opens a row; following lines extend the description until the
+    four-column amounts line (fees, money out, money in, balance) closes it.
+    """
+    
+    LEXER = TYMEBANK_LEXER
+    LOOKAHEAD = 5
+    TRANSITIONS = {
+        ('scan', DATE_START): '_on_open',
+        ('collect', AMOUNTS): '_on_amounts',
+        ('collect', ANY): '_on_pending',
+    }
+    
+    def __init__(self):
+        super().__init__()
+        self._pending = None
+        self._window = 0
+    
+    def _on_open(self, token):
+        try:
+            trans_date = parse_date(token.date, '%d %b %Y')
+        except ValueError as e:
+            logger.warning(f"Failed to parse TymeBank transaction: {e}")
+            return 'scan'
+        
+        self._pending = (trans_date, [token.rest])
+        self._window = self.LOOKAHEAD
+        return 'collect'
+    
+    def _on_pending(self, token):
+        if token.date is not None:
+            self._pending = None
+            return self.dispatch('scan', token)
+        
+        if token.text and token.kind != NOISE and not token.text.startswith('-'):
+            self._pending[1].append(token.text)
+        
+        self._window -= 1
+        if self._window == 0:
+            self._pending = None
+            return 'scan'
+        return 'collect'
+    
+    def _on_amounts(self, token):
+        trans_date, description_parts = self._pending
+        self._pending = None
+        fees, money_out, money_in, balance = token.amounts
+        
+        description = ' '.join(' '.join(description_parts).split())
+        
+        if len(description) < 3 or 'Description' in description:
+            return 'scan'
+        
+        amount = 0
+        trans_type = 'debit'
+        
+        money_in_val = parse_cents(money_in, limit=TYMEBANK_MAX_CENTS)
+        if money_in_val > 0:
+            amount = money_in_val
+            trans_type = 'credit'
+        
+        money_out_val = parse_cents(money_out, limit=TYMEBANK_MAX_CENTS)
+        if amount == 0 and money_out_val > 0:
+            amount = money_out_val
+            trans_type = 'debit'
+        
+        fees_val = parse_cents(fees, limit=TYMEBANK_MAX_CENTS)
+        if amount == 0 and fees_val > 0:
+            amount = fees_val
+            trans_type = 'debit'
+            description = f"{description} (Fee)"
+        
+        if amount > 0:
+            self.emit(ParsedTransaction(
+                trans_date, description, amount, trans_type,
+                balance_cents=parse_cents(balance, limit=TYMEBANK_MAX_CENTS),
+                reference_format=TYMEBANK_REFERENCE, sequence=self.emitted
+            ))
+        
+        return 'scan'
+
+
+STATEMENT_FORMATS.register(StatementFormat(
+    'capitec', version=2, machine_class=CapitecMachine,
+    markers=('capitecbank.co.za', 'capitec bank limited', 'description category money in money out')
+))
+STATEMENT_FORMATS.register(StatementFormat(
+    'tymebank', version=2, machine_class=TymeBankMachine,
+    markers=('tymebank.co.za', 'tymebank limited', 'tyme bank limited', 'description fees money out money in')
+))
+STATEMENT_FORMATS.register(StatementFormat(GENERIC, version=1))
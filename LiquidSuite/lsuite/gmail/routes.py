@@ -17,6 +17,10 @@ from lsuite.models import (
 )
 from lsuite.gmail.services import GmailService
 from lsuite.gmail.csv_parser import CSVParser
+from lsuite.utils.pdf_text import pdf_buffer
+from lsuite.utils.blob_store import get_blob_store, send_blob
+from lsuite.utils.bulk_insert import BankTransactionWriter, statement_row
+from lsuite.utils.daily_rollup import subtract_query
 from lsuite.gmail import gmail_bp
 
 logger = logging.getLogger(__name__)
@@ -151,7 +155,8 @@ def import_statements():
     
     try:
         service = GmailService(current_app)
-        imported, skipped = service.fetch_statements(credential)
+        full_scan = request.form.get('full_scan') == '1'
+        imported, skipped = service.fetch_statements(credential, full_scan=full_scan)
         
         flash(f'✅ Imported {imported} statements ({skipped} already existed)', 'success')
     except Exception as e:
@@ -180,6 +185,27 @@ def statement_detail(id):
                          transactions=transactions)
 
 
+@gmail_bp.route('/statements/<int:id>/pdf')
+@gmail_bp.route('/statements/<int:id>/pdf/<int:index>')
+@login_required
+def statement_pdf(id, index=0):
+    """Download a statement PDF from the blob store"""
+    statement = EmailStatement.query.get_or_404(id)
+    
+    if statement.user_id != current_user.id:
+        flash('Unauthorized', 'danger')
+        return redirect(url_for('gmail.statements'))
+    
+    attachments = statement.attachments or []
+    store = get_blob_store(current_app)
+    if index >= len(attachments) or not store.exists(attachments[index].get('sha256')):
+        flash('PDF not stored yet - parse the statement to download it', 'warning')
+        return redirect(url_for('gmail.statement_detail', id=id))
+    
+    attachment = attachments[index]
+    return send_blob(store, attachment['sha256'], 'application/pdf', attachment['filename'])
+
+
 @gmail_bp.route('/statements/<int:id>/parse', methods=['POST'])
 @login_required
 def parse_statement(id):
@@ -272,7 +298,9 @@ def delete_statement(id):
         transaction_count = BankTransaction.query.filter_by(statement_id=statement.id).count()
         
         # Delete all related transactions (cascade should handle this, but being explicit)
-        BankTransaction.query.filter_by(statement_id=statement.id).delete()
+        statement_transactions = BankTransaction.query.filter_by(statement_id=statement.id)
+        subtract_query(statement_transactions)
+        statement_transactions.delete()
         
         # Delete the statement
         db.session.delete(statement)
@@ -292,26 +320,38 @@ def delete_statement(id):
 @gmail_bp.route('/statements/<int:id>/reparse', methods=['POST'])
 @login_required
 def reparse_statement(id):
-    """Delete existing transactions and re-parse statement"""
+    """Re-parse statement, keeping categorisation and sync state of unchanged transactions"""
     statement = EmailStatement.query.get_or_404(id)
     
     if statement.user_id != current_user.id:
         flash('Unauthorized', 'danger')
         return redirect(url_for('gmail.statements'))
     
+    credential = GoogleCredential.query.filter_by(
+        user_id=current_user.id,
+        is_authenticated=True
+    ).first()
+    
+    service = GmailService(current_app)
+    
+    if not service.can_reparse(statement):
+        flash('The PDF of this statement is not stored - upload it again to re-parse', 'warning')
+        return redirect(url_for('gmail.statement_detail', id=id))
+    
+    # Stored PDFs re-parse offline; anything else is downloaded from Gmail again
+    if not credential and not service.has_stored_pdfs(statement):
+        flash('No authenticated Google credential', 'danger')
+        return redirect(url_for('gmail.statement_detail', id=id))
+    
     try:
-        # Delete existing transactions
-        transaction_count = BankTransaction.query.filter_by(statement_id=statement.id).count()
-        BankTransaction.query.filter_by(statement_id=statement.id).delete()
-        db.session.commit()
+        transaction_count = service.download_and_parse_pdf(credential, statement)
         
-        flash(f'✅ Cleared {transaction_count} existing transactions. Click "Parse PDF" to re-extract.', 'info')
-        logger.info(f"User {current_user.id} cleared {transaction_count} transactions from statement {id}")
+        flash(f'✅ Re-parsed {transaction_count} transactions', 'success')
+        logger.info(f"User {current_user.id} re-parsed statement {id} ({transaction_count} transactions)")
         
     except Exception as e:
-        db.session.rollback()
-        flash(f'❌ Error clearing transactions: {str(e)}', 'danger')
-        logger.error(f"Error clearing transactions for statement {id}: {str(e)}", exc_info=True)
+        flash(f'❌ Re-parse failed: {str(e)}', 'danger')
+        logger.error(f"Error re-parsing statement {id}: {str(e)}", exc_info=True)
     
     return redirect(url_for('gmail.statement_detail', id=id))
 
@@ -450,6 +490,20 @@ def bulk_delete_transactions():
 # CSV Upload Routes
 # ============================================================================
 
+def _csv_transaction_rows(transactions):
+    """Map parsed CSV transactions onto bank_transactions columns"""
+    for trans_data in transactions:
+        yield {
+            'date': trans_data['transaction_date'],
+            'posting_date': trans_data['posting_date'],
+            'description': trans_data['description'],
+            'withdrawal': trans_data['debits'],
+            'deposit': trans_data['credits'],
+            'balance': trans_data['balance'],
+            'reference_number': trans_data['reference'],
+        }
+
+
 @gmail_bp.route('/upload-csv', methods=['GET', 'POST'])
 @login_required
 def upload_csv():
@@ -478,13 +532,7 @@ def upload_csv():
             bank_account = request.form.get('bank_account', '').strip()
             create_statement = request.form.get('create_statement') == 'on'
             
-            # Parse CSV
             parser = CSVParser()
-            transactions = parser.parse_csv(csv_data)
-            
-            if not transactions:
-                flash('No valid transactions found in CSV file', 'warning')
-                return redirect(request.url)
             
             # Create statement if requested
             statement_id = None
@@ -503,32 +551,21 @@ def upload_csv():
                 db.session.flush()
                 statement_id = statement.id
             
-            # Import ALL transactions without duplicate checking
-            # Bank statements are authoritative - they don't contain duplicates
-            imported_count = 0
-            
-            logger.info(f"Importing {len(transactions)} transactions from CSV (no duplicate filtering)")
+            # Rows stream from the parser straight into batched inserts
+            # Lines already imported from an overlapping export are skipped by fingerprint
+            with BankTransactionWriter(user_id=current_user.id, statement_id=statement_id) as writer:
+                parsed_count = writer.write(_csv_transaction_rows(parser.iter_csv(csv_data)))
             
-            for trans_data in transactions:
-                # Create transaction with proper field mapping
-                transaction = BankTransaction(
-                    user_id=current_user.id,
-                    statement_id=statement_id,
-                    date=trans_data['transaction_date'],
-                    posting_date=trans_data['posting_date'],
-                    description=trans_data['description'],
-                    withdrawal=trans_data['debits'],
-                    deposit=trans_data['credits'],
-                    balance=trans_data['balance'],
-                    reference_number=trans_data['reference']
-                )
-                db.session.add(transaction)
-                imported_count += 1
+            if not parsed_count:
+                db.session.rollback()
+                flash('No valid transactions found in CSV file', 'warning')
+                return redirect(request.url)
             
             db.session.commit()
             
-            logger.info(f"CSV import completed: {imported_count} transactions imported")
-            flash(f'✅ Successfully imported {imported_count} transactions', 'success')
+            imported_count = writer.rows
+            logger.info(f"CSV import completed: {imported_count} transactions imported, {writer.skipped} already imported")
+            flash(f'✅ Successfully imported {imported_count} transactions ({writer.skipped} already imported)', 'success')
             return redirect(url_for('gmail.transactions'))
             
         except Exception as e:
@@ -567,6 +604,7 @@ def bulk_csv_import():
             return redirect(request.url)
         
         total_imported = 0
+        total_skipped = 0
         files_processed = 0
         
         parser = CSVParser()
@@ -577,7 +615,6 @@ def bulk_csv_import():
             
             try:
                 csv_data = file.read()
-                transactions = parser.parse_csv(csv_data)
                 
                 # Create statement for this file
                 statement = EmailStatement(
@@ -593,25 +630,12 @@ def bulk_csv_import():
                 db.session.add(statement)
                 db.session.flush()
                 
-                # Import ALL transactions without duplicate checking
-                imported = 0
-                
-                for trans_data in transactions:
-                    transaction = BankTransaction(
-                        user_id=current_user.id,
-                        statement_id=statement.id,
-                        date=trans_data['transaction_date'],
-                        posting_date=trans_data['posting_date'],
-                        description=trans_data['description'],
-                        withdrawal=trans_data['debits'],
-                        deposit=trans_data['credits'],
-                        balance=trans_data['balance'],
-                        reference_number=trans_data['reference']
-                    )
-                    db.session.add(transaction)
-                    imported += 1
+                # Lines already imported (overlapping exports) are skipped by fingerprint
+                with BankTransactionWriter(user_id=current_user.id, statement_id=statement.id) as writer:
+                    writer.write(_csv_transaction_rows(parser.iter_csv(csv_data)))
                 
-                total_imported += imported
+                total_imported += writer.rows
+                total_skipped += writer.skipped
                 files_processed += 1
                 
             except Exception as e:
@@ -620,8 +644,10 @@ def bulk_csv_import():
         
         db.session.commit()
         
-        logger.info(f"Bulk CSV import completed: {files_processed} files, {total_imported} transactions")
-        flash(f'✅ Processed {files_processed} files: {total_imported} transactions imported', 'success')
+        logger.info(f"Bulk CSV import completed: {files_processed} files, {total_imported} transactions, "
+                    f"{total_skipped} already imported")
+        flash(f'✅ Processed {files_processed} files: {total_imported} transactions imported '
+              f'({total_skipped} already imported)', 'success')
         return redirect(url_for('gmail.transactions'))
     
     return render_template('gmail/bulk_csv_import.html')
@@ -674,15 +700,8 @@ def upload_pdf():
                 flash('Invalid date format', 'warning')
                 return redirect(request.url)
             
-            # Save PDF temporarily
-            import tempfile
-            import os
-            
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-                file.save(temp_file.name)
-                temp_path = temp_file.name
-            
-            try:
+            # Parse straight from the upload stream - large uploads are memory-mapped
+            with pdf_buffer(file) as pdf_data:
                 # Create statement record
                 statement = EmailStatement(
                     user_id=current_user.id,
@@ -693,6 +712,13 @@ def upload_pdf():
                     statement_date=statement_date.date() if isinstance(statement_date, datetime) else statement_date,
                     bank_name=bank_name.lower(),
                     has_pdf=True,
+                    attachments=[{
+                        'attachment_id': None,
+                        'filename': secure_filename(file.filename),
+                        'size': len(pdf_data),
+                        'part_id': None,
+                        'sha256': get_blob_store(current_app).put(pdf_data),
+                    }],
                     is_processed=False,
                     state='draft'
                 )
@@ -707,54 +733,37 @@ def upload_pdf():
                 # Auto-parse if requested
                 if auto_parse:
                     from lsuite.gmail.parsers import PDFParser
-                    from lsuite.gmail.parsers_capitec import CapitecPDFParser
                     
-                    # Read PDF file
-                    with open(temp_path, 'rb') as pdf_file:
-                        pdf_data = pdf_file.read()
-                    
-                    # Use Capitec parser for Capitec statements
-                    if bank_name.lower() == 'capitec':
-                        parser = CapitecPDFParser()
-                        result = parser.parse_pdf(
-                            pdf_data=pdf_data,
-                            password=pdf_password if pdf_password else None
-                        )
-                        transactions = result['transactions']
-                        
-                        # Log statement info
-                        if result.get('statement_info'):
-                            logger.info(f"Capitec Statement Info: {result['statement_info']}")
-                    else:
-                        parser = PDFParser()
-                        transactions = parser.parse_pdf(
-                            pdf_data=pdf_data,
-                            bank_name=bank_name.lower(),
-                            password=pdf_password if pdf_password else None
-                        )
+                    # The bank is detected from the first page, falling back to the selected bank
+                    parser = PDFParser(workers=current_app.config.get('PDF_EXTRACT_WORKERS', 1))
+                    transactions = parser.parse_pdf(
+                        pdf_data=pdf_data,
+                        bank_name=bank_name.lower(),
+                        password=pdf_password if pdf_password else None
+                    )
+                    logger.info(f"Parsed upload with {parser.parser_version}")
                     
                     if not transactions:
                         db.session.commit()
                         flash('⚠️ Statement uploaded but no transactions found. You may need to check the PDF format.', 'warning')
                         return redirect(url_for('gmail.statement_detail', id=statement.id))
                     
-                    # Import ALL transactions without duplicate checking
-                    # Bank statements are authoritative - they don't contain duplicates
-                    imported_count = 0
+                    # Lines already imported from another upload are skipped by fingerprint.
+                    # Rows are built like a Gmail parse's so re-parsing the statement matches them
+                    bank_account = GmailService(current_app)._get_or_create_bank_account(statement)
+                    writer = BankTransactionWriter(
+                        user_id=current_user.id,
+                        bank_account_id=bank_account.id,
+                        statement_id=statement.id
+                    )
                     
-                    logger.info(f"Importing {len(transactions)} transactions from PDF (no duplicate filtering)")
+                    logger.info(f"Importing {len(transactions)} transactions from PDF")
                     
                     for trans_data in transactions:
-                        # Convert parser format to database format
-                        trans_date = trans_data.get('date')
-                        description = trans_data.get('description', '')
-                        amount = trans_data.get('amount', 0)
-                        trans_type = trans_data.get('type', 'debit')
-                        category = trans_data.get('category')
-                        
-                        # Determine deposit/withdrawal based on type
-                        deposit = amount if trans_type == 'credit' else 0
-                        withdrawal = amount if trans_type == 'debit' else 0
+                        # Parsed records carry exact Decimal deposit/withdrawal from integer cents
+                        trans_date = trans_data.date
+                        trans_type = trans_data.type
+                        category = trans_data.category
                         
                         # Map Capitec category to TransactionCategory
                         from lsuite.models import TransactionCategory
@@ -783,23 +792,15 @@ def upload_pdf():
                                 category_id = new_category.id
                                 logger.info(f"Created new category: {category}")
                         
-                        # Create transaction with category info
-                        transaction = BankTransaction(
-                            user_id=current_user.id,
-                            statement_id=statement.id,
-                            date=trans_date,
+                        # Queue transaction with category info
+                        writer.add(
+                            **statement_row(trans_data),
                             posting_date=trans_date,  # Use same date if posting_date not provided
-                            description=description,
-                            withdrawal=withdrawal,
-                            deposit=deposit,
-                            balance=trans_data.get('balance'),
-                            reference_number=trans_data.get('reference', ''),
                             category_id=category_id,
                             notes=f"Capitec Category: {category}" if category else None
                         )
-                        db.session.add(transaction)
-                        imported_count += 1
                     
+                    imported_count = writer.close()
                     statement.is_processed = True
                     statement.state = 'parsed'
                     statement.transaction_count = imported_count
@@ -807,17 +808,16 @@ def upload_pdf():
                     db.session.commit()
                     
                     logger.info(f"PDF upload completed: {imported_count} transactions imported")
-                    flash(f'✅ Successfully uploaded and parsed! {imported_count} transactions imported', 'success')
+                    flash(f'✅ Successfully uploaded and parsed! {imported_count} transactions imported'
+                          f' ({writer.skipped} already imported)', 'success')
+                    if parser.balance_gaps:
+                        flash(f'⚠️ The running balance does not add up in {len(parser.balance_gaps)} place(s) - '
+                              f'some statement lines may have been missed.', 'warning')
                 else:
                     db.session.commit()
                     flash(f'✅ Statement uploaded successfully! You can parse it from the statement detail page.', 'success')
                 
                 return redirect(url_for('gmail.statement_detail', id=statement.id))
-                
-            finally:
-                # Clean up temporary file
-                if os.path.exists(temp_path):
-                    os.unlink(temp_path)
             
         except ValueError as e:
             db.session.rollback()
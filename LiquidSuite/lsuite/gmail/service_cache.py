@@ -0,0 +1,103 @@
+"""
+Gmail Service Cache - Reuse built API clients per credential
+Building a client parses the Gmail discovery document, and a fresh
+google-auth Credentials object knows nothing of tokens already refreshed, so
+both are kept per credential in a bounded LRU
+"""
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Idle clients kept per credential - one per thread that used it at once
+MAX_IDLE_PER_CREDENTIAL = 4
+
+
+class _Entry:
+    """Shared Credentials and idle clients of one GoogleCredential"""
+
+    __slots__ = ('creds', 'refresh_token', 'idle')
+
+    def __init__(self, creds, refresh_token):
+        self.creds = creds
+        self.refresh_token = refresh_token
+        self.idle = []
+
+
+class ServiceCache:
+    """
+    LRU of Gmail API clients keyed on credential ID
+
+    Client objects are not thread-safe, so a client is checked out for the
+    duration of its use and returned afterwards; a thread that finds none
+    idle builds another for the same credential. Every client of a credential
+    shares one Credentials object, so a token refreshed through one is used
+    by all of them.
+    """
+
+    def __init__(self, max_credentials=32):
+        """
+        Args:
+            max_credentials: Credentials kept before the least recently used is dropped
+        """
+        self.max_credentials = max_credentials
+        self.builds = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def checkout(self, credential, make_credentials, build):
+        """
+        Borrow a client for a credential
+
+        Args:
+            credential: GoogleCredential model
+            make_credentials: Called with the credential to create google-auth Credentials
+            build: Called with (credential, creds) to build a new client
+
+        Yields:
+            (client, google-auth Credentials)
+        """
+        with self._lock:
+            entry = self._entries.get(credential.id)
+            if entry is None or entry.refresh_token != credential.refresh_token:
+                # New or re-authorised since it was cached
+                entry = _Entry(make_credentials(credential), credential.refresh_token)
+                self._entries[credential.id] = entry
+                while len(self._entries) > self.max_credentials:
+                    self._entries.popitem(last=False)
+            else:
+                self._entries.move_to_end(credential.id)
+            client = entry.idle.pop() if entry.idle else None
+
+        if client is None:
+            client = build(credential, entry.creds)
+            self.builds += 1
+            logger.debug(f"Built Gmail client for credential {credential.id}")
+
+        try:
+            yield client, entry.creds
+        finally:
+            with self._lock:
+                if len(entry.idle) < MAX_IDLE_PER_CREDENTIAL:
+                    entry.idle.append(client)
+
+    def invalidate(self, credential_id):
+        """Forget the clients of a credential"""
+        with self._lock:
+            self._entries.pop(credential_id, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def get_service_cache(app):
+    """The app's Gmail client cache, created on first use"""
+    cache = app.extensions.get('gmail_service_cache')
+    if cache is None:
+        cache = app.extensions.setdefault(
+            'gmail_service_cache', ServiceCache(app.config.get('GMAIL_SERVICE_CACHE_SIZE', 32))
+        )
+    return cache
@@ -4,19 +4,44 @@ Gmail Service - Gmail API integration
 """
 import base64
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 import pytz
 import requests
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from email.utils import parsedate_to_datetime
 
 from lsuite.extensions import db
-from lsuite.models import EmailStatement, BankTransaction, BankAccount
+from lsuite.models import EmailStatement, BankAccount, GoogleCredential
 from lsuite.gmail.parsers import PDFParser
+from lsuite.gmail.rate_limit import QUOTA_UNITS, get_quota_bucket
+from lsuite.gmail.service_cache import get_service_cache
+from lsuite.utils.text_cache import get_text_cache
+from lsuite.utils.blob_store import get_blob_store
+from lsuite.utils.bulk_insert import BankTransactionWriter, statement_row
 
 logger = logging.getLogger(__name__)
 
+# Gmail searches that find bank statement emails
+STATEMENT_QUERIES = [
+    'from:@tymebank.co.za subject:Statement',
+    'from:@capitecbank.co.za subject:Statement',
+    'subject:"bank statement"',
+]
+
+# Requests per Gmail batch HTTP call (the API allows at most 100)
+GMAIL_BATCH_SIZE = 100
+
+# Page sizes for message searches and history listings (API maximum 500)
+LIST_PAGE_SIZE = 500
+HISTORY_PAGE_SIZE = 500
+
+# gmail_id prefixes of statements that were uploaded or batch loaded, not emailed
+LOCAL_STATEMENT_PREFIXES = ('PDF-', 'BATCH-', 'CSV-')
+
 
 class GmailService:
     """Gmail API service"""
@@ -74,254 +99,614 @@ class GmailService:
             credential.is_authenticated = True
             
             db.session.commit()
+            get_service_cache(self.app).invalidate(credential.id)
             return True
             
         except Exception as e:
             logger.error(f"Token exchange failed: {str(e)}")
             return False
     
-    def build_service(self, credential):
-        """Build Gmail API service"""
-        creds = Credentials(
+    def google_credentials(self, credential):
+        """google-auth Credentials for a stored credential"""
+        return Credentials(
             token=credential.access_token,
             refresh_token=credential.refresh_token,
             token_uri='https://oauth2.googleapis.com/token',
             client_id=credential.client_id,
             client_secret=credential.client_secret,
+            # Known expiry lets google-auth refresh up front instead of after a 401
+            expiry=credential.token_expiry,
         )
+    
+    def build_service(self, credential, creds=None):
+        """Build Gmail API service from the discovery document bundled with the client library"""
+        if creds is None:
+            creds = self.google_credentials(credential)
         
-        return build('gmail', 'v1', credentials=creds)
+        return build('gmail', 'v1', credentials=creds, static_discovery=True, cache_discovery=False)
     
-    def fetch_statements(self, credential):
-        """Fetch bank statements from Gmail"""
-        service = self.build_service(credential)
-        
-        queries = [
-            'from:@tymebank.co.za subject:Statement',
-            'from:@capitecbank.co.za subject:Statement',
-            'subject:"bank statement"',
-        ]
+    @contextmanager
+    def gmail_service(self, credential):
+        """
+        Borrow a cached Gmail API service for a credential
         
-        all_messages = []
-        for query in queries:
+        An access token refreshed while the service was in use is copied back
+        to the credential, to be saved with the caller's next commit.
+        """
+        cache = get_service_cache(self.app)
+        with cache.checkout(credential, self.google_credentials, self.build_service) as (service, creds):
             try:
-                results = service.users().messages().list(
-                    userId='me', 
-                    q=query, 
-                    maxResults=50
-                ).execute()
-                messages = results.get('messages', [])
-                all_messages.extend(messages)
-                logger.info(f"Query '{query}' returned {len(messages)} messages")
-            except Exception as e:
-                logger.error(f"Gmail search error for query '{query}': {str(e)}")
-                continue
+                yield service
+            finally:
+                self._store_refreshed_token(credential, creds)
+    
+    def _store_refreshed_token(self, credential, creds):
+        """Copy a refreshed access token onto the credential"""
+        if creds.token and creds.token != credential.access_token:
+            credential.access_token = creds.token
+            credential.token_expiry = creds.expiry
+            logger.info(f"Access token refreshed for credential {credential.id}")
+    
+    def fetch_statements(self, credential, full_scan=False):
+        """
+        Fetch bank statements from Gmail
         
-        logger.info(f"Found {len(all_messages)} messages total")
+        With a stored history watermark only messages added since the last
+        import are considered - one history call when nothing arrived. The
+        first import, an expired watermark or full_scan=True page through
+        every statement search instead. Message IDs are merged, checked
+        against the database in one query, fetched through batch HTTP
+        requests and inserted in bulk.
         
-        imported_count = 0
-        skipped_count = 0
+        Requests are charged to the mailbox's quota bucket when
+        GMAIL_QUOTA_UNITS_PER_SECOND is set.
         
-        for msg in all_messages:
-            try:
-                # Check if already exists using gmail_id
-                if EmailStatement.query.filter_by(gmail_id=msg['id']).first():
-                    skipped_count += 1
-                    continue
-                
-                # Fetch full message
-                msg_data = service.users().messages().get(
-                    userId='me', 
-                    id=msg['id'], 
-                    format='full'
-                ).execute()
-                
-                # Extract headers
-                headers = msg_data['payload']['headers']
-                subject = next((h['value'] for h in headers if h['name'] == 'Subject'), 'No Subject')
-                sender = next((h['value'] for h in headers if h['name'] == 'From'), 'Unknown')
-                date_str = next((h['value'] for h in headers if h['name'] == 'Date'), '')
-                
-                # Parse date
-                try:
-                    msg_date = parsedate_to_datetime(date_str)
-                    if msg_date.tzinfo:
-                        msg_date = msg_date.astimezone(pytz.UTC).replace(tzinfo=None)
-                except Exception as e:
-                    logger.warning(f"Date parse error: {e}")
-                    msg_date = datetime.utcnow()
-                
-                # Extract body
-                body_html = ''
-                body_text = ''
-                
-                if 'parts' in msg_data['payload']:
-                    for part in msg_data['payload']['parts']:
-                        try:
-                            if part['mimeType'] == 'text/html' and 'data' in part.get('body', {}):
-                                body_html = base64.urlsafe_b64decode(
-                                    part['body']['data']
-                                ).decode('utf-8', errors='ignore')
-                            elif part['mimeType'] == 'text/plain' and 'data' in part.get('body', {}):
-                                body_text = base64.urlsafe_b64decode(
-                                    part['body']['data']
-                                ).decode('utf-8', errors='ignore')
-                        except Exception as e:
-                            logger.warning(f"Part decode error: {e}")
-                            continue
-                elif 'body' in msg_data['payload'] and msg_data['payload']['body'].get('data'):
-                    try:
-                        body_text = base64.urlsafe_b64decode(
-                            msg_data['payload']['body']['data']
-                        ).decode('utf-8', errors='ignore')
-                    except Exception as e:
-                        logger.warning(f"Body decode error: {e}")
-                
-                # Determine bank name
-                bank_name = 'other'
-                sender_lower = sender.lower()
-                if 'tymebank' in sender_lower:
-                    bank_name = 'tymebank'
-                elif 'capitec' in sender_lower:
-                    bank_name = 'capitec'
-                
-                # Check if has PDF attachment
-                has_pdf = False
-                if 'parts' in msg_data['payload']:
-                    for part in msg_data['payload']['parts']:
-                        filename = part.get('filename', '').lower()
-                        if filename.endswith('.pdf'):
-                            has_pdf = True
-                            break
-                
-                # Create statement with correct field names
-                statement = EmailStatement(
-                    user_id=credential.user_id,
-                    gmail_id=msg['id'],
-                    subject=subject,
-                    sender=sender,
-                    received_date=msg_date,
-                    bank_name=bank_name,
-                    body_html=body_html,
-                    body_text=body_text,
-                    has_pdf=has_pdf,
-                    state='new'
-                )
-                
-                db.session.add(statement)
-                imported_count += 1
-                
-                logger.info(f"Imported: {subject[:50]}")
-                
-            except Exception as e:
-                logger.error(f"Error importing message: {str(e)}")
-                continue
+        Returns:
+            (imported_count, skipped_count)
+        """
+        quota = self.quota_bucket(credential)
+        with self.gmail_service(credential) as service:
+            rows, skipped_count, history_id, failed_count = self._collect_statements(
+                service, credential, full_scan, quota
+            )
+        
+        # Messages that could not be fetched are retried next time from the old watermark
+        if not failed_count:
+            credential.history_id = history_id
+            credential.last_sync_date = datetime.utcnow()
         
         try:
+            if rows:
+                db.session.bulk_insert_mappings(EmailStatement, rows)
             db.session.commit()
-            logger.info(f"Successfully imported {imported_count} statements, skipped {skipped_count}")
+            logger.info(f"Successfully imported {len(rows)} statements, skipped {skipped_count}")
         except Exception as e:
             db.session.rollback()
             logger.error(f"Commit error: {str(e)}")
             raise
         
-        return imported_count, skipped_count
+        return len(rows), skipped_count
     
-    def download_and_parse_pdf(self, credential, statement):
-        """Download PDF attachment and parse transactions"""
-        service = self.build_service(credential)
+    def quota_bucket(self, credential):
+        """The credential's shared quota bucket, None when unlimited"""
+        return get_quota_bucket(credential.id, self.app.config.get('GMAIL_QUOTA_UNITS_PER_SECOND'))
+    
+    def _collect_statements(self, service, credential, full_scan, quota):
+        """
+        Find and fetch the statement messages not yet imported
         
-        # Delete existing transactions
-        BankTransaction.query.filter_by(statement_id=statement.id).delete()
+        Returns:
+            (email_statements rows, skipped count, new historyId, failed fetch count)
+        """
+        new_ids, skipped_count, history_id = self.new_message_ids(service, credential, full_scan, quota)
         
-        try:
-            # Get message with attachments
-            msg_data = service.users().messages().get(
+        rows = []
+        failed_count = 0
+        for message_id, msg_data in self._get_messages(service, new_ids, quota=quota):
+            if msg_data is None:
+                failed_count += 1
+                continue
+            try:
+                rows.append(self._statement_row(credential, msg_data))
+                logger.info(f"Imported: {rows[-1]['subject'][:50]}")
+            except Exception as e:
+                logger.error(f"Error importing message {message_id}: {str(e)}")
+        
+        return rows, skipped_count, history_id, failed_count
+    
+    def new_message_ids(self, service, credential, full_scan=False, quota=None):
+        """
+        Statement message IDs that are not in the database yet
+        
+        Uses the history watermark when there is one, otherwise (or when it
+        has expired, or full_scan is set) every statement search.
+        
+        Returns:
+            (new message IDs, skipped count, historyId to store afterwards)
+        """
+        message_ids = None
+        if credential.history_id and not full_scan:
+            try:
+                message_ids, history_id = self._incremental_message_ids(service, credential, quota)
+            except HttpError as e:
+                if e.resp.status != 404:
+                    raise
+                logger.warning(f"History watermark {credential.history_id} expired - running full scan")
+        
+        if message_ids is None:
+            # Read the watermark first so mail arriving during the scan is seen next time
+            history_id = self._current_history_id(service, quota)
+            message_ids = self._list_message_ids(service, STATEMENT_QUERIES, quota)
+        
+        existing_ids = self._existing_gmail_ids(message_ids)
+        new_ids = [message_id for message_id in message_ids if message_id not in existing_ids]
+        skipped_count = len(message_ids) - len(new_ids)
+        
+        logger.info(f"Found {len(message_ids)} messages, {len(new_ids)} not yet imported")
+        
+        return new_ids, skipped_count, history_id
+    
+    def fetch_all_statements(self, credential_ids, max_workers=None):
+        """
+        Import statements for several credentials at once
+        
+        Each credential runs on its own pool thread inside its own app
+        context, so it gets its own database session, and draws on its own
+        quota bucket - total time follows the slowest mailbox rather than the
+        sum of them all.
+        
+        Args:
+            credential_ids: GoogleCredential IDs to import
+            max_workers: Pool size (defaults to GMAIL_IMPORT_WORKERS)
+        
+        Returns:
+            List of dicts with credential_id, name, imported, skipped and
+            error (None on success), in the order given
+        """
+        credential_ids = list(credential_ids)
+        if not credential_ids:
+            return []
+        workers = max_workers or self.app.config.get('GMAIL_IMPORT_WORKERS', 4)
+        with ThreadPoolExecutor(max_workers=min(workers, len(credential_ids))) as pool:
+            return list(pool.map(self._import_credential, credential_ids))
+    
+    def _import_credential(self, credential_id):
+        """Pool worker for fetch_all_statements"""
+        with self.app.app_context():
+            result = {'credential_id': credential_id, 'name': None, 'imported': 0, 'skipped': 0, 'error': None}
+            try:
+                credential = db.session.get(GoogleCredential, credential_id)
+                result['name'] = credential.name
+                result['imported'], result['skipped'] = self.fetch_statements(credential)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Import failed for credential {credential_id}: {str(e)}")
+                result['error'] = str(e)
+            return result
+    
+    def _charge(self, quota, method, count=1):
+        """Take the quota units for count calls of a Gmail method"""
+        if quota is not None:
+            quota.acquire(QUOTA_UNITS[method] * count)
+    
+    def _current_history_id(self, service, quota=None):
+        """The mailbox's latest historyId"""
+        self._charge(quota, 'users.getProfile')
+        return service.users().getProfile(userId='me').execute().get('historyId')
+    
+    def _incremental_message_ids(self, service, credential, quota=None):
+        """
+        Statement message IDs added since the credential's history watermark
+        
+        Raises:
+            HttpError: 404 when the watermark is too old for the history API
+        
+        Returns:
+            (message IDs, new historyId)
+        """
+        added_ids, history_id = self._history_added_ids(service, credential.history_id, quota)
+        if not added_ids:
+            return [], history_id
+        
+        # Only the searches can tell statements apart, so run them over recent mail
+        queries = STATEMENT_QUERIES
+        if credential.last_sync_date:
+            since = credential.last_sync_date - timedelta(days=1)
+            after = int(since.replace(tzinfo=pytz.UTC).timestamp())
+            queries = [f"{query} after:{after}" for query in STATEMENT_QUERIES]
+        
+        added_ids = set(added_ids)
+        message_ids = [message_id for message_id in self._list_message_ids(service, queries, quota)
+                       if message_id in added_ids]
+        return message_ids, history_id
+    
+    def _history_added_ids(self, service, start_history_id, quota=None):
+        """
+        IDs of messages added since a historyId, following nextPageToken
+        
+        Returns:
+            (message IDs, latest historyId)
+        """
+        message_ids = {}
+        history_id = start_history_id
+        page_token = None
+        while True:
+            self._charge(quota, 'history.list')
+            response = service.users().history().list(
                 userId='me',
-                id=statement.gmail_id
+                startHistoryId=start_history_id,
+                historyTypes='messageAdded',
+                maxResults=HISTORY_PAGE_SIZE,
+                pageToken=page_token
             ).execute()
+            for record in response.get('history', []):
+                message_ids.update((added['message']['id'], None) for added in record.get('messagesAdded', []))
+            history_id = response.get('historyId', history_id)
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                break
+        
+        logger.info(f"History since {start_history_id}: {len(message_ids)} messages added")
+        return list(message_ids), history_id
+    
+    def _list_message_ids(self, service, queries, quota=None):
+        """
+        Run the searches side by side and merge their message IDs
+        
+        Every round sends the next page of each unfinished search in a single
+        batch HTTP request, so the searches cost one round trip per page
+        rather than one each. Search errors are raised rather than skipped,
+        so the watermark is not moved past messages that were never listed.
+        """
+        found = {query: [] for query in queries}
+        page_tokens = {query: None for query in queries}
+        while page_tokens:
+            responses = {}
+            errors = []
             
-            pdf_data = None
+            def collect(request_id, response, exception):
+                if exception is not None:
+                    errors.append(exception)
+                responses[request_id] = response
             
-            if 'parts' in msg_data['payload']:
-                for part in msg_data['payload']['parts']:
-                    filename = part.get('filename', '')
+            self._charge(quota, 'messages.list', len(page_tokens))
+            batch = service.new_batch_http_request(callback=collect)
+            pending = list(page_tokens)
+            for index, query in enumerate(pending):
+                batch.add(
+                    service.users().messages().list(
+                        userId='me',
+                        q=query,
+                        maxResults=LIST_PAGE_SIZE,
+                        pageToken=page_tokens[query]
+                    ),
+                    request_id=str(index)
+                )
+            batch.execute()
+            if errors:
+                raise errors[0]
+            
+            page_tokens = {}
+            for index, query in enumerate(pending):
+                results = responses[str(index)]
+                found[query].extend(msg['id'] for msg in results.get('messages', []))
+                if results.get('nextPageToken'):
+                    page_tokens[query] = results['nextPageToken']
+        
+        message_ids = {}
+        for query in queries:
+            logger.info(f"Query '{query}' returned {len(found[query])} messages")
+            message_ids.update((message_id, None) for message_id in found[query])
+        return list(message_ids)
+    
+    def _existing_gmail_ids(self, message_ids):
+        """Message IDs that already have a statement, in a single IN query"""
+        if not message_ids:
+            return set()
+        rows = db.session.query(EmailStatement.gmail_id).filter(
+            EmailStatement.gmail_id.in_(message_ids)
+        ).all()
+        return {gmail_id for gmail_id, in rows}
+    
+    def _get_messages(self, service, message_ids, format='full', quota=None):
+        """
+        Fetch messages with Gmail batch requests of up to GMAIL_BATCH_SIZE
+        
+        Yields:
+            (message_id, message) in the order given - message is None if
+            fetching it failed
+        """
+        for start in range(0, len(message_ids), GMAIL_BATCH_SIZE):
+            chunk = message_ids[start:start + GMAIL_BATCH_SIZE]
+            responses = {}
+            
+            def collect(request_id, response, exception):
+                if exception is not None:
+                    logger.error(f"Error fetching message {request_id}: {str(exception)}")
+                    response = None
+                responses[request_id] = response
+            
+            self._charge(quota, 'messages.get', len(chunk))
+            batch = service.new_batch_http_request(callback=collect)
+            for message_id in chunk:
+                batch.add(
+                    service.users().messages().get(userId='me', id=message_id, format=format),
+                    request_id=message_id
+                )
+            batch.execute()
+            
+            for message_id in chunk:
+                yield message_id, responses.get(message_id)
+    
+    def _statement_row(self, credential, msg_data):
+        """Build the email_statements row for a full Gmail message"""
+        # Extract headers
+        headers = msg_data['payload']['headers']
+        subject = next((h['value'] for h in headers if h['name'] == 'Subject'), 'No Subject')
+        sender = next((h['value'] for h in headers if h['name'] == 'From'), 'Unknown')
+        date_str = next((h['value'] for h in headers if h['name'] == 'Date'), '')
+        
+        # Parse date
+        try:
+            msg_date = parsedate_to_datetime(date_str)
+            if msg_date.tzinfo:
+                msg_date = msg_date.astimezone(pytz.UTC).replace(tzinfo=None)
+        except Exception as e:
+            logger.warning(f"Date parse error: {e}")
+            msg_date = datetime.utcnow()
+        
+        # Extract body
+        body_html = ''
+        body_text = ''
+        
+        if 'parts' in msg_data['payload']:
+            for part in msg_data['payload']['parts']:
+                try:
+                    if part['mimeType'] == 'text/html' and 'data' in part.get('body', {}):
+                        body_html = base64.urlsafe_b64decode(
+                            part['body']['data']
+                        ).decode('utf-8', errors='ignore')
+                    elif part['mimeType'] == 'text/plain' and 'data' in part.get('body', {}):
+                        body_text = base64.urlsafe_b64decode(
+                            part['body']['data']
+                        ).decode('utf-8', errors='ignore')
+                except Exception as e:
+                    logger.warning(f"Part decode error: {e}")
+                    continue
+        elif 'body' in msg_data['payload'] and msg_data['payload']['body'].get('data'):
+            try:
+                body_text = base64.urlsafe_b64decode(
+                    msg_data['payload']['body']['data']
+                ).decode('utf-8', errors='ignore')
+            except Exception as e:
+                logger.warning(f"Body decode error: {e}")
+        
+        # Determine bank name
+        bank_name = 'other'
+        sender_lower = sender.lower()
+        if 'tymebank' in sender_lower:
+            bank_name = 'tymebank'
+        elif 'capitec' in sender_lower:
+            bank_name = 'capitec'
+        
+        # PDF attachments are recorded so parsing can download them directly
+        attachments = self.pdf_attachments(msg_data)
+        
+        return {
+            'user_id': credential.user_id,
+            'gmail_id': msg_data['id'],
+            'thread_id': msg_data.get('threadId'),
+            'subject': subject,
+            'sender': sender,
+            'received_date': msg_date,
+            'bank_name': bank_name,
+            'body_html': body_html,
+            'body_text': body_text,
+            'has_pdf': bool(attachments),
+            'attachments': attachments,
+            'state': 'new',
+        }
+    
+    def download_and_parse_pdf(self, credential, statement):
+        """
+        Download the statement's PDF attachments and parse transactions
+        
+        PDFs kept in the blob store are read from there. Otherwise attachment
+        IDs recorded at import are downloaded directly; statements imported
+        before they were recorded fetch the message once and keep the IDs for
+        next time. Downloads are added to the blob store. Transactions of
+        every PDF in the email are stored against the statement.
+        
+        Parsing a statement again diffs the output against its existing
+        transactions by fingerprint: unchanged lines keep their category and
+        ERPNext sync state, and only new or vanished lines are written. If that
+        fails, a statement that was already parsed keeps its state and
+        transactions; anything else is marked as an error.
+        """
+        was_parsed = statement.state == 'parsed'
+        try:
+            store = get_blob_store(self.app)
+            attachments = statement.attachments
+            if self.has_stored_pdfs(statement):
+                pdfs = [store.get(attachment['sha256']) for attachment in attachments]
+                logger.info(f"Read {len(pdfs)} PDF(s) from the blob store")
+            else:
+                with self.gmail_service(credential) as service:
+                    if attachments is None:
+                        msg_data = service.users().messages().get(
+                            userId='me',
+                            id=statement.gmail_id
+                        ).execute()
+                        attachments = self.pdf_attachments(msg_data)
                     
-                    if filename.lower().endswith('.pdf'):
-                        if 'body' in part and 'attachmentId' in part['body']:
-                            att_id = part['body']['attachmentId']
-                            attachment = service.users().messages().attachments().get(
-                                userId='me',
-                                messageId=statement.gmail_id,
-                                id=att_id
-                            ).execute()
-                            
-                            pdf_data = base64.urlsafe_b64decode(
-                                attachment['data'].encode('UTF-8')
-                            )
-                            logger.info(f"Downloaded PDF: {filename} ({len(pdf_data)} bytes)")
-                            break
+                    pdfs = []
+                    if attachments:
+                        pdfs = self.download_attachments(service, statement.gmail_id, attachments)
+                        for attachment, pdf_data in zip(attachments, pdfs):
+                            logger.info(f"Downloaded PDF: {attachment['filename']} ({len(pdf_data)} bytes)")
+                statement.attachments = self.store_attachments(attachments, pdfs)
             
-            if not pdf_data:
+            if not pdfs:
                 raise Exception('No PDF attachment found')
             
-            # Parse PDF
-            parser = PDFParser()
-            transactions = parser.parse_pdf(
-                pdf_data,
-                statement.bank_name,
-                statement.pdf_password
-            )
+            password = statement.pdf_password or self.saved_pdf_password(statement.user_id, statement.bank_name)
             
-            logger.info(f"Parsed {len(transactions)} transactions from PDF")
+            # Parse PDF page by page - rows are written while later pages are still being extracted
+            parser = PDFParser(
+                workers=self.app.config.get('PDF_EXTRACT_WORKERS', 1),
+                text_cache=get_text_cache(self.app)
+            )
+            transactions = (
+                trans
+                for pdf_data in pdfs
+                for trans in parser.iter_transactions(pdf_data, statement.bank_name, password)
+            )
+            writer = BankTransactionWriter(
+                reparse=True,
+                user_id=statement.user_id,
+                statement_id=statement.id,
+                currency='ZAR'
+            )
+            bank_account = None
             
-            # Create transaction records
             for trans in transactions:
-                # Try to find or create the bank account
-                bank_account = BankAccount.query.filter_by(
-                    user_id=statement.user_id,
-                    bank_name=statement.bank_name
-                ).first()
-                
-                # If no bank account exists, create one
-                if not bank_account:
-                    bank_account = BankAccount(
-                        user_id=statement.user_id,
-                        account_name=f"{statement.bank_name.title()} Account",
-                        bank_name=statement.bank_name,
-                        currency='ZAR',
-                        is_active=True
-                    )
-                    db.session.add(bank_account)
-                    db.session.flush()  # Get the ID without committing
-                
-                transaction = BankTransaction(
-                    user_id=statement.user_id,
-                    bank_account_id=bank_account.id,
-                    statement_id=statement.id,
-                    date=trans['date'],
-                    description=trans['description'],
-                    deposit=trans['amount'] if trans['type'] == 'credit' else 0.00,
-                    withdrawal=trans['amount'] if trans['type'] == 'debit' else 0.00,
-                    reference_number=trans.get('reference', ''),
-                    currency='ZAR'
-                )
-                db.session.add(transaction)
+                if bank_account is None:
+                    bank_account = self._get_or_create_bank_account(statement)
+                writer.add(bank_account_id=bank_account.id, **statement_row(trans))
+            
+            writer.close()
+            transaction_count = writer.statement_rows
             
             statement.state = 'parsed'
             statement.has_pdf = True
-            statement.transaction_count = len(transactions)
+            statement.transaction_count = transaction_count
             
             db.session.commit()
             
-            logger.info(f"Successfully created {len(transactions)} transactions")
+            logger.info(f"Successfully parsed {transaction_count} transactions ({writer.rows} new, "
+                        f"{writer.updated} updated, {writer.deleted} removed)")
             
-            return len(transactions)
+            return transaction_count
             
         except Exception as e:
             db.session.rollback()
-            statement.state = 'error'
-            statement.error_message = str(e)
-            db.session.commit()
+            if not was_parsed:
+                statement.state = 'error'
+                statement.error_message = str(e)
+                db.session.commit()
             logger.error(f"PDF parsing error: {str(e)}")
             raise
+    
+    def has_stored_pdfs(self, statement):
+        """Check every PDF of the statement is in the blob store, so parsing needs no Gmail access"""
+        store = get_blob_store(self.app)
+        attachments = statement.attachments
+        return bool(attachments) and all(store.exists(attachment.get('sha256')) for attachment in attachments)
+    
+    def saved_pdf_password(self, user_id, bank_name):
+        """
+        PDF password the user last saved on a statement of the same bank
+        
+        Banks protect every statement with the same password, so statements
+        imported without one are opened with the password saved on an earlier one.
+        """
+        return db.session.query(EmailStatement.pdf_password).filter(
+            EmailStatement.user_id == user_id,
+            EmailStatement.bank_name == bank_name,
+            EmailStatement.pdf_password.isnot(None)
+        ).order_by(EmailStatement.id.desc()).limit(1).scalar()
+    
+    def can_reparse(self, statement):
+        """Check the statement's PDFs are stored or can be downloaded from its Gmail message"""
+        return self.has_stored_pdfs(statement) or not statement.gmail_id.startswith(LOCAL_STATEMENT_PREFIXES)
+    
+    def pdf_attachments(self, msg_data):
+        """
+        PDF attachments of a full-format message, including nested multiparts
+        
+        Returns:
+            List of dicts with attachment_id, filename, size and part_id
+        """
+        attachments = []
+        parts = list(msg_data['payload'].get('parts', []))
+        while parts:
+            part = parts.pop(0)
+            body = part.get('body', {})
+            filename = part.get('filename', '')
+            if filename.lower().endswith('.pdf') and 'attachmentId' in body:
+                attachments.append({
+                    'attachment_id': body['attachmentId'],
+                    'filename': filename,
+                    'size': body.get('size'),
+                    'part_id': part.get('partId'),
+                })
+            parts[:0] = part.get('parts', [])
+        return attachments
+    
+    def download_attachments(self, service, message_id, attachments, quota=None):
+        """
+        Download and decode attachments of one message in a single batch request
+        
+        Raises:
+            Exception: The first failed download
+        
+        Returns:
+            File contents in the order of attachments
+        """
+        responses = {}
+        errors = []
+        
+        def collect(request_id, response, exception):
+            if exception is not None:
+                errors.append(exception)
+            responses[request_id] = response
+        
+        self._charge(quota, 'messages.attachments.get', len(attachments))
+        batch = service.new_batch_http_request(callback=collect)
+        for index, attachment in enumerate(attachments):
+            batch.add(
+                service.users().messages().attachments().get(
+                    userId='me',
+                    messageId=message_id,
+                    id=attachment['attachment_id']
+                ),
+                request_id=str(index)
+            )
+        batch.execute()
+        if errors:
+            raise errors[0]
+        
+        return [
+            base64.urlsafe_b64decode(responses[str(index)]['data'].encode('UTF-8'))
+            for index in range(len(attachments))
+        ]
+    
+    def store_attachments(self, attachments, pdfs):
+        """
+        Put downloaded PDFs in the blob store
+        
+        Returns:
+            Copy of the attachment list with each sha256 filled in
+        """
+        store = get_blob_store(self.app)
+        return [dict(attachment, sha256=store.put(pdf_data)) for attachment, pdf_data in zip(attachments, pdfs)]
+    
+    def _get_or_create_bank_account(self, statement):
+        """Find the statement's bank account, creating it if needed"""
+        bank_account = BankAccount.query.filter_by(
+            user_id=statement.user_id,
+            bank_name=statement.bank_name
+        ).first()
+        
+        if not bank_account:
+            bank_account = BankAccount(
+                user_id=statement.user_id,
+                account_name=f"{statement.bank_name.title()} Account",
+                bank_name=statement.bank_name,
+                currency='ZAR',
+                is_active=True
+            )
+            db.session.add(bank_account)
+            db.session.flush()  # Get the ID without committing
+        
+        return bank_account
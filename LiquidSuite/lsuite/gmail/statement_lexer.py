@@ -0,0 +1,223 @@
+"""
+Statement Line Lexer - Single-pass tokenizer and state machine engine
+Shared by all bank statement parsers
+"""
+import re
+import logging
+from datetime import datetime
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+
+# Line labels produced by the lexer
+BLANK = 'blank'
+HEADER = 'header'
+DATE_ROW = 'date_row'          # Date-start line that ends with an amount tail
+DATE_START = 'date_start'      # Date-start line still waiting for its amounts
+AMOUNTS = 'amounts'            # Line that starts with amount columns
+NOISE = 'noise'                # Reference numbers and similar filler
+CONTINUATION = 'continuation'
+
+# Wildcard kind for transition tables
+ANY = '*'
+
+# Money amount as printed on statements: -1,234.56
+AMOUNT = r'-?\d{1,3}(?:,\d{3})*\.\d{2}'
+
+_AMOUNT_RE = re.compile(AMOUNT)
+
+
+@lru_cache(maxsize=4096)
+def parse_date(date_str, date_format):
+    """Parse a statement date - memoised because rows repeat the same dates"""
+    return datetime.strptime(date_str, date_format).date()
+
+
+def split_amount_tail(text, max_amounts=3, min_amounts=2):
+    """
+    Split trailing amount columns off a stripped line
+
+    Scans right to left over at most max_amounts whitespace-separated fields,
+    so the cost depends on the amount columns and not on how long the
+    description is. At least one field is always left as the description.
+
+    Returns:
+        (description, amounts) tuple, or None when fewer than min_amounts
+        trailing amounts are found
+    """
+    fields = text.rsplit(None, max_amounts)
+    count = 0
+    for field in reversed(fields[1:]):
+        if not _AMOUNT_RE.fullmatch(field):
+            break
+        count += 1
+
+    if count < min_amounts:
+        return None
+    if count < len(fields) - 1:
+        fields = text.rsplit(None, count)
+    return fields[0].strip(), tuple(fields[1:])
+
+
+class LineToken:
+    """A statement line labelled once by the lexer"""
+
+    __slots__ = ('kind', 'text', 'lineno', 'date', 'rest', 'description', 'amounts')
+
+    def __init__(self, kind, text, lineno, date=None, rest=None, description=None, amounts=None):
+        self.kind = kind
+        self.text = text
+        self.lineno = lineno
+        self.date = date                  # Date string when the line starts with a date
+        self.rest = rest                  # Text after the date
+        self.description = description    # Text before the amount tail (DATE_ROW)
+        self.amounts = amounts            # Amount strings (DATE_ROW and AMOUNTS)
+
+    def __repr__(self):
+        return f'<LineToken {self.lineno} {self.kind} {self.text[:40]!r}>'
+
+
+class LineLexer:
+    """
+    Precompiled line classifier for one statement layout
+
+    Every line is stripped and matched against the layout's patterns exactly
+    once. Parsers consume the resulting tokens instead of re-running regexes
+    on the raw text.
+    """
+
+    def __init__(self, date_pattern, amounts_pattern, tail_amounts=None,
+                 header_markers=(), header_pairs=(), noise_pattern=None):
+        """
+        Args:
+            date_pattern: Regex for the date at the start of a transaction line
+            amounts_pattern: Regex matching amount columns at the start of a line
+            tail_amounts: (min, max) number of trailing amounts on a complete date line
+            header_markers: Substrings that mark a page header or summary line
+            header_pairs: Tuples of substrings that together mark a header line
+            noise_pattern: Regex for lines that never belong to a description
+        """
+        self._date_re = re.compile(rf'^({date_pattern})(?:\s+(.+))?')
+        self._amounts_re = re.compile(amounts_pattern)
+        self._tail_amounts = tail_amounts
+        self._noise_re = re.compile(noise_pattern) if noise_pattern else None
+        self._header_markers = tuple(header_markers)
+        self._header_pairs = tuple(tuple(pair) for pair in header_pairs)
+
+    def is_header(self, text):
+        """Check if a line is a page header or summary line"""
+        if any(marker in text for marker in self._header_markers):
+            return True
+        return any(all(part in text for part in pair) for pair in self._header_pairs)
+
+    def tokenize(self, lines, start=0):
+        """Yield one LineToken per line"""
+        for lineno, line in enumerate(lines, start):
+            yield self.classify(line.strip(), lineno)
+
+    def classify(self, text, lineno=0):
+        """Label a single stripped line"""
+        if not text:
+            return LineToken(BLANK, text, lineno)
+
+        date_match = self._date_re.match(text)
+        if date_match:
+            date_str, rest = date_match.group(1), date_match.group(2)
+            if self.is_header(text):
+                return LineToken(HEADER, text, lineno, date=date_str, rest=rest)
+            if rest is None:
+                return LineToken(CONTINUATION, text, lineno, date=date_str)
+
+            rest = rest.strip()
+            if self._tail_amounts:
+                min_amounts, max_amounts = self._tail_amounts
+                tail = split_amount_tail(rest, max_amounts, min_amounts)
+                if tail:
+                    return LineToken(DATE_ROW, text, lineno, date=date_str, rest=rest,
+                                     description=tail[0], amounts=tail[1])
+            return LineToken(DATE_START, text, lineno, date=date_str, rest=rest)
+
+        amounts_match = self._amounts_re.match(text)
+        if amounts_match:
+            return LineToken(AMOUNTS, text, lineno, amounts=amounts_match.groups())
+
+        if self._noise_re and self._noise_re.match(text):
+            return LineToken(NOISE, text, lineno)
+
+        if self.is_header(text):
+            return LineToken(HEADER, text, lineno)
+
+        return LineToken(CONTINUATION, text, lineno)
+
+
+class StatementMachine:
+    """
+    Table-driven state machine over lexed statement lines
+
+    Subclasses set LEXER and TRANSITIONS. TRANSITIONS maps (state, kind) to the
+    name of a handler method; (state, ANY) is the fallback for a state, and
+    unlisted pairs keep the current state. Handlers take the token and return
+    the next state.
+    """
+
+    LEXER = None
+    INITIAL = 'scan'
+    TRANSITIONS = {}
+
+    def __init__(self):
+        self.state = self.INITIAL
+        self.transactions = []
+        self.emitted = 0
+
+    def run(self, lines):
+        """Parse all lines and return the emitted transactions"""
+        self.feed(lines)
+        self.close()
+        return self.transactions
+
+    def stream(self, pages):
+        """
+        Parse page texts one at a time, yielding transactions as they complete
+
+        Machine state carries across page boundaries, so a row that wraps onto
+        the next page is still joined. Only the current page is held in memory.
+        Yields the same rows as run() over the pages joined with newlines.
+        """
+        lineno = 0
+        for page in pages:
+            lines = page.split('\n')
+            self.feed(lines, lineno)
+            lineno += len(lines)
+            yield from self.drain()
+
+        # Every extracted page ends with a newline, so the text ends on a blank line
+        self.feed([''], lineno)
+        self.close()
+        yield from self.drain()
+
+    def drain(self):
+        """Hand over the transactions emitted so far"""
+        transactions, self.transactions = self.transactions, []
+        return transactions
+
+    def feed(self, lines, start=0):
+        """Advance the machine over more lines"""
+        for token in self.LEXER.tokenize(lines, start):
+            self.state = self.dispatch(self.state, token)
+
+    def dispatch(self, state, token):
+        """Route a token to the handler for the current state"""
+        handler = self.TRANSITIONS.get((state, token.kind)) or self.TRANSITIONS.get((state, ANY))
+        if handler is None:
+            return state
+        return getattr(self, handler)(token)
+
+    def close(self):
+        """Flush any pending row at end of input"""
+        self.state = self.INITIAL
+
+    def emit(self, transaction):
+        """Record a parsed transaction"""
+        self.transactions.append(transaction)
+        self.emitted += 1
@@ -0,0 +1,53 @@
+"""
+Insights Queries - Payee statistics shared by the analytics dashboards
+"""
+from sqlalchemy import func, desc
+from lsuite.extensions import db
+from lsuite.models import BankTransaction
+
+# Payees are grouped on the start of the description
+supplier = func.substr(BankTransaction.description, 1, 50)
+
+
+def top_suppliers(user_id, start_date, limit=10):
+    """Most frequent payees of withdrawals since start_date"""
+    supplier_stats = db.session.query(
+        supplier.label('name'),
+        func.count(BankTransaction.id).label('count'),
+        func.sum(BankTransaction.withdrawal).label('total')
+    ).filter(
+        BankTransaction.user_id == user_id,
+        BankTransaction.date >= start_date,
+        BankTransaction.withdrawal > 0
+    ).group_by(supplier).order_by(desc('count')).limit(limit).all()
+
+    return [
+        {'name': s.name, 'count': s.count, 'total': float(s.total or 0)}
+        for s in supplier_stats
+    ]
+
+
+def recurring_transactions(user_id, start_date, min_count=3, limit=10):
+    """Descriptions seen at least min_count times since start_date"""
+    amount = func.coalesce(func.nullif(BankTransaction.withdrawal, 0), BankTransaction.deposit, 0)
+    recurring = db.session.query(
+        supplier.label('description'),
+        func.count(BankTransaction.id).label('count'),
+        func.avg(amount).label('avg_amount'),
+        func.sum(amount).label('total')
+    ).filter(
+        BankTransaction.user_id == user_id,
+        BankTransaction.date >= start_date
+    ).group_by(supplier).having(func.count(BankTransaction.id) >= min_count).order_by(
+        desc('count')
+    ).limit(limit).all()
+
+    return [
+        {
+            'description': r.description,
+            'count': r.count,
+            'avg_amount': float(r.avg_amount or 0),
+            'total': float(r.total or 0)
+        }
+        for r in recurring
+    ]
@@ -3,12 +3,13 @@ Insights Routes - Analytics Dashboard for Accountants
 """
 from flask import render_template, request, jsonify
 from flask_login import login_required, current_user
-from sqlalchemy import func, desc, extract
 from datetime import datetime, timedelta
 from collections import defaultdict
-from lsuite.insights import insights_bp
-from lsuite.extensions import db
-from lsuite.models import BankTransaction, TransactionCategory, ERPNextSyncLog
+from lsuite.insights import insights_bp, queries
+from lsuite.models import BankTransaction, ERPNextSyncLog
+from lsuite.utils.daily_rollup import (
+    period_totals, category_totals, uncategorized_totals, monthly_totals
+)
 import calendar
 
 
@@ -21,98 +22,36 @@ def dashboard():
     days = request.args.get('days', 90, type=int)
     start_date = datetime.now() - timedelta(days=days)
     
-    # Get transactions for period
-    transactions = BankTransaction.query.filter(
-        BankTransaction.user_id == current_user.id,
-        BankTransaction.date >= start_date.date()
-    ).all()
-    
     # Top suppliers (most frequent payees)
-    supplier_stats = defaultdict(lambda: {'count': 0, 'total': 0})
-    for t in transactions:
-        if t.withdrawal and t.withdrawal > 0:
-            desc = t.description[:50]  # First 50 chars
-            supplier_stats[desc]['count'] += 1
-            supplier_stats[desc]['total'] += float(t.withdrawal)
-    
-    top_suppliers = sorted(
-        [{'name': k, 'count': v['count'], 'total': v['total']} 
-         for k, v in supplier_stats.items()],
-        key=lambda x: x['count'],
-        reverse=True
-    )[:10]
+    top_suppliers = queries.top_suppliers(current_user.id, start_date.date())
     
     # Recurring transactions (same description multiple times)
-    recurring = defaultdict(lambda: {'count': 0, 'amounts': []})
-    for t in transactions:
-        desc = t.description[:50]
-        recurring[desc]['count'] += 1
-        recurring[desc]['amounts'].append(float(t.withdrawal or t.deposit or 0))
-    
-    recurring_transactions = [
-        {
-            'description': k,
-            'count': v['count'],
-            'avg_amount': sum(v['amounts']) / len(v['amounts']),
-            'total': sum(v['amounts'])
-        }
-        for k, v in recurring.items() if v['count'] >= 3
-    ]
-    recurring_transactions = sorted(recurring_transactions, key=lambda x: x['count'], reverse=True)[:10]
+    recurring_transactions = queries.recurring_transactions(current_user.id, start_date.date())
     
     # Category breakdown
-    category_stats = db.session.query(
-        TransactionCategory.name,
-        func.count(BankTransaction.id).label('count'),
-        func.sum(BankTransaction.withdrawal).label('expenses'),
-        func.sum(BankTransaction.deposit).label('income')
-    ).join(
-        BankTransaction
-    ).filter(
-        BankTransaction.user_id == current_user.id,
-        BankTransaction.date >= start_date.date()
-    ).group_by(
-        TransactionCategory.name
-    ).all()
-    
     categories = [
         {
             'name': c.name,
-            'count': c.count,
+            'count': int(c.count),
             'expenses': float(c.expenses or 0),
             'income': float(c.income or 0)
         }
-        for c in category_stats
+        for c in category_totals(current_user.id, start_date.date())
     ]
     
     # Uncategorized count
-    uncategorized_count = BankTransaction.query.filter(
-        BankTransaction.user_id == current_user.id,
-        BankTransaction.category_id == None,
-        BankTransaction.date >= start_date.date()
-    ).count()
+    uncategorized_count = uncategorized_totals(current_user.id, start_date.date())['count']
     
     # Monthly trends
-    monthly_data = db.session.query(
-        extract('year', BankTransaction.date).label('year'),
-        extract('month', BankTransaction.date).label('month'),
-        func.sum(BankTransaction.withdrawal).label('expenses'),
-        func.sum(BankTransaction.deposit).label('income'),
-        func.count(BankTransaction.id).label('count')
-    ).filter(
-        BankTransaction.user_id == current_user.id,
-        BankTransaction.date >= start_date.date()
-    ).group_by('year', 'month').order_by('year', 'month').all()
-    
     monthly_trends = [
         {
             'month': calendar.month_abbr[int(m.month)],
             'year': int(m.year),
             'expenses': float(m.expenses or 0),
             'income': float(m.income or 0),
-            'count': m.count
+            'count': int(m.count)
         }
-        for m in monthly_data
+        for m in monthly_totals(current_user.id, start_date.date())
     ]
     
     # ERPNext sync status
@@ -131,9 +70,10 @@ def dashboard():
     ).count()
     
     # Summary stats
-    total_expenses = sum(float(t.withdrawal or 0) for t in transactions)
-    total_income = sum(float(t.deposit or 0) for t in transactions)
-    total_transactions = len(transactions)
+    totals = period_totals(current_user.id, start_date.date())
+    total_expenses = totals['expenses']
+    total_income = totals['income']
+    total_transactions = totals['count']
     avg_transaction = (total_expenses + total_income) / total_transactions if total_transactions > 0 else 0
     
     return render_template('insights/dashboard.html',
@@ -280,50 +220,26 @@ def categories():
     days = request.args.get('days', 90, type=int)
     start_date = datetime.now() - timedelta(days=days)
     
-    category_data = db.session.query(
-        TransactionCategory.id,
-        TransactionCategory.name,
-        TransactionCategory.transaction_type,
-        func.count(BankTransaction.id).label('count'),
-        func.sum(BankTransaction.withdrawal).label('expenses'),
-        func.sum(BankTransaction.deposit).label('income')
-    ).outerjoin(
-        BankTransaction
-    ).filter(
-        BankTransaction.user_id == current_user.id,
-        BankTransaction.date >= start_date.date()
-    ).group_by(
-        TransactionCategory.id,
-        TransactionCategory.name,
-        TransactionCategory.transaction_type
-    ).all()
-    
     categories_list = [
         {
             'id': c.id,
             'name': c.name,
             'type': c.transaction_type,
-            'count': c.count,
+            'count': int(c.count),
             'expenses': float(c.expenses or 0),
             'income': float(c.income or 0),
             'total': float(c.expenses or 0) + float(c.income or 0)
         }
-        for c in category_data
+        for c in category_totals(current_user.id, start_date.date())
     ]
     
     # Get uncategorized
-    uncategorized = BankTransaction.query.filter(
-        BankTransaction.user_id == current_user.id,
-        BankTransaction.category_id == None,
-        BankTransaction.date >= start_date.date()
-    ).all()
-    
-    uncategorized_total = sum(float(t.withdrawal or t.deposit or 0) for t in uncategorized)
+    uncategorized = uncategorized_totals(current_user.id, start_date.date())
     
     return render_template('insights/categories.html',
         categories=categories_list,
-        uncategorized_count=len(uncategorized),
-        uncategorized_total=uncategorized_total,
+        uncategorized_count=uncategorized['count'],
+        uncategorized_total=uncategorized['total'],
         days=days
     )
 
@@ -338,15 +254,7 @@ def chart_data():
     start_date = datetime.now() - timedelta(days=days)
     
     if chart_type == 'monthly':
-        data = db.session.query(
-            extract('year', BankTransaction.date).label('year'),
-            extract('month', BankTransaction.date).label('month'),
-            func.sum(BankTransaction.withdrawal).label('expenses'),
-            func.sum(BankTransaction.deposit).label('income')
-        ).filter(
-            BankTransaction.user_id == current_user.id,
-            BankTransaction.date >= start_date.date()
-        ).group_by('year', 'month').order_by('year', 'month').all()
+        data = monthly_totals(current_user.id, start_date.date())
         
         return jsonify({
             'labels': [f"{calendar.month_abbr[int(d.month)]} {int(d.year)}" for d in data],
@@ -355,18 +263,7 @@ def chart_data():
         })
     
     elif chart_type == 'category':
-        data = db.session.query(
-            TransactionCategory.name,
-            func.sum(BankTransaction.withdrawal).label('expenses'),
-            func.sum(BankTransaction.deposit).label('income')
-        ).join(
-            BankTransaction
-        ).filter(
-            BankTransaction.user_id == current_user.id,
-            BankTransaction.date >= start_date.date()
-        ).group_by(
-            TransactionCategory.name
-        ).all()
+        data = category_totals(current_user.id, start_date.date())
         
         return jsonify({
             'labels': [d.name for d in data],
@@ -7,12 +7,14 @@ Main Blueprint - Dashboard and Home
 from flask import render_template, jsonify
 from flask_login import login_required, current_user
 from lsuite.models import (
-    EmailStatement, BankTransaction, TransactionCategory,
+    EmailStatement, BankTransaction,
     ERPNextConfig, ERPNextSyncLog
 )
-from sqlalchemy import func, extract
+from lsuite.utils.daily_rollup import (
+    period_totals, category_totals, uncategorized_totals, monthly_totals
+)
+from sqlalchemy import func
 from datetime import datetime, timedelta
-from collections import defaultdict
 from lsuite.main import main_bp
 import calendar
 
@@ -44,7 +46,6 @@ def index():
     recent_syncs = []
     erpnext_config = None
     ready_to_sync = 0
-    period_transactions = []
     
     try:
         # Get statistics
@@ -78,93 +79,59 @@ def index():
     # ========== INSIGHTS DATA ==========
     
     try:
-        # Get transactions for period
-        period_transactions = BankTransaction.query.filter(
-            BankTransaction.user_id == current_user.id,
-            BankTransaction.date >= start_date.date()
-        ).all()
-        
-        # Calculate financial metrics
-        total_expenses = sum(float(t.withdrawal or 0) for t in period_transactions)
-        total_income = sum(float(t.deposit or 0) for t in period_transactions)
-        total_transactions_count = len(period_transactions)
-        
+        # Financial metrics from the daily rollups
+        totals = period_totals(current_user.id, start_date.date())
+        total_expenses = totals['expenses']
+        total_income = totals['income']
+        total_transactions_count = totals['count']
     except Exception as e:
         print(f"Error calculating financial metrics: {e}")
-        period_transactions = []
     
     try:
         # Top 5 suppliers - only if we have transactions
-        if period_transactions:
-            supplier_stats = defaultdict(lambda: {'count': 0, 'total': 0})
-            for t in period_transactions:
-                if t.withdrawal and t.withdrawal > 0:
-                    desc = t.description[:50] if t.description else 'Unknown'
-                    supplier_stats[desc]['count'] += 1
-                    supplier_stats[desc]['total'] += float(t.withdrawal)
+        if total_transactions_count:
+            from lsuite.extensions import db
+            supplier = func.coalesce(func.substr(BankTransaction.description, 1, 50), 'Unknown')
+            supplier_stats = db.session.query(
+                supplier.label('name'),
+                func.count(BankTransaction.id).label('count'),
+                func.sum(BankTransaction.withdrawal).label('total')
+            ).filter(
+                BankTransaction.user_id == current_user.id,
+                BankTransaction.date >= start_date.date(),
+                BankTransaction.withdrawal > 0
+            ).group_by(supplier).order_by(func.sum(BankTransaction.withdrawal).desc()).limit(5).all()
             
-            top_suppliers = sorted(
-                [{'name': k, 'count': v['count'], 'total': v['total']} 
-                 for k, v in supplier_stats.items()],
-                key=lambda x: x['total'],
-                reverse=True
-            )[:5]
+            top_suppliers = [
+                {'name': s.name, 'count': s.count, 'total': float(s.total or 0)}
+                for s in supplier_stats
+            ]
     except Exception as e:
         print(f"Error calculating top suppliers: {e}")
     
     try:
         # Category breakdown (top 5)
-        from lsuite.extensions import db
-        category_stats = db.session.query(
-            TransactionCategory.name,
-            func.count(BankTransaction.id).label('count'),
-            func.sum(BankTransaction.withdrawal).label('expenses'),
-            func.sum(BankTransaction.deposit).label('income')
-        ).join(
-            BankTransaction
-        ).filter(
-            BankTransaction.user_id == current_user.id,
-            BankTransaction.date >= start_date.date()
-        ).group_by(
-            TransactionCategory.name
-        ).order_by(
-            func.sum(BankTransaction.withdrawal).desc()
-        ).limit(5).all()
-        
         categories = [
             {
                 'name': c.name,
-                'count': c.count,
+                'count': int(c.count),
                 'expenses': float(c.expenses or 0),
                 'income': float(c.income or 0)
             }
-            for c in category_stats
+            for c in category_totals(current_user.id, start_date.date())[:5]
         ]
     except Exception as e:
         print(f"Error getting categories: {e}")
     
     try:
         # Uncategorized count
-        uncategorized_count = BankTransaction.query.filter(
-            BankTransaction.user_id == current_user.id,
-            BankTransaction.category_id == None,
-            BankTransaction.date >= start_date.date()
-        ).count()
+        uncategorized_count = uncategorized_totals(current_user.id, start_date.date())['count']
     except Exception as e:
         print(f"Error getting uncategorized count: {e}")
     
     try:
         # Monthly trends (last 6 months)
-        from lsuite.extensions import db
-        monthly_data = db.session.query(
-            extract('year', BankTransaction.date).label('year'),
-            extract('month', BankTransaction.date).label('month'),
-            func.sum(BankTransaction.withdrawal).label('expenses'),
-            func.sum(BankTransaction.deposit).label('income')
-        ).filter(
-            BankTransaction.user_id == current_user.id,
-            BankTransaction.date >= (datetime.now() - timedelta(days=180)).date()
-        ).group_by('year', 'month').order_by('year', 'month').all()
+        monthly_data = monthly_totals(current_user.id, (datetime.now() - timedelta(days=180)).date())
         
         monthly_trends = [
             {
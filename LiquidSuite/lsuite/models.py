@@ -5,6 +5,7 @@ Database models for LiquidSuite - FIXED - NO DUPLICATES
 
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
+import zlib
 from datetime import datetime
 from lsuite.extensions import db
 
@@ -12,6 +13,26 @@ from lsuite.extensions import db
 # User Models
 # =============================================================================
 
+# zlib level for compressed text columns - bodies are written once and read rarely
+TEXT_COMPRESSION_LEVEL = 6
+
+
+class CompressedText(db.TypeDecorator):
+    """Text stored zlib-compressed in a binary column and decompressed when loaded"""
+    impl = db.LargeBinary
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return zlib.compress(value.encode('utf-8'), TEXT_COMPRESSION_LEVEL)
+    
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return zlib.decompress(value).decode('utf-8')
+
+
 class User(UserMixin, db.Model):
     """User account model"""
     __tablename__ = 'users'
@@ -150,6 +171,11 @@ class GoogleCredential(db.Model):
     refresh_token = db.Column(db.Text)
     token_expiry = db.Column(db.DateTime)
     is_authenticated = db.Column(db.Boolean, default=False)
+    
+    # Gmail sync watermark - the mailbox historyId reached by the last import
+    history_id = db.Column(db.String(32))
+    last_sync_date = db.Column(db.DateTime)
+    
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -190,6 +216,15 @@ class TransactionCategory(db.Model):
         return f'<TransactionCategory {self.name}>'
 
 
+# Composite and partial bank_transactions indexes for per-user date-window queries
+TRANSACTION_QUERY_INDEXES = (
+    'ix_bank_transactions_user_date',
+    'ix_bank_transactions_user_category_date',
+    'ix_bank_transactions_user_sync_pending',
+    'ix_bank_transactions_statement',
+)
+
+
 class BankTransaction(db.Model):
     """Bank transaction model for ERPNext integration"""
     __tablename__ = 'bank_transactions'
@@ -231,12 +266,29 @@ class BankTransaction(db.Model):
     erpnext_journal_entry = db.Column(db.String(100))
     erpnext_error = db.Column(db.Text)
     
+    # Hash identifying the statement line - re-imports of the same line are skipped
+    fingerprint = db.Column(db.String(64))
+    
     # Metadata
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationship to category
     category = db.relationship('TransactionCategory', back_populates='transactions')
+    
+    # Dashboards filter by user and a date window, then by category or sync
+    # state (TRANSACTION_QUERY_INDEXES, see migrations/add_transaction_indexes.py)
+    __table_args__ = (
+        db.Index('uq_bank_transactions_fingerprint', 'fingerprint', unique=True),
+        db.Index('ix_bank_transactions_user_date', 'user_id', 'date'),
+        db.Index('ix_bank_transactions_user_category_date', 'user_id', 'category_id', 'date'),
+        db.Index(
+            'ix_bank_transactions_user_sync_pending', 'user_id', 'date',
+            postgresql_where=db.and_(erpnext_synced == False, category_id != None),
+            sqlite_where=db.and_(erpnext_synced == False, category_id != None)
+        ),
+        db.Index('ix_bank_transactions_statement', 'statement_id'),
+    )
 
     @property
     def amount(self):
@@ -275,6 +327,35 @@ class BankTransaction(db.Model):
         return f'<BankTransaction {self.reference_number or self.id}>'
 
 
+class TransactionDailyRollup(db.Model):
+    """
+    Per-day transaction totals read by the dashboards
+
+    One row per user, bank account, date and category, kept current by
+    lsuite/utils/daily_rollup.py. Account and category are plain columns
+    without foreign keys so deleting a category never trips over rollups;
+    more than one row for the same key is allowed and is summed on read.
+    """
+    __tablename__ = 'transaction_daily_rollup'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    bank_account_id = db.Column(db.Integer)
+    date = db.Column(db.Date, nullable=False)
+    category_id = db.Column(db.Integer)
+
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
+    deposit_total = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+    withdrawal_total = db.Column(db.Numeric(15, 2), nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_transaction_daily_rollup_user_date', 'user_id', 'date'),
+    )
+
+    def __repr__(self):
+        return f'<TransactionDailyRollup {self.user_id} {self.date} {self.category_id}>'
+
+
 # =============================================================================
 # Email Statement Models
 # =============================================================================
@@ -301,6 +382,9 @@ class EmailStatement(db.Model):
     # PDF details
     has_pdf = db.Column(db.Boolean, default=False)
     pdf_password = db.Column(db.String(100))
+    # PDF parts seen at import: [{attachment_id, filename, size, part_id, sha256}, ...]
+    # sha256 is set once the file is in the blob store
+    attachments = db.Column(db.JSON)
     
     # Processing status
     state = db.Column(db.String(50), default='new')
@@ -308,9 +392,12 @@ class EmailStatement(db.Model):
     processed_date = db.Column(db.DateTime)
     transaction_count = db.Column(db.Integer, default=0)
     
-    # Content
-    body_text = db.Column(db.Text)
-    body_html = db.Column(db.Text)
+    # Content - compressed, and only loaded when read
+    body_text = db.deferred(db.Column('body_text_z', CompressedText))
+    body_html = db.deferred(db.Column('body_html_z', CompressedText))
+    # Uncompressed bodies of rows imported earlier - moved by 'flask compress-bodies'
+    body_text_legacy = db.deferred(db.Column('body_text', db.Text))
+    body_html_legacy = db.deferred(db.Column('body_html', db.Text))
     
     # Errors
     error_message = db.Column(db.Text)
@@ -496,7 +583,8 @@ class UploadedDocument(db.Model):
     filename = db.Column(db.String(255), nullable=False)
     document_type = db.Column(db.String(50), nullable=False)
     file_size = db.Column(db.Integer)
-    file_data = db.Column(db.LargeBinary)  # Store PDF in PostgreSQL
+    file_sha256 = db.Column(db.String(64), index=True)  # Blob store key of the PDF
+    file_data = db.deferred(db.Column(db.LargeBinary))  # Inline PDF of documents uploaded before the blob store
     
     # Extracted data
     extracted_text = db.Column(db.Text)
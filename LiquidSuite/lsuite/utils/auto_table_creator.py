@@ -27,6 +27,7 @@ def auto_create_tables(app):
             'bank_accounts': 'BankAccount',
             'transactions': 'Transaction',
             'bank_transactions': 'BankTransaction',
+            'transaction_daily_rollup': 'TransactionDailyRollup',
             'transaction_categories': 'TransactionCategory',
             'email_statements': 'EmailStatement',
             'google_credentials': 'GoogleCredential',
@@ -52,7 +53,7 @@ def auto_create_tables(app):
             
             # Import all models to ensure they're registered with SQLAlchemy
             from lsuite.models import (
-                User, BankAccount, Transaction, BankTransaction, 
+                User, BankAccount, Transaction, BankTransaction, TransactionDailyRollup,
                 TransactionCategory, EmailStatement, GoogleCredential,
                 Invoice, InvoiceItem, ERPNextConfig, ERPNextSyncLog,
                 UploadedDocument, DocumentTransaction,
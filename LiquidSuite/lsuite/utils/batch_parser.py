@@ -0,0 +1,230 @@
+"""
+Batch Statement Parser - Parse a directory of statement PDFs from the CLI
+Location: lsuite/utils/batch_parser.py
+
+Run: flask parse-batch statements/ > transactions.ndjson
+     flask parse-batch statements/ --load --user-id 1 -o transactions.ndjson
+"""
+import os
+import sys
+import json
+import hashlib
+import logging
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+import click
+
+logger = logging.getLogger(__name__)
+
+# Bank transaction rows inserted per bulk statement
+LOAD_CHUNK_SIZE = 1000
+
+
+def find_pdfs(directory, recursive=False):
+    """List PDF files under a directory in a stable order"""
+    if recursive:
+        paths = [
+            os.path.join(root, name)
+            for root, _, names in os.walk(directory)
+            for name in names if name.lower().endswith('.pdf')
+        ]
+    else:
+        paths = [
+            os.path.join(directory, name)
+            for name in os.listdir(directory) if name.lower().endswith('.pdf')
+        ]
+    return sorted(paths)
+
+
+def parse_file(path, password=None, bank_name=None):
+    """
+    Parse one statement PDF - runs inside a worker process
+
+    The bank is detected from the first page and parsed with its registered
+    statement format, as in the upload route.
+
+    Returns:
+        Dict with the file's name, size, digest, detected bank, parser and
+        transactions, or an error message
+    """
+    from lsuite.gmail.parsers import PDFParser
+    from lsuite.utils.pdf_text import map_file
+
+    result = {'path': path, 'filename': os.path.basename(path), 'transactions': [], 'error': None}
+    try:
+        with map_file(path) as pdf_data:
+            result['size'] = len(pdf_data)
+            result['sha256'] = hashlib.sha256(pdf_data).hexdigest()
+
+            parser = PDFParser()
+            result['transactions'] = parser.parse_pdf(pdf_data, bank_name, password)
+            result['bank'] = parser.statement_format.bank_name
+            result['parser'] = parser.parser_version
+    except Exception as e:
+        result['error'] = str(e)
+
+    return result
+
+
+def to_record(transaction, source_file, bank_name):
+    """NDJSON record for one ParsedTransaction"""
+    record = {'source_file': source_file, 'bank': bank_name}
+    record.update(transaction.to_dict())
+    record['date'] = transaction.date.isoformat()
+    return record
+
+
+def iter_results(paths, password=None, bank_name=None, workers=None):
+    """Parse files across a process pool, yielding results in file order"""
+    if workers == 1 or len(paths) <= 1:
+        for path in paths:
+            yield parse_file(path, password, bank_name)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers or None) as pool:
+        yield from pool.map(parse_file, paths, [password] * len(paths), [bank_name] * len(paths))
+
+
+def load_result(result, user_id, source_file):
+    """
+    Bulk insert one file's transactions into bank_transactions
+
+    Each file becomes an EmailStatement keyed by the PDF's SHA-256, so
+    running the same backfill twice skips files that were already loaded.
+    The PDF goes into the blob store so the statement can be re-parsed.
+
+    Returns:
+        Number of transactions inserted, or None if the file was loaded before
+    """
+    from flask import current_app
+    from lsuite.extensions import db
+    from lsuite.models import BankAccount, EmailStatement
+    from lsuite.utils.blob_store import get_blob_store
+    from lsuite.utils.bulk_insert import BankTransactionWriter, statement_row
+    from lsuite.utils.pdf_text import map_file
+
+    gmail_id = f"BATCH-{result['sha256'][:32]}"
+    if EmailStatement.query.filter_by(gmail_id=gmail_id).first():
+        return None
+
+    bank_name = result['bank']
+    bank_account = BankAccount.query.filter_by(user_id=user_id, bank_name=bank_name).first()
+    if not bank_account:
+        bank_account = BankAccount(
+            user_id=user_id,
+            account_name=f"{bank_name.title()} Account",
+            bank_name=bank_name,
+            currency='ZAR',
+            is_active=True
+        )
+        db.session.add(bank_account)
+
+    with map_file(result['path']) as pdf_data:
+        sha256 = get_blob_store(current_app).put(pdf_data)
+
+    transactions = result['transactions']
+    statement = EmailStatement(
+        user_id=user_id,
+        gmail_id=gmail_id,
+        subject=f"Batch Import: {source_file}",
+        sender='Batch PDF Import',
+        received_date=datetime.utcnow(),
+        bank_name=bank_name,
+        has_pdf=True,
+        attachments=[{
+            'attachment_id': None,
+            'filename': result['filename'],
+            'size': result['size'],
+            'part_id': None,
+            'sha256': sha256,
+        }],
+        is_processed=True,
+        processed_date=datetime.utcnow(),
+        state='parsed'
+    )
+    db.session.add(statement)
+    db.session.flush()
+
+    rows = (
+        dict(
+            statement_row(trans),
+            posting_date=trans.date,
+            notes=f"Capitec Category: {trans.category}" if trans.category else None
+        )
+        for trans in transactions
+    )
+    with BankTransactionWriter(
+        batch_size=LOAD_CHUNK_SIZE,
+        user_id=user_id,
+        bank_account_id=bank_account.id,
+        statement_id=statement.id,
+        currency='ZAR'
+    ) as writer:
+        writer.write(rows)
+    # Lines another statement already holds are skipped, so count what was inserted
+    statement.transaction_count = writer.rows
+
+    db.session.commit()
+    return writer.rows
+
+
+def register_batch_commands(app):
+    """Register batch parsing commands with Flask CLI"""
+
+    @app.cli.command('parse-batch')
+    @click.argument('directory', type=click.Path(exists=True, file_okay=False))
+    @click.option('--output', '-o', default='-', type=click.File('w'),
+                  help='NDJSON output file (default: stdout)')
+    @click.option('--workers', '-w', default=0, type=int, help='Parser processes (0 = one per CPU core)')
+    @click.option('--password', default=None, help='Password for protected PDFs')
+    @click.option('--bank', default=None, help='Bank to assume when a statement is not recognised')
+    @click.option('--recursive', '-r', is_flag=True, help='Include PDFs in subdirectories')
+    @click.option('--load', is_flag=True, help='Also bulk load transactions into bank_transactions')
+    @click.option('--user-id', type=int, help='Owner of loaded transactions (required with --load)')
+    def parse_batch_command(directory, output, workers, password, bank, recursive, load, user_id):
+        """Parse a directory of statement PDFs into NDJSON"""
+        if load and not user_id:
+            raise click.UsageError('--user-id is required with --load')
+
+        paths = find_pdfs(directory, recursive)
+        if not paths:
+            click.echo(f"No PDF files found in {directory}", err=True)
+            return
+
+        click.echo(f"Parsing {len(paths)} PDF files...", err=True)
+        parsed_files = failed_files = skipped_files = transaction_count = loaded_count = 0
+
+        with app.app_context():
+            for result in iter_results(paths, password, bank, workers):
+                source_file = os.path.relpath(result['path'], directory)
+
+                if result['error']:
+                    failed_files += 1
+                    click.echo(f"❌ {source_file}: {result['error']}", err=True)
+                    continue
+
+                parsed_files += 1
+                transaction_count += len(result['transactions'])
+                for trans in result['transactions']:
+                    output.write(json.dumps(to_record(trans, source_file, result['bank'])) + '\n')
+                output.flush()
+
+                if load:
+                    inserted = load_result(result, user_id, source_file)
+                    if inserted is None:
+                        skipped_files += 1
+                        click.echo(f"↷ {source_file}: already loaded", err=True)
+                        continue
+                    loaded_count += inserted
+
+                click.echo(f"✓ {source_file}: {len(result['transactions'])} transactions "
+                           f"({result['parser']})", err=True)
+
+        click.echo(f"\nParsed {parsed_files} files, {transaction_count} transactions, "
+                   f"{failed_files} failed", err=True)
+        if load:
+            click.echo(f"Loaded {loaded_count} transactions, skipped {skipped_files} files already loaded",
+                       err=True)
+        if failed_files:
+            sys.exit(1)
@@ -0,0 +1,203 @@
+"""
+Blob Store - Content-addressed storage for statement and document files
+Location: lsuite/utils/blob_store.py
+
+Files are stored once under the SHA-256 of their bytes, so the same PDF
+attached to several emails or uploaded twice takes the space of one. Rows
+keep only the digest, which keeps multi-MB files out of table pages.
+
+Run: flask migrate-blobs    (moves inline uploaded_documents.file_data out)
+"""
+import os
+import abc
+import hashlib
+import logging
+import threading
+
+import click
+
+logger = logging.getLogger(__name__)
+
+
+class BlobBackend(abc.ABC):
+    """
+    Storage behind a BlobStore
+
+    Backends store bytes under a digest they are given and never need to
+    hash anything themselves. local_path lets the web layer stream a blob
+    straight from disk; backends without local files return None.
+    """
+
+    @abc.abstractmethod
+    def exists(self, digest):
+        """Whether a blob is stored under digest"""
+
+    @abc.abstractmethod
+    def write(self, digest, data):
+        """Store data under digest"""
+
+    @abc.abstractmethod
+    def open(self, digest):
+        """Readable binary file object for a blob"""
+
+    @abc.abstractmethod
+    def size(self, digest):
+        """Size of a blob in bytes"""
+
+    @abc.abstractmethod
+    def delete(self, digest):
+        """Remove a blob"""
+
+    def local_path(self, digest):
+        return None
+
+
+class LocalBlobBackend(BlobBackend):
+    """Blobs as files fanned out over two directory levels: ab/cd/abcd..."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def local_path(self, digest):
+        return os.path.join(self.directory, digest[:2], digest[2:4], digest)
+
+    def exists(self, digest):
+        return os.path.exists(self.local_path(digest))
+
+    def write(self, digest, data):
+        path = self.local_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            # Readers see either no blob or the whole blob
+            os.replace(temp_path, path)
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+    def open(self, digest):
+        return open(self.local_path(digest), 'rb')
+
+    def size(self, digest):
+        return os.path.getsize(self.local_path(digest))
+
+    def delete(self, digest):
+        try:
+            os.remove(self.local_path(digest))
+        except FileNotFoundError:
+            pass
+
+
+# Backends selectable with BLOB_STORE_BACKEND - called with the app config
+BLOB_BACKENDS = {
+    'local': lambda config: LocalBlobBackend(config['BLOB_STORE_DIR']),
+}
+
+
+class BlobStore:
+    """Content-addressed blobs on top of a backend"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    @staticmethod
+    def digest_for(data):
+        return hashlib.sha256(data).hexdigest()
+
+    def put(self, data):
+        """
+        Store bytes (or a memory map) unless identical bytes are already stored
+
+        Returns:
+            SHA-256 hex digest to keep on the row
+        """
+        digest = self.digest_for(data)
+        if not self.backend.exists(digest):
+            self.backend.write(digest, data)
+            logger.debug(f"Stored blob {digest[:12]} ({len(data)} bytes)")
+        return digest
+
+    def get(self, digest):
+        """Blob contents, or None if it is not stored"""
+        try:
+            with self.backend.open(digest) as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def open(self, digest):
+        return self.backend.open(digest)
+
+    def exists(self, digest):
+        return bool(digest) and self.backend.exists(digest)
+
+    def size(self, digest):
+        return self.backend.size(digest)
+
+    def local_path(self, digest):
+        return self.backend.local_path(digest)
+
+
+def get_blob_store(app):
+    """The app's blob store, created from config on first use"""
+    store = app.extensions.get('blob_store')
+    if store is None:
+        backend = BLOB_BACKENDS[app.config.get('BLOB_STORE_BACKEND', 'local')](app.config)
+        store = app.extensions.setdefault('blob_store', BlobStore(backend))
+    return store
+
+
+def send_blob(store, digest, mimetype, download_name, as_attachment=True):
+    """
+    Response streaming a blob
+
+    Blobs on local disk are sent by path, so the server can use sendfile and
+    answer Range and conditional requests; other backends stream a file
+    object.
+    """
+    from flask import send_file
+
+    path = store.local_path(digest)
+    source = path if path else store.open(digest)
+    return send_file(
+        source,
+        mimetype=mimetype,
+        as_attachment=as_attachment,
+        download_name=download_name,
+        conditional=True,
+        etag=digest
+    )
+
+
+def register_blob_commands(app):
+    """Register blob store commands with Flask CLI"""
+
+    @app.cli.command('migrate-blobs')
+    @click.option('--batch-size', default=50, type=int, help='Documents moved per commit')
+    def migrate_blobs_command(batch_size):
+        """Move PDFs stored inline on uploaded_documents into the blob store"""
+        from lsuite.extensions import db
+        from lsuite.models import UploadedDocument
+
+        store = get_blob_store(app)
+        moved = 0
+        while True:
+            documents = UploadedDocument.query.filter(
+                UploadedDocument.file_data.isnot(None)
+            ).order_by(UploadedDocument.id).limit(batch_size).all()
+            if not documents:
+                break
+            for document in documents:
+                document.file_sha256 = store.put(document.file_data)
+                document.file_data = None
+            db.session.commit()
+            moved += len(documents)
+            click.echo(f"Moved {moved} documents...", err=True)
+
+        click.echo(f"Moved {moved} documents into the blob store", err=True)
@@ -0,0 +1,390 @@
+"""
+Bulk Insert - Fast writer for imported bank transactions
+Location: lsuite/utils/bulk_insert.py
+
+Imports add thousands of rows that are never touched through the ORM in the
+same request, so building a BankTransaction object per row only pays for
+unit-of-work bookkeeping. Rows are buffered as tuples and written a batch at
+a time: COPY FROM STDIN on PostgreSQL, executemany INSERT elsewhere (SQLite
+offline mode).
+
+Every row carries a fingerprint of the statement line it came from, backed
+by a unique index, and batches are inserted with ON CONFLICT DO NOTHING.
+Uploading an export that overlaps earlier imports only adds the new lines.
+
+In re-parse mode the writer diffs parser output against the rows a
+statement already has, so a parser upgrade only touches lines that changed
+and categorisation and ERPNext sync state survive.
+
+Rows inserted, deleted or re-keyed are added to transaction_daily_rollup
+(lsuite/utils/daily_rollup.py) in the same transaction.
+"""
+import io
+import re
+import time
+import hashlib
+import logging
+from datetime import date, datetime
+from decimal import Decimal
+
+from sqlalchemy.dialects import postgresql, sqlite
+
+from lsuite.extensions import db
+from lsuite.models import BankTransaction
+from lsuite.utils.daily_rollup import ROLLUP_FIELDS, RollupDelta
+
+logger = logging.getLogger(__name__)
+
+# Rows buffered before a batch is written
+BULK_INSERT_BATCH_SIZE = 2000
+
+
+def _cents(value):
+    if value is None or value == '':
+        return ''
+    return str(int((Decimal(str(value)) * 100).to_integral_value()))
+
+
+def transaction_fingerprint(values, ordinal=0):
+    """
+    SHA-256 identifying one statement line
+
+    Hashes the owner and account, date, signed amount and running balance in
+    cents and the whitespace/case-normalised description. ordinal tells
+    apart lines that are otherwise identical within one import.
+    """
+    amount = Decimal(str(values.get('deposit') or 0)) - Decimal(str(values.get('withdrawal') or 0))
+    description = re.sub(r'\s+', ' ', values.get('description') or '').strip().upper()
+    key = '|'.join([
+        str(values.get('user_id') or ''),
+        str(values.get('bank_account_id') or ''),
+        str(values.get('date') or ''),
+        _cents(amount),
+        description,
+        _cents(values.get('balance')),
+        str(ordinal),
+    ])
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def statement_row(trans):
+    """
+    bank_transactions columns of a parsed statement line
+
+    Every PDF import path (upload, Gmail parse, ingest, re-parse, batch load)
+    builds its rows here, so a line gets the same fingerprint whichever way
+    it arrives.
+    """
+    return {
+        'date': trans.date,
+        'description': trans.description,
+        'deposit': trans.deposit,
+        'withdrawal': trans.withdrawal,
+        'balance': trans.balance_decimal,
+        'reference_number': trans.reference,
+    }
+
+
+def _line_key(values):
+    """Fingerprint of a line ignoring its account and balance"""
+    return transaction_fingerprint({**values, 'bank_account_id': None, 'balance': None})
+
+
+def _copy_value(value):
+    """Value in PostgreSQL COPY text format"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (date, datetime, Decimal, int, float)):
+        return str(value)
+    return (str(value)
+            .replace('\\', '\\\\')
+            .replace('\t', '\\t')
+            .replace('\n', '\\n')
+            .replace('\r', '\\r'))
+
+
+class BankTransactionWriter:
+    """
+    Batched insert of bank_transactions rows
+
+    Rows are dicts of BankTransaction column names; columns left out get the
+    model defaults, and keyword arguments given to the writer apply to every
+    row. Rows whose fingerprint is already stored are skipped and counted in
+    skipped. Pending ORM objects (the statement the rows belong to) are flushed
+    before the first batch so foreign keys resolve. Nothing is committed -
+    the rows are part of the caller's transaction.
+
+    With reparse=True the rows replace those of the statement_id default:
+    rows matching an existing fingerprint update only the columns given
+    (counted in updated or unchanged), new lines are inserted and existing
+    lines missing from the output are deleted on close. Columns the rows do
+    not set - category, notes, ERPNext sync state - are left alone. Rows
+    stored without an account or balance (older uploads and Gmail imports)
+    are matched on the rest of the line and get both filled in.
+
+    Usage:
+        with BankTransactionWriter(user_id=user.id, statement_id=statement.id) as writer:
+            writer.write(parser.iter_transactions(...))
+    """
+
+    def __init__(self, session=None, batch_size=BULK_INSERT_BATCH_SIZE, reparse=False, **defaults):
+        if reparse and not defaults.get('statement_id'):
+            raise ValueError('Re-parse mode needs the statement_id of the rows')
+        self.session = session or db.session
+        self.batch_size = batch_size
+        self.reparse = reparse
+        self.table = BankTransaction.__table__
+        self.columns = [column for column in self.table.columns if not column.primary_key]
+        self._fingerprint_index = [column.key for column in self.columns].index('fingerprint')
+        self.defaults = defaults
+        self.rows = 0
+        self.skipped = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.deleted = 0
+        self.seconds = 0.0
+        self._pending = []
+        self._ordinals = {}
+        self._existing = None
+        self._loose = {}
+        self._updates = []
+        self._use_copy = None
+        self._rollup = RollupDelta()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self._pending = []
+            self._rollup = RollupDelta()
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    @property
+    def statement_rows(self):
+        """Rows the statement has after a re-parse"""
+        return self.rows + self.updated + self.unchanged
+
+    def _row(self, values):
+        """Full column tuple for one row, with model defaults filled in"""
+        values = {**self.defaults, **values}
+        if not values.get('fingerprint'):
+            fingerprint = transaction_fingerprint(values)
+            # The nth repeat of an identical line within this import
+            ordinal = self._ordinals.get(fingerprint, 0)
+            self._ordinals[fingerprint] = ordinal + 1
+            values['fingerprint'] = transaction_fingerprint(values, ordinal) if ordinal else fingerprint
+        row = []
+        for column in self.columns:
+            if column.key in values:
+                value = values[column.key]
+            elif column.default is not None and column.default.is_scalar:
+                value = column.default.arg
+            elif column.default is not None and column.default.is_callable:
+                value = column.default.arg(None)
+            else:
+                value = None
+            row.append(value)
+        return tuple(row)
+
+    def add(self, **values):
+        """Queue one row, writing a batch when the buffer is full"""
+        row = self._row(values)
+        if self.reparse:
+            if self._existing is None:
+                self._existing = self._load_existing()
+            fingerprint = row[self._fingerprint_index]
+            current = self._existing.pop(fingerprint, None)
+            if current is None:
+                current = self._loose_match({**self.defaults, **values})
+            if current is not None:
+                self._match(current, {**self.defaults, **values}, fingerprint)
+                return
+        self._pending.append(row)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def _load_existing(self):
+        """
+        Current rows of the statement keyed by fingerprint
+
+        Rows imported before fingerprints were stored are fingerprinted here
+        the same way an import would.
+        """
+        self.session.flush()
+        rows = self.session.connection().execute(
+            self.table.select()
+            .where(self.table.c.statement_id == self.defaults['statement_id'])
+            .order_by(self.table.c.id)
+        ).mappings().all()
+        existing = {}
+        ordinals = {}
+        for row in rows:
+            fingerprint = row['fingerprint']
+            if not fingerprint:
+                base = transaction_fingerprint(row)
+                ordinal = ordinals.get(base, 0)
+                ordinals[base] = ordinal + 1
+                fingerprint = transaction_fingerprint(row, ordinal) if ordinal else base
+            existing[fingerprint] = row
+            if row['bank_account_id'] is None or row['balance'] is None:
+                self._loose.setdefault(_line_key(row), []).append(fingerprint)
+        return existing
+
+    def _loose_match(self, values):
+        """Take an unmatched stored row of the same line that lacks account or balance"""
+        candidates = self._loose.get(_line_key(values))
+        while candidates:
+            current = self._existing.pop(candidates.pop(0), None)
+            if current is not None:
+                return current
+        return None
+
+    def _match(self, current, values, fingerprint):
+        """Queue an update of the given columns that differ from the stored row"""
+        changes = {
+            key: value for key, value in values.items()
+            if key != 'fingerprint' and current[key] != value
+        }
+        if current['fingerprint'] != fingerprint:
+            changes['fingerprint'] = fingerprint
+        if changes:
+            if any(field in changes for field in ROLLUP_FIELDS):
+                self._rollup.add_row(current, sign=-1)
+                self._rollup.add_row({**current, **changes})
+            changes['updated_at'] = datetime.utcnow()
+            self._updates.append({'id': current['id'], **changes})
+            self.updated += 1
+        else:
+            self.unchanged += 1
+
+    def write(self, rows):
+        """
+        Queue rows from any iterable - parser generators are consumed lazily
+
+        Returns:
+            Number of rows queued
+        """
+        count = 0
+        for values in rows:
+            self.add(**values)
+            count += 1
+        return count
+
+    def flush(self):
+        """Write buffered rows, skipping fingerprints that are already stored"""
+        if not self._pending:
+            return
+        started = time.perf_counter()
+        self.session.flush()
+        connection = self.session.connection()
+        if self._use_copy is None:
+            self._use_copy = connection.dialect.name == 'postgresql'
+        if self._use_copy:
+            inserted = self._copy(connection, self._pending)
+        else:
+            inserted = self._insert(connection, self._pending)
+        self.rows += inserted
+        self.skipped += len(self._pending) - inserted
+        self.seconds += time.perf_counter() - started
+        self._pending = []
+
+    def _insert(self, connection, rows):
+        """executemany INSERT ... ON CONFLICT DO NOTHING"""
+        dialect_insert = postgresql.insert if connection.dialect.name == 'postgresql' else sqlite.insert
+        statement = dialect_insert(self.table).on_conflict_do_nothing(index_elements=['fingerprint'])
+        statement = statement.returning(*(self.table.c[field] for field in ROLLUP_FIELDS))
+        keys = [column.key for column in self.columns]
+        inserted = connection.execute(statement, [dict(zip(keys, row)) for row in rows]).mappings().all()
+        for row in inserted:
+            self._rollup.add_row(row)
+        return len(inserted)
+
+    def _copy(self, connection, rows):
+        """
+        COPY rows through the DBAPI connection of the session's transaction
+
+        COPY cannot skip conflicting rows, so the batch is copied into a
+        temporary table and moved over with INSERT ... ON CONFLICT DO NOTHING.
+        """
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write('\t'.join(_copy_value(value) for value in row))
+            buffer.write('\n')
+        buffer.seek(0)
+        names = ', '.join(column.name for column in self.columns)
+        staging = f"{self.table.name}_import"
+        cursor = connection.connection.cursor()
+        try:
+            cursor.execute(
+                f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS "
+                f"SELECT {names} FROM {self.table.name} WITH NO DATA"
+            )
+            cursor.copy_expert(f"COPY {staging} ({names}) FROM STDIN", buffer)
+            cursor.execute(
+                f"INSERT INTO {self.table.name} ({names}) SELECT {names} FROM {staging} "
+                f"ON CONFLICT (fingerprint) DO NOTHING "
+                f"RETURNING {', '.join(ROLLUP_FIELDS)}"
+            )
+            inserted = cursor.fetchall()
+            cursor.execute(f"DROP TABLE {staging}")
+        finally:
+            cursor.close()
+        for row in inserted:
+            self._rollup.add(*row)
+        return len(inserted)
+
+    def _apply_diff(self):
+        """Update matched rows and delete rows the new parser output no longer has"""
+        if self._existing is None:
+            self._existing = self._load_existing()
+        started = time.perf_counter()
+        connection = self.session.connection()
+
+        stale = [row['id'] for row in self._existing.values()]
+        for row in self._existing.values():
+            self._rollup.add_row(row, sign=-1)
+        for start in range(0, len(stale), self.batch_size):
+            connection.execute(self.table.delete().where(self.table.c.id.in_(stale[start:start + self.batch_size])))
+        self.deleted = len(stale)
+
+        # Fingerprints for legacy rows are dropped if another statement took them since
+        new_fingerprints = [update['fingerprint'] for update in self._updates if 'fingerprint' in update]
+        taken = set()
+        for start in range(0, len(new_fingerprints), self.batch_size):
+            taken.update(connection.execute(
+                db.select(self.table.c.fingerprint)
+                .where(self.table.c.fingerprint.in_(new_fingerprints[start:start + self.batch_size]))
+            ).scalars())
+        for update in self._updates:
+            if update.get('fingerprint') in taken:
+                del update['fingerprint']
+        if self._updates:
+            self.session.execute(db.update(BankTransaction), self._updates)
+
+        self._existing = {}
+        self._loose = {}
+        self._updates = []
+        self.seconds += time.perf_counter() - started
+
+    def close(self):
+        """Write the remaining rows, update the daily rollups and log the insert rate"""
+        self.flush()
+        if self.reparse:
+            self._apply_diff()
+        self._rollup.apply(self.session)
+        if self.reparse:
+            logger.info(f"Re-parsed statement {self.defaults['statement_id']}: {self.rows} inserted, "
+                        f"{self.updated} updated, {self.deleted} deleted, {self.unchanged} unchanged "
+                        f"in {self.seconds:.2f}s")
+        elif self.rows or self.skipped:
+            logger.info(f"Inserted {self.rows} transactions ({self.skipped} already imported) "
+                        f"in {self.seconds:.2f}s ({self.rows_per_second:.0f} rows/s)")
+        return self.rows
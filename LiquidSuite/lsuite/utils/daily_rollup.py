@@ -0,0 +1,283 @@
+"""
+Daily Transaction Rollup - Per-day totals the dashboards read instead of bank_transactions
+Location: lsuite/utils/daily_rollup.py
+
+transaction_daily_rollup holds transaction counts and deposit/withdrawal sums
+per user, bank account, day and category, so dashboard cost grows with the
+days in range rather than the number of transactions. It is kept current as
+transactions change:
+
+- BankTransactionWriter adds the rows it inserts and removes rows a re-parse deletes
+- ORM inserts, deletes and changes of date, account, category or amounts
+  (categorise, uncategorise, delete) are picked up when the session flushes
+- Bulk query deletes call subtract_query() first
+
+Run: flask rebuild-rollups    (recompute from bank_transactions)
+"""
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+import click
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from lsuite.extensions import db
+from lsuite.models import BankTransaction, TransactionCategory, TransactionDailyRollup
+
+logger = logging.getLogger(__name__)
+
+# BankTransaction attributes a rollup row depends on
+KEY_FIELDS = ('user_id', 'bank_account_id', 'date', 'category_id')
+ROLLUP_FIELDS = KEY_FIELDS + ('deposit', 'withdrawal')
+
+
+class RollupDelta:
+    """Pending changes to rollup rows keyed by (user_id, bank_account_id, date, category_id)"""
+
+    def __init__(self):
+        self.changes = defaultdict(lambda: [0, Decimal('0'), Decimal('0')])
+
+    def __bool__(self):
+        return any(any(change) for change in self.changes.values())
+
+    def add(self, user_id, bank_account_id, date, category_id, deposit, withdrawal, count=1, sign=1):
+        """Count rows in (sign=1) or out (sign=-1) of a day's totals"""
+        change = self.changes[(user_id, bank_account_id, date, category_id)]
+        change[0] += sign * count
+        change[1] += sign * Decimal(str(deposit or 0))
+        change[2] += sign * Decimal(str(withdrawal or 0))
+
+    def add_row(self, row, sign=1):
+        """Add a mapping or row with the ROLLUP_FIELDS"""
+        self.add(*(row[field] for field in ROLLUP_FIELDS), sign=sign)
+
+    def apply(self, session=None):
+        """
+        Add the changes to the rollup table in the session's transaction
+
+        Existing rows are incremented in SQL so concurrent writers do not
+        lose each other's updates. Statements run straight away, which also
+        makes this safe to call while the session is flushing.
+        """
+        session = session or db.session
+        changes = {key: change for key, change in self.changes.items() if any(change)}
+        self.changes.clear()
+        by_user = defaultdict(list)
+        for key in changes:
+            by_user[key[0]].append(key)
+
+        rollup = TransactionDailyRollup
+        new_rows = []
+        for user_id, keys in by_user.items():
+            dates = sorted({key[2] for key in keys})
+            existing = {}
+            for start in range(0, len(dates), 500):
+                for row_id, *key in session.execute(
+                    db.select(rollup.id, rollup.user_id, rollup.bank_account_id, rollup.date, rollup.category_id)
+                    .where(rollup.user_id == user_id, rollup.date.in_(dates[start:start + 500]))
+                ):
+                    existing.setdefault(tuple(key), row_id)
+
+            for key in keys:
+                count, deposit, withdrawal = changes[key]
+                row_id = existing.get(key)
+                if row_id is None:
+                    new_rows.append({
+                        'user_id': key[0], 'bank_account_id': key[1], 'date': key[2], 'category_id': key[3],
+                        'transaction_count': count, 'deposit_total': deposit, 'withdrawal_total': withdrawal,
+                    })
+                else:
+                    session.execute(db.update(rollup).where(rollup.id == row_id).values(
+                        transaction_count=rollup.transaction_count + count,
+                        deposit_total=rollup.deposit_total + deposit,
+                        withdrawal_total=rollup.withdrawal_total + withdrawal
+                    ))
+        if new_rows:
+            session.execute(db.insert(rollup), new_rows)
+
+
+def subtract_query(query):
+    """Take the transactions a query matches out of the rollups - call before a bulk delete"""
+    delta = RollupDelta()
+    columns = [getattr(BankTransaction, field) for field in KEY_FIELDS]
+    rows = query.with_entities(
+        *columns,
+        db.func.count(BankTransaction.id),
+        db.func.sum(BankTransaction.deposit),
+        db.func.sum(BankTransaction.withdrawal)
+    ).group_by(*columns).order_by(None)
+    for *key, count, deposit, withdrawal in rows:
+        delta.add(*key, deposit, withdrawal, count=count, sign=-1)
+    delta.apply()
+
+
+def _stored_rows(session, ids):
+    """ROLLUP_FIELDS of transactions as the database has them before this flush"""
+    table = BankTransaction.__table__
+    rows = []
+    ids = list(ids)
+    for start in range(0, len(ids), 500):
+        rows.extend(session.execute(
+            db.select(*(table.c[field] for field in ROLLUP_FIELDS))
+            .where(table.c.id.in_(ids[start:start + 500]))
+        ).mappings())
+    return rows
+
+
+@event.listens_for(Session, 'before_flush')
+def _track_transaction_changes(session, flush_context, instances):
+    """Move the totals of transactions added, deleted or re-keyed in this flush"""
+    delta = RollupDelta()
+    # Old values are read back from the database - attribute history lacks
+    # them when the object was expired (after a commit) before the change
+    changed = {}
+    with session.no_autoflush:
+        for obj in session.new:
+            if isinstance(obj, BankTransaction):
+                delta.add(*(getattr(obj, field) for field in ROLLUP_FIELDS))
+        for obj in session.deleted:
+            if isinstance(obj, BankTransaction) and obj.id is not None:
+                changed[obj.id] = None
+        for obj in session.dirty:
+            if not isinstance(obj, BankTransaction) or obj in session.deleted:
+                continue
+            state = inspect(obj)
+            if any(state.attrs[field].history.has_changes() for field in ROLLUP_FIELDS):
+                changed[obj.id] = obj
+        if changed:
+            for row in _stored_rows(session, changed):
+                delta.add_row(row, sign=-1)
+            for obj in changed.values():
+                if obj is not None:
+                    delta.add(*(getattr(obj, field) for field in ROLLUP_FIELDS))
+        if delta:
+            delta.apply(session)
+
+
+def rebuild_rollups(user_id=None):
+    """
+    Recompute rollup rows from bank_transactions
+
+    Returns:
+        Number of rollup rows written
+    """
+    rollup = TransactionDailyRollup
+    delete = db.delete(rollup)
+    source = db.select(
+        *(getattr(BankTransaction, field) for field in KEY_FIELDS),
+        db.func.count(BankTransaction.id),
+        db.func.coalesce(db.func.sum(BankTransaction.deposit), 0),
+        db.func.coalesce(db.func.sum(BankTransaction.withdrawal), 0)
+    ).group_by(*(getattr(BankTransaction, field) for field in KEY_FIELDS))
+    if user_id:
+        delete = delete.where(rollup.user_id == user_id)
+        source = source.where(BankTransaction.user_id == user_id)
+
+    db.session.execute(delete)
+    result = db.session.execute(db.insert(rollup).from_select(
+        ['user_id', 'bank_account_id', 'date', 'category_id',
+         'transaction_count', 'deposit_total', 'withdrawal_total'],
+        source
+    ))
+    db.session.commit()
+    return result.rowcount
+
+
+# =============================================================================
+# Dashboard reads
+# =============================================================================
+
+def _in_range(query, user_id, start_date, end_date=None):
+    query = query.filter(TransactionDailyRollup.user_id == user_id,
+                         TransactionDailyRollup.date >= start_date)
+    if end_date:
+        query = query.filter(TransactionDailyRollup.date <= end_date)
+    return query
+
+
+def period_totals(user_id, start_date, end_date=None):
+    """
+    Totals over a date range
+
+    Returns:
+        Dict with count, income and expenses
+    """
+    rollup = TransactionDailyRollup
+    count, income, expenses = _in_range(db.session.query(
+        db.func.sum(rollup.transaction_count),
+        db.func.sum(rollup.deposit_total),
+        db.func.sum(rollup.withdrawal_total)
+    ), user_id, start_date, end_date).one()
+    return {'count': int(count or 0), 'income': float(income or 0), 'expenses': float(expenses or 0)}
+
+
+def category_totals(user_id, start_date, end_date=None):
+    """
+    Per-category totals over a date range, categories without transactions left out
+
+    Returns:
+        Rows with id, name, transaction_type, count, expenses and income
+    """
+    rollup = TransactionDailyRollup
+    expenses = db.func.sum(rollup.withdrawal_total)
+    return _in_range(db.session.query(
+        TransactionCategory.id,
+        TransactionCategory.name,
+        TransactionCategory.transaction_type,
+        db.func.sum(rollup.transaction_count).label('count'),
+        expenses.label('expenses'),
+        db.func.sum(rollup.deposit_total).label('income')
+    ).join(rollup, rollup.category_id == TransactionCategory.id), user_id, start_date, end_date).group_by(
+        TransactionCategory.id,
+        TransactionCategory.name,
+        TransactionCategory.transaction_type
+    ).having(db.func.sum(rollup.transaction_count) > 0).order_by(expenses.desc()).all()
+
+
+def uncategorized_totals(user_id, start_date, end_date=None):
+    """
+    Uncategorised transactions over a date range
+
+    Returns:
+        Dict with count and total (deposits plus withdrawals)
+    """
+    rollup = TransactionDailyRollup
+    count, total = _in_range(db.session.query(
+        db.func.sum(rollup.transaction_count),
+        db.func.sum(rollup.deposit_total + rollup.withdrawal_total)
+    ), user_id, start_date, end_date).filter(rollup.category_id.is_(None)).one()
+    return {'count': int(count or 0), 'total': float(total or 0)}
+
+
+def monthly_totals(user_id, start_date, end_date=None):
+    """
+    Per-month totals over a date range, oldest first
+
+    Returns:
+        Rows with year, month, expenses, income and count
+    """
+    rollup = TransactionDailyRollup
+    year = db.extract('year', rollup.date).label('year')
+    month = db.extract('month', rollup.date).label('month')
+    return _in_range(db.session.query(
+        year,
+        month,
+        db.func.sum(rollup.withdrawal_total).label('expenses'),
+        db.func.sum(rollup.deposit_total).label('income'),
+        db.func.sum(rollup.transaction_count).label('count')
+    ), user_id, start_date, end_date).group_by(year, month).having(
+        db.func.sum(rollup.transaction_count) > 0
+    ).order_by(year, month).all()
+
+
+def register_rollup_commands(app):
+    """Register rollup commands with Flask CLI"""
+
+    @app.cli.command('rebuild-rollups')
+    @click.option('--user-id', type=int, help='Only rebuild the rollups of this user')
+    def rebuild_rollups_command(user_id):
+        """Recompute transaction_daily_rollup from bank_transactions"""
+        with app.app_context():
+            rows = rebuild_rollups(user_id)
+        click.echo(f"Rebuilt {rows} daily rollup rows")
@@ -4,6 +4,8 @@ Location: lsuite/utils/db_checker.py
 
 Run: flask db-check
      flask db-fix
+     flask compress-bodies
+     flask fingerprint-transactions
 """
 import logging
 from sqlalchemy import inspect, text
@@ -298,6 +300,102 @@ def validate_business_intel_tables():
     return all_ok
 
 
+def compress_email_bodies(batch_size=500):
+    """
+    Move uncompressed email bodies into the compressed columns
+    
+    Rows are handled in ID order, one commit per batch, so the backfill can
+    be stopped and resumed.
+    
+    Returns:
+        Number of statements converted
+    """
+    from lsuite.models import EmailStatement
+    
+    legacy = db.or_(EmailStatement.body_text_legacy.isnot(None), EmailStatement.body_html_legacy.isnot(None))
+    converted = 0
+    last_id = 0
+    while True:
+        statements = EmailStatement.query.options(
+            db.undefer(EmailStatement.body_text_legacy),
+            db.undefer(EmailStatement.body_html_legacy)
+        ).filter(legacy, EmailStatement.id > last_id).order_by(EmailStatement.id).limit(batch_size).all()
+        if not statements:
+            break
+        
+        for statement in statements:
+            statement.body_text = statement.body_text_legacy
+            statement.body_html = statement.body_html_legacy
+            statement.body_text_legacy = None
+            statement.body_html_legacy = None
+        last_id = statements[-1].id
+        db.session.commit()
+        converted += len(statements)
+        print(f"Compressed {converted} statement bodies...")
+    
+    return converted
+
+
+def fingerprint_transactions(batch_size=1000):
+    """
+    Fingerprint bank transactions imported before fingerprints were stored
+    
+    Repeats of an identical line get increasing ordinals, so histories that
+    were imported twice keep both copies. A line whose fingerprint is already
+    taken by a newer import is left without one.
+    
+    Returns:
+        Tuple of (fingerprinted, left without fingerprint)
+    """
+    from lsuite.models import BankTransaction
+    from lsuite.utils.bulk_insert import transaction_fingerprint
+    
+    ordinals = {}
+    fingerprinted = 0
+    conflicts = 0
+    last_id = 0
+    while True:
+        transactions = BankTransaction.query.filter(
+            BankTransaction.fingerprint.is_(None),
+            BankTransaction.id > last_id
+        ).order_by(BankTransaction.id).limit(batch_size).all()
+        if not transactions:
+            break
+        
+        fingerprints = []
+        for transaction in transactions:
+            values = {
+                'user_id': transaction.user_id,
+                'bank_account_id': transaction.bank_account_id,
+                'date': transaction.date,
+                'deposit': transaction.deposit,
+                'withdrawal': transaction.withdrawal,
+                'description': transaction.description,
+                'balance': transaction.balance,
+            }
+            base = transaction_fingerprint(values)
+            ordinal = ordinals.get(base, 0)
+            ordinals[base] = ordinal + 1
+            fingerprints.append(transaction_fingerprint(values, ordinal) if ordinal else base)
+        
+        taken = {
+            fingerprint for (fingerprint,) in db.session.query(BankTransaction.fingerprint).filter(
+                BankTransaction.fingerprint.in_(fingerprints)
+            )
+        }
+        for transaction, fingerprint in zip(transactions, fingerprints):
+            if fingerprint in taken:
+                conflicts += 1
+            else:
+                transaction.fingerprint = fingerprint
+                fingerprinted += 1
+        last_id = transactions[-1].id
+        db.session.commit()
+        print(f"Fingerprinted {fingerprinted} transactions...")
+    
+    return fingerprinted, conflicts
+
+
 # Flask CLI commands
 def register_db_commands(app):
     """Register database check commands with Flask CLI"""
@@ -320,6 +418,20 @@ def register_db_commands(app):
         with app.app_context():
             validate_business_intel_tables()
     
+    @app.cli.command('compress-bodies')
+    def compress_bodies_command():
+        """Compress email bodies stored before compression"""
+        with app.app_context():
+            converted = compress_email_bodies()
+            print(f"\n✓ Compressed {converted} statement bodies")
+    
+    @app.cli.command('fingerprint-transactions')
+    def fingerprint_transactions_command():
+        """Fingerprint transactions imported before duplicate detection"""
+        with app.app_context():
+            fingerprinted, conflicts = fingerprint_transactions()
+            print(f"\n✓ Fingerprinted {fingerprinted} transactions ({conflicts} already imported again since)")
+    
     @app.cli.command('db-report')
     def db_report_command():
         """Generate detailed database report"""
@@ -0,0 +1,199 @@
+"""
+PDF Text Extraction - Per-page text extraction, optionally across a process pool
+Location: lsuite/utils/pdf_text.py
+"""
+import io
+import os
+import mmap
+import logging
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Below this many pages per worker, process start-up costs more than it saves
+MIN_PAGES_PER_WORKER = 4
+
+# Pages handed to a worker per task - small enough to keep workers balanced
+PAGES_PER_TASK = 2
+
+# Files at least this big are memory-mapped rather than read. Werkzeug spools
+# uploads over 500 KB to a temporary file, so these are already on disk.
+MMAP_MIN_BYTES = 1024 * 1024
+
+# Reader opened once per worker process by _init_worker
+_worker_reader = None
+
+
+def resolve_workers(workers):
+    """Turn a configured worker count into a usable one (0 or None = all cores)"""
+    if not workers or workers < 0:
+        return os.cpu_count() or 1
+    return workers
+
+
+@contextmanager
+def map_file(path):
+    """Memory-map a file read-only for the duration of the block"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b''
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield mapped
+
+
+@contextmanager
+def pdf_buffer(source):
+    """
+    PDF data from an upload or stream, without writing or copying it where possible
+
+    Args:
+        source: bytes-like data, a binary file object, or a werkzeug FileStorage
+
+    Yields:
+        bytes or a read-only mmap - both accepted wherever pdf_data is
+    """
+    if isinstance(source, (bytes, bytearray, memoryview, mmap.mmap)):
+        yield source
+        return
+
+    stream = getattr(source, 'stream', source)
+    if hasattr(stream, 'getvalue'):
+        # BytesIO shares its buffer with the bytes it returns
+        yield stream.getvalue()
+        return
+
+    size = stream.seek(0, io.SEEK_END)
+    stream.seek(0)
+    if size >= MMAP_MIN_BYTES:
+        try:
+            stream.flush()
+            mapped = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+            mapped = None
+        if mapped is not None:
+            with mapped:
+                yield mapped
+            return
+
+    yield stream.read()
+
+
+def _open_stream(pdf_data):
+    """Seekable stream over PDF data for the PDF libraries"""
+    if isinstance(pdf_data, mmap.mmap):
+        pdf_data.seek(0)
+        return pdf_data
+    return io.BytesIO(pdf_data)
+
+
+def open_reader(pdf_data, password=None):
+    """Open a PyPDF2 reader and decrypt it if needed"""
+    import PyPDF2
+    reader = PyPDF2.PdfReader(_open_stream(pdf_data))
+
+    if reader.is_encrypted:
+        if not password:
+            raise ValueError("PDF is password protected but no password provided")
+        if reader.decrypt(password) == 0:
+            raise ValueError("Incorrect PDF password")
+
+    return reader
+
+
+def _init_worker(pdf_data, password):
+    """Process pool initializer - parse and decrypt the PDF once per worker"""
+    global _worker_reader
+    _worker_reader = open_reader(pdf_data, password)
+
+
+def _extract_page_range(start, stop):
+    """Extract pages [start, stop) from the worker's reader"""
+    return [_worker_reader.pages[i].extract_text() for i in range(start, stop)]
+
+
+def iter_pages(pdf_data, password=None, workers=1, cache=None):
+    """
+    Yield the text of each page in page order
+
+    Args:
+        pdf_data: Binary PDF data - bytes, a memoryview or an mmap (see pdf_buffer)
+        password: PDF password if protected
+        workers: Worker processes to spread pages over (0 = all cores)
+        cache: Optional PageTextCache - a hit skips decryption and extraction.
+            Text of protected PDFs is stored encrypted with their password.
+
+    Yields:
+        Page text strings. The pdfplumber fallback skips empty pages.
+    """
+    if cache is None:
+        yield from _iter_extracted_pages(pdf_data, password, workers)
+        return
+
+    key = cache.key_for(pdf_data, password)
+    pages = cache.get(key, password)
+    if pages is not None:
+        yield from pages
+        return
+
+    pages = []
+    for page in _iter_extracted_pages(pdf_data, password, workers):
+        pages.append(page)
+        yield page
+    cache.put(key, pages, password)
+
+
+def _iter_extracted_pages(pdf_data, password, workers):
+    """Extract page text from the PDF itself"""
+    try:
+        reader = open_reader(pdf_data, password)
+    except ImportError:
+        yield from _iter_pages_pdfplumber(pdf_data, password)
+        return
+
+    page_count = len(reader.pages)
+    workers = min(resolve_workers(workers), page_count // MIN_PAGES_PER_WORKER)
+
+    if workers <= 1:
+        for page in reader.pages:
+            yield page.extract_text()
+        return
+
+    logger.info(f"Extracting {page_count} pages with {workers} worker processes")
+
+    # Workers get their own copy - views and maps cannot be pickled
+    if not isinstance(pdf_data, bytes):
+        pdf_data = bytes(pdf_data)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(pdf_data, password)) as pool:
+        # Keep a bounded number of page ranges in flight so a slow consumer
+        # does not leave the whole document's text waiting in memory
+        pending = deque()
+        for start in range(0, page_count, PAGES_PER_TASK):
+            pending.append(pool.submit(_extract_page_range, start, min(start + PAGES_PER_TASK, page_count)))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def extract_text(pdf_data, password=None, workers=1, cache=None):
+    """Extract the text of the whole PDF, one newline-terminated block per page"""
+    return ''.join(page + "\n" for page in iter_pages(pdf_data, password, workers, cache))
+
+
+def _iter_pages_pdfplumber(pdf_data, password=None):
+    """Fallback extraction when PyPDF2 is not installed"""
+    try:
+        import pdfplumber
+    except ImportError:
+        raise ImportError("No PDF library available. Install PyPDF2 or pdfplumber")
+
+    with pdfplumber.open(_open_stream(pdf_data), password=password) as pdf:
+        for page in pdf.pages:
+            page_text = page.extract_text()
+            if page_text:
+                yield page_text
@@ -0,0 +1,140 @@
+"""
+PDF Text Cache - Content-addressed on-disk cache of extracted page text
+Location: lsuite/utils/text_cache.py
+"""
+import os
+import json
+import zlib
+import base64
+import hashlib
+import logging
+from functools import lru_cache
+
+from cryptography.fernet import Fernet, InvalidToken
+
+logger = logging.getLogger(__name__)
+
+# Bump when page text extraction changes so stale entries stop matching
+EXTRACTION_VERSION = 1
+
+CACHE_SUFFIX = '.pages'
+
+# PBKDF2 rounds for the key that encrypts the text of password-protected PDFs
+KEY_DERIVATION_ROUNDS = 200_000
+
+
+@lru_cache(maxsize=32)
+def _cipher(key, password):
+    """Cipher for one protected PDF's entry - derived from its password, salted with the cache key"""
+    secret = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), key.encode('ascii'), KEY_DERIVATION_ROUNDS)
+    return Fernet(base64.urlsafe_b64encode(secret))
+
+
+class PageTextCache:
+    """
+    Extracted page text stored under the SHA-256 of the PDF bytes
+
+    Entries are zlib-compressed JSON lists of page strings. Entries of
+    password-protected PDFs are also encrypted with a key derived from the
+    password, so only someone who can open the PDF can read its text. When
+    the cache grows past max_bytes the least recently used entries are removed.
+    """
+
+    def __init__(self, directory, max_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key_for(pdf_data, password=None):
+        """Cache key for a PDF - the password is part of the key for encrypted files"""
+        digest = hashlib.sha256(pdf_data)
+        if password:
+            digest.update(b'\0' + password.encode('utf-8'))
+        return f"{digest.hexdigest()}-v{EXTRACTION_VERSION}"
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + CACHE_SUFFIX)
+
+    def get(self, key, password=None):
+        """Return the cached pages for a key, or None - pass the PDF's password for protected files"""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            if password:
+                data = _cipher(key, password).decrypt(data)
+            pages = json.loads(zlib.decompress(data))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, zlib.error, InvalidToken) as e:
+            logger.warning(f"Discarding unreadable text cache entry {key}: {e}")
+            self._remove(path)
+            return None
+
+        # Mark as recently used for eviction
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        logger.info(f"Text cache hit: {key[:12]} ({len(pages)} pages)")
+        return pages
+
+    def put(self, key, pages, password=None):
+        """Store the pages for a key and evict old entries if over the size limit"""
+        data = zlib.compress(json.dumps(pages).encode('utf-8'))
+        if password:
+            data = _cipher(key, password).encrypt(data)
+        if len(data) > self.max_bytes:
+            return
+
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write text cache entry {key}: {e}")
+            self._remove(temp_path)
+            return
+
+        self._evict()
+
+    def _evict(self):
+        """Remove least recently used entries until the cache fits max_bytes"""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(CACHE_SUFFIX):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        if total <= self.max_bytes:
+            return
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+            logger.debug(f"Evicted text cache entry {os.path.basename(path)}")
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def get_text_cache(app):
+    """Build the page text cache from app config, or None when disabled"""
+    directory = app.config.get('PDF_TEXT_CACHE_DIR')
+    max_bytes = app.config.get('PDF_TEXT_CACHE_MAX_BYTES', 0)
+    if not directory or max_bytes <= 0:
+        return None
+    return PageTextCache(directory, max_bytes)
@@ -0,0 +1,86 @@
+"""
+Add the columns the import, blob store and Gmail sync changes introduced
+bank_transactions.fingerprint, email_statements.attachments and the
+compressed body columns, uploaded_documents.file_sha256 and the Gmail
+history watermark on google_credentials. Run before
+migrations/add_transaction_indexes.py, which puts a unique index on
+fingerprint.
+
+Existing rows are left as they are: run flask fingerprint-transactions,
+flask compress-bodies and flask migrate-blobs afterwards to backfill them.
+
+Usage:
+    python migrations/add_import_columns.py            # upgrade
+    python migrations/add_import_columns.py downgrade
+"""
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from lsuite.extensions import db
+from lsuite.models import BankTransaction, EmailStatement, UploadedDocument, GoogleCredential
+
+# (model, column name) in the order they are added
+COLUMNS = (
+    (BankTransaction, 'fingerprint'),
+    (EmailStatement, 'attachments'),
+    (EmailStatement, 'body_text_z'),
+    (EmailStatement, 'body_html_z'),
+    (UploadedDocument, 'file_sha256'),
+    (GoogleCredential, 'history_id'),
+    (GoogleCredential, 'last_sync_date'),
+)
+
+INDEX_NAMES = ('ix_uploaded_documents_file_sha256',)
+
+
+def _indexes():
+    indexes = {index.name: index for index in UploadedDocument.__table__.indexes}
+    return [indexes[name] for name in INDEX_NAMES]
+
+
+def upgrade():
+    """ALTER TABLE ... ADD COLUMN for every column that does not exist yet"""
+    with app.app_context():
+        with db.engine.begin() as connection:
+            inspector = db.inspect(connection)
+            for model, name in COLUMNS:
+                table = model.__table__
+                existing = {column['name'] for column in inspector.get_columns(table.name)}
+                if name in existing:
+                    print(f"✓ {table.name}.{name} already exists")
+                    continue
+                column_type = table.c[name].type.compile(dialect=connection.dialect)
+                connection.execute(db.text(f'ALTER TABLE {table.name} ADD COLUMN {name} {column_type}'))
+                print(f"✓ Added {table.name}.{name}")
+            for index in _indexes():
+                index.create(connection, checkfirst=True)
+                print(f"✓ {index.name}")
+        print("✓ Import columns applied")
+        return True
+
+
+def downgrade():
+    """Drop the columns again"""
+    with app.app_context():
+        with db.engine.begin() as connection:
+            for index in _indexes():
+                index.drop(connection, checkfirst=True)
+            connection.execute(db.text('DROP INDEX IF EXISTS uq_bank_transactions_fingerprint'))
+            inspector = db.inspect(connection)
+            for model, name in reversed(COLUMNS):
+                table = model.__table__
+                if name in {column['name'] for column in inspector.get_columns(table.name)}:
+                    connection.execute(db.text(f'ALTER TABLE {table.name} DROP COLUMN {name}'))
+                    print(f"✓ Dropped {table.name}.{name}")
+        return True
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "downgrade":
+        downgrade()
+    else:
+        upgrade()
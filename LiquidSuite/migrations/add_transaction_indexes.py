@@ -0,0 +1,58 @@
+"""
+Add composite and partial indexes to bank_transactions
+Dashboards filter by user_id plus a date window and then by category or
+ERPNext sync state; these indexes let those queries read one user's range
+instead of scanning the table
+
+Run migrations/add_import_columns.py first on databases created before
+bank_transactions.fingerprint existed.
+
+Usage:
+    python migrations/add_transaction_indexes.py            # upgrade
+    python migrations/add_transaction_indexes.py downgrade
+"""
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app
+from lsuite.extensions import db
+from lsuite.models import BankTransaction, TRANSACTION_QUERY_INDEXES
+
+INDEX_NAMES = ('uq_bank_transactions_fingerprint',) + TRANSACTION_QUERY_INDEXES
+
+
+def _indexes():
+    indexes = {index.name: index for index in BankTransaction.__table__.indexes}
+    return [indexes[name] for name in INDEX_NAMES]
+
+
+def upgrade():
+    """Create the indexes that do not exist yet and refresh planner statistics"""
+    with app.app_context():
+        with db.engine.begin() as connection:
+            for index in _indexes():
+                index.create(connection, checkfirst=True)
+                print(f"✓ {index.name}")
+            connection.execute(db.text('ANALYZE bank_transactions'))
+        print("✓ Transaction indexes applied")
+        return True
+
+
+def downgrade():
+    """Drop the indexes again"""
+    with app.app_context():
+        with db.engine.begin() as connection:
+            for index in _indexes():
+                index.drop(connection, checkfirst=True)
+                print(f"✓ Dropped {index.name}")
+        return True
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "downgrade":
+        downgrade()
+    else:
+        upgrade()
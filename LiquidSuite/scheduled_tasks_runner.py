@@ -100,24 +100,25 @@ def run_gmail_import():
             return False
         
         from flask import current_app
-        service = GmailService(current_app)
+        service = GmailService(current_app._get_current_object())
         
         total_imported = 0
         total_skipped = 0
         
-        for cred in credentials:
-            logger.info(f"Processing credential: {cred.name}")
+        # Mailboxes are imported side by side, each on its own session
+        results = service.fetch_all_statements([cred.id for cred in credentials])
+        
+        for result in results:
+            logger.info(f"Processing credential: {result['name'] or result['credential_id']}")
             
-            try:
-                imported, skipped = service.fetch_statements(cred)
-                total_imported += imported
-                total_skipped += skipped
-                
-                logger.info(f"  Imported: {imported}, Skipped: {skipped}")
-                
-            except Exception as e:
-                logger.error(f"  ✗ Failed: {str(e)}")
+            if result['error']:
+                logger.error(f"  ✗ Failed: {result['error']}")
                 continue
+            
+            total_imported += result['imported']
+            total_skipped += result['skipped']
+            
+            logger.info(f"  Imported: {result['imported']}, Skipped: {result['skipped']}")
         
         logger.info(f"✓ Total imported: {total_imported}")
         logger.info(f"ℹ Total skipped: {total_skipped}")
@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+"""
+Transaction Classifier Micro-benchmark
+Compares the keyword classifier and category suffix index with the linear
+keyword/endswith scans they replaced
+
+Usage:
+    python scripts/benchmark_classifier.py
+    python scripts/benchmark_classifier.py --rows 20000 --repeat 5
+"""
+import os
+import sys
+import random
+import timeit
+import argparse
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lsuite.gmail.keyword_matcher import KeywordClassifier, SuffixIndex
+from lsuite.gmail.parsers import (
+    CAPITEC_CATEGORIES, CREDIT_KEYWORDS, DEBIT_KEYWORDS,
+    CREDIT_CATEGORY_WORDS, DEBIT_CATEGORY_WORDS
+)
+
+MERCHANTS = [
+    'Payment Received: Acme Holdings', 'Interest Received', 'Online Purchase: Checkers Sixty60',
+    'Banking App External Payment: Landlord', 'Card Purchase: Steers Menlyn', 'Prepaid Purchase: Vodacom',
+    'Eft Debit Order: Clientele', 'Cash Withdrawal: Capitec Atm', 'Transfer Received: Savings Pocket',
+    'Monthly Account Admin Fee', 'Recurring Immediate Payment: Gym', 'Live Better Round-up',
+]
+
+
+def linear_is_credit(description, category):
+    """The keyword scan used before the classifier"""
+    desc_lower = description.lower()
+    cat_lower = (category or '').lower()
+    if any(kw in desc_lower for kw in CREDIT_KEYWORDS):
+        return True
+    if any(kw in desc_lower for kw in DEBIT_KEYWORDS):
+        return False
+    if any(word in cat_lower for word in CREDIT_CATEGORY_WORDS):
+        return True
+    if any(word in cat_lower for word in DEBIT_CATEGORY_WORDS):
+        return False
+    return False
+
+
+def linear_extract_category(text_str):
+    """The endswith scan used before the suffix index"""
+    for cat in CAPITEC_CATEGORIES:
+        if text_str.endswith(cat):
+            return text_str[:-(len(cat))].strip(), cat
+    return text_str, None
+
+
+def make_rows(count, unique, seed=0):
+    """Descriptions with categories - either statement-like repeats or all distinct"""
+    rng = random.Random(seed)
+    rows = []
+    for number in range(count):
+        description = rng.choice(MERCHANTS)
+        if unique:
+            description = f"{description} {number}"
+        category = rng.choice(CAPITEC_CATEGORIES + [None])
+        rows.append((description, category))
+    return rows
+
+
+def bench(label, func, items, repeat):
+    """Best time per item in microseconds"""
+    best = min(timeit.repeat(lambda: [func(*item) for item in items], number=1, repeat=repeat))
+    per_item = best / len(items) * 1e6
+    print(f"  {label:<34} {per_item:>8.3f} us/row")
+    return per_item
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark transaction keyword classification')
+    arg_parser.add_argument('--rows', type=int, default=10000)
+    arg_parser.add_argument('--repeat', type=int, default=5)
+    args = arg_parser.parse_args()
+
+    suffixes = SuffixIndex(CAPITEC_CATEGORIES)
+
+    for unique in (False, True):
+        rows = make_rows(args.rows, unique)
+        print(f"\n{'All distinct' if unique else 'Statement-like (repeating)'} descriptions, {len(rows)} rows")
+
+        # Fresh classifiers so the memo starts empty for each workload
+        descriptions = KeywordClassifier([('credit', CREDIT_KEYWORDS), ('debit', DEBIT_KEYWORDS)])
+        categories = KeywordClassifier([('credit', CREDIT_CATEGORY_WORDS), ('debit', DEBIT_CATEGORY_WORDS)])
+
+        def classify(description, category):
+            direction = descriptions.classify(description)
+            if direction is None and category:
+                direction = categories.classify(category)
+            return direction == 'credit'
+
+        assert [classify(*row) for row in rows] == [linear_is_credit(*row) for row in rows]
+
+        before = bench('credit/debit linear scan', linear_is_credit, rows, args.repeat)
+        after = bench('credit/debit classifier', classify, rows, args.repeat)
+        print(f"  {'speed-up':<34} {before / after:>8.2f}x")
+
+        texts = [(f"{d} {c}" if c else d,) for d, c in rows]
+        assert [suffixes.split(*t) for t in texts] == [linear_extract_category(*t) for t in texts]
+
+        before = bench('category endswith scan', linear_extract_category, texts, args.repeat)
+        after = bench('category suffix index', suffixes.split, texts, args.repeat)
+        print(f"  {'speed-up':<34} {before / after:>8.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+"""
+Statement Parser Benchmark
+Runs every registered parser over synthetic statements and reports speed,
+peak memory and accuracy against the generated ground truth
+
+Usage:
+    python scripts/benchmark_parsers.py
+    python scripts/benchmark_parsers.py --pages 1 50 500 --banks capitec --json bench.json
+    python scripts/benchmark_parsers.py --min-accuracy 0.99   # exit 1 on regressions
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import multiprocessing
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from statement_corpus import GENERATORS, generate
+
+
+def _peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where unsupported"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+# Parser entries benchmarked for every corpus bank: (name, run method)
+PARSERS = [('PDFParser', 'parse_pdf'), ('PDFParser.iter_transactions', 'iter_transactions')]
+
+
+def _check_corpus_coverage():
+    """Warn about registered statement formats that have no synthetic generator"""
+    from lsuite.gmail.parsers import STATEMENT_FORMATS
+
+    for statement_format in STATEMENT_FORMATS.formats():
+        if statement_format.bank_name not in GENERATORS:
+            print(f"⚠️  No synthetic corpus for {statement_format.label} - not benchmarked")
+
+
+def _run_case(method, pdf_data, bank_name, workers, repeat):
+    """Run one parser in a fresh process and return timings and parsed keys"""
+    logging.disable(logging.CRITICAL)
+    from lsuite.gmail.parsers import PDFParser
+
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        parser = PDFParser(workers=workers)
+        transactions = list(getattr(parser, method)(pdf_data, bank_name))
+        version = parser.parser_version
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    keys = [(t.date.isoformat(), t.amount_cents / 100, t.type) for t in transactions]
+    return {
+        'seconds': best,
+        'version': version,
+        'keys': keys,
+        'peak_rss_mb': _peak_rss_mb(),
+    }
+
+
+def _accuracy(expected, keys):
+    """Recall and precision of parsed rows against ground truth"""
+    expected = Counter((d.isoformat(), round(a, 2), t) for d, a, t in expected)
+    parsed = Counter(keys)
+    matched = sum((expected & parsed).values())
+    recall = matched / sum(expected.values()) if expected else 1.0
+    precision = matched / sum(parsed.values()) if parsed else (1.0 if not expected else 0.0)
+    return recall, precision
+
+
+def run_benchmarks(banks, page_counts, workers=1, repeat=1, seed=0):
+    """Benchmark every parser on every generated statement"""
+    results = []
+    context = multiprocessing.get_context('spawn')
+
+    for bank_name in banks:
+        for pages in page_counts:
+            statement = generate(bank_name, pages=pages, seed=seed)
+            pdf_data = statement.to_pdf()
+
+            for parser_name, method in PARSERS:
+                # A fresh process per case keeps peak RSS from leaking between runs
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                    case = pool.submit(_run_case, method, pdf_data, bank_name, workers, repeat).result()
+
+                recall, precision = _accuracy(statement.expected, case['keys'])
+                seconds = case['seconds']
+                results.append({
+                    'bank': bank_name,
+                    'pages': statement.page_count,
+                    'parser': parser_name,
+                    'version': case['version'],
+                    'seconds': round(seconds, 4),
+                    'pages_per_sec': round(statement.page_count / seconds, 1) if seconds else None,
+                    'tx_per_sec': round(len(case['keys']) / seconds, 1) if seconds else None,
+                    'transactions': len(case['keys']),
+                    'expected': len(statement.expected),
+                    'recall': round(recall, 4),
+                    'precision': round(precision, 4),
+                    'peak_rss_mb': round(case['peak_rss_mb'], 1) if case['peak_rss_mb'] else None,
+                })
+                print_row(results[-1])
+
+    return results
+
+
+def print_header():
+    print(f"{'bank':<9} {'pages':>5} {'parser':<28} {'version':<12} {'sec':>8} "
+          f"{'pages/s':>9} {'tx/s':>10} {'rows':>11} {'recall':>7} {'prec':>7} {'rss MB':>7}")
+    print('-' * 124)
+
+
+def print_row(row):
+    rss = f"{row['peak_rss_mb']:.1f}" if row['peak_rss_mb'] is not None else 'n/a'
+    print(f"{row['bank']:<9} {row['pages']:>5} {row['parser']:<28} {str(row['version']):<12} "
+          f"{row['seconds']:>8.3f} {row['pages_per_sec'] or 0:>9.1f} {row['tx_per_sec'] or 0:>10.1f} "
+          f"{row['transactions']:>5}/{row['expected']:<5} {row['recall']:>7.2%} {row['precision']:>7.2%} {rss:>7}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark bank statement parsers')
+    arg_parser.add_argument('--banks', nargs='+', choices=sorted(GENERATORS), default=sorted(GENERATORS))
+    arg_parser.add_argument('--pages', nargs='+', type=int, default=[1, 10, 100],
+                            help='Statement sizes in pages (1-500)')
+    arg_parser.add_argument('--workers', type=int, default=1, help='PDF extraction processes (0 = all cores)')
+    arg_parser.add_argument('--repeat', type=int, default=1, help='Runs per case, best time is kept')
+    arg_parser.add_argument('--seed', type=int, default=0)
+    arg_parser.add_argument('--json', help='Write results to this file')
+    arg_parser.add_argument('--min-accuracy', type=float,
+                            help='Exit with status 1 if any parser recall or precision is below this')
+    args = arg_parser.parse_args()
+
+    for pages in args.pages:
+        if not 1 <= pages <= 500:
+            arg_parser.error('--pages values must be between 1 and 500')
+
+    _check_corpus_coverage()
+    print_header()
+    results = run_benchmarks(args.banks, args.pages, args.workers, args.repeat, args.seed)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+    if args.min_accuracy is not None:
+        failures = [r for r in results
+                    if min(r['recall'], r['precision']) < args.min_accuracy]
+        if failures:
+            print(f"\n❌ {len(failures)} case(s) below accuracy {args.min_accuracy:.2%}")
+            sys.exit(1)
+        print(f"\n✅ All parsers at or above {args.min_accuracy:.2%} accuracy")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+"""
+Transaction Query Benchmark
+Seeds bank_transactions with synthetic rows and times the dashboard and
+transaction-list queries without and with the composite/partial index suite
+(migrations/add_transaction_indexes.py), recording each query plan
+
+Usage:
+    python scripts/benchmark_queries.py --rows 1000000
+    python scripts/benchmark_queries.py --database-url postgresql://localhost/lsuite_bench --rows 5000000
+    python scripts/benchmark_queries.py --reuse --json plans.json    # skip seeding an existing database
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from datetime import date, datetime, timedelta
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, select, func, extract, text
+
+from lsuite.extensions import db
+from lsuite.models import (
+    BankTransaction, User, TransactionCategory, EmailStatement, TRANSACTION_QUERY_INDEXES
+)
+
+SEED_CHUNK_SIZE = 20000
+TODAY = date(2025, 10, 1)
+
+
+def seed(engine, rows, users, categories, seed_value=0):
+    """Fresh schema with rows spread over users, five years and categories"""
+    rng = random.Random(seed_value)
+    db.metadata.drop_all(engine)
+    db.metadata.create_all(engine)
+    now = datetime.utcnow()
+
+    with engine.begin() as connection:
+        connection.execute(User.__table__.insert(), [
+            {'id': user_id, 'username': f'bench{user_id}', 'email': f'bench{user_id}@example.com',
+             'password_hash': '-', 'is_active': True, 'created_at': now}
+            for user_id in range(1, users + 1)
+        ])
+        connection.execute(TransactionCategory.__table__.insert(), [
+            {'id': category_id, 'name': f'Category {category_id}', 'erpnext_account': 'Bench',
+             'transaction_type': 'withdrawal', 'active': True, 'created_at': now}
+            for category_id in range(1, categories + 1)
+        ])
+        statements = max(1, rows // 200)
+        connection.execute(EmailStatement.__table__.insert(), [
+            {'id': statement_id, 'user_id': (statement_id % users) + 1, 'gmail_id': f'BENCH-{statement_id}',
+             'state': 'parsed', 'has_pdf': True, 'created_at': now}
+            for statement_id in range(1, statements + 1)
+        ])
+
+    insert = BankTransaction.__table__.insert()
+    started = time.perf_counter()
+    for start in range(0, rows, SEED_CHUNK_SIZE):
+        chunk = []
+        for number in range(start, min(rows, start + SEED_CHUNK_SIZE)):
+            statement_id = (number // 200) + 1
+            category_id = rng.randint(1, categories) if rng.random() < 0.7 else None
+            amount = round(rng.uniform(5, 5000), 2)
+            chunk.append({
+                'user_id': (statement_id % users) + 1,
+                'statement_id': statement_id,
+                'date': TODAY - timedelta(days=rng.randint(0, 5 * 365)),
+                'description': f'Card purchase {number % 5000}',
+                'deposit': amount if number % 4 == 0 else 0,
+                'withdrawal': 0 if number % 4 == 0 else amount,
+                'currency': 'ZAR',
+                'category_id': category_id,
+                'erpnext_synced': category_id is not None and rng.random() < 0.8,
+                'created_at': now,
+                'updated_at': now,
+            })
+        with engine.begin() as connection:
+            connection.execute(insert, chunk)
+        print(f"  seeded {min(rows, start + SEED_CHUNK_SIZE):,}/{rows:,} rows", end='\r')
+    print(f"  seeded {rows:,} rows in {time.perf_counter() - started:.1f}s" + ' ' * 20)
+
+
+def route_queries(user_id, category_id, statement_id):
+    """The bank_transactions queries behind the dashboards and transaction pages"""
+    t = BankTransaction
+    window = TODAY - timedelta(days=90)
+    return {
+        'transactions list (gmail.transactions)':
+            select(t).where(t.user_id == user_id).order_by(t.date.desc()).limit(50),
+        'date window (business_intel.dashboard)':
+            select(t).where(t.user_id == user_id, t.date >= window).order_by(t.date.desc()),
+        'uncategorised count (ai_insights)':
+            select(func.count()).select_from(t).where(
+                t.user_id == user_id, t.category_id == None, t.date >= window),
+        'category drill-down (ai_insights.category)':
+            select(t).where(t.user_id == user_id, t.category_id == category_id, t.date >= window),
+        'pending ERPNext sync (ai_insights)':
+            select(func.count()).select_from(t).where(
+                t.user_id == user_id, t.erpnext_synced == False, t.category_id != None),
+        'monthly totals (ai_insights.trends)':
+            select(extract('year', t.date), extract('month', t.date), func.sum(t.withdrawal))
+            .where(t.user_id == user_id, t.date >= TODAY - timedelta(days=365))
+            .group_by(extract('year', t.date), extract('month', t.date)),
+        'statement transactions (gmail.statement_detail)':
+            select(t).where(t.statement_id == statement_id).order_by(t.date.desc()),
+    }
+
+
+def _driver_sql(engine, statement):
+    """SQL string and DBAPI parameters for a statement"""
+    compiled = statement.compile(dialect=engine.dialect)
+    if compiled.positiontup is not None:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+    return str(compiled), params
+
+
+def explain(connection, engine, statement):
+    """Query plan as a list of lines"""
+    sql, params = _driver_sql(engine, statement)
+    if engine.dialect.name == 'postgresql':
+        rows = connection.exec_driver_sql(f"EXPLAIN (ANALYZE, BUFFERS) {sql}", params).fetchall()
+        return [row[0] for row in rows]
+    rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    return [row[-1] for row in rows]
+
+
+def time_query(connection, statement, repeat):
+    """Best wall time in milliseconds"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        connection.execute(statement).fetchall()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run(engine, queries, repeat):
+    results = {}
+    with engine.connect() as connection:
+        for label, statement in queries.items():
+            results[label] = {
+                'ms': time_query(connection, statement, repeat),
+                'plan': explain(connection, engine, statement),
+            }
+    return results
+
+
+def set_indexes(engine, present):
+    """Create or drop the index suite and refresh planner statistics"""
+    indexes = {index.name: index for index in BankTransaction.__table__.indexes}
+    with engine.begin() as connection:
+        for name in TRANSACTION_QUERY_INDEXES:
+            if present:
+                indexes[name].create(connection, checkfirst=True)
+            else:
+                indexes[name].drop(connection, checkfirst=True)
+        connection.execute(text('ANALYZE bank_transactions'))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Benchmark bank_transactions queries with and without indexes')
+    arg_parser.add_argument('--database-url', default='sqlite:///' + os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'benchmark_queries.db'))
+    arg_parser.add_argument('--rows', type=int, default=1000000)
+    arg_parser.add_argument('--users', type=int, default=20)
+    arg_parser.add_argument('--categories', type=int, default=30)
+    arg_parser.add_argument('--repeat', type=int, default=5, help='Runs per query, best time is kept')
+    arg_parser.add_argument('--reuse', action='store_true', help='Benchmark the existing rows instead of seeding')
+    arg_parser.add_argument('--seed', type=int, default=0)
+    arg_parser.add_argument('--json', help='Write timings and plans to this file')
+    args = arg_parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    if not args.reuse:
+        print(f"Seeding {args.rows:,} transactions into {engine.url.render_as_string(hide_password=True)}")
+        seed(engine, args.rows, args.users, args.categories, args.seed)
+
+    queries = route_queries(user_id=2, category_id=1, statement_id=1)
+    set_indexes(engine, present=False)
+    before = run(engine, queries, args.repeat)
+    set_indexes(engine, present=True)
+    after = run(engine, queries, args.repeat)
+
+    print(f"\n{'Query':<48} {'Before ms':>10} {'After ms':>10} {'Speed-up':>9}")
+    for label in queries:
+        b, a = before[label]['ms'], after[label]['ms']
+        print(f"{label:<48} {b:>10.2f} {a:>10.2f} {b / a if a else 0:>8.1f}x")
+    for label in queries:
+        print(f"\n{label}")
+        print("  before: " + "\n          ".join(before[label]['plan']))
+        print("  after:  " + "\n          ".join(after[label]['plan']))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'database': engine.dialect.name, 'rows': args.rows,
+                       'before': before, 'after': after}, f, indent=2)
+        print(f"\nResults written to {args.json}")
+
+
+if __name__ == '__main__':
+    main()
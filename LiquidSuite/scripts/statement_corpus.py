@@ -0,0 +1,226 @@
+"""
+Synthetic Statement Corpus - Generate bank statement PDFs with known transactions
+Used by benchmark_parsers.py; needs no network access or PDF libraries
+"""
+import random
+from datetime import date, timedelta
+
+
+ROWS_PER_PAGE = 60
+
+CAPITEC_CREDITS = [
+    ('Payment Received: Acme Holdings', 'Other Income'),
+    ('Interest Received', 'Interest'),
+    ('Transfer Received: Savings Pocket', 'Transfer'),
+]
+CAPITEC_DEBITS = [
+    ('Online Purchase: Checkers Sixty60', 'Groceries'),
+    ('Banking App External Payment: Landlord', 'Other Personal & Family'),
+    ('Card Purchase: Steers Menlyn', 'Takeaways'),
+    ('Prepaid Purchase: Vodacom', 'Cellphone'),
+]
+TYMEBANK_CREDITS = ['Salary deposit', 'Transfer from savings', 'Refund']
+TYMEBANK_DEBITS = ['Card purchase Checkers', 'Debit order Insurance', 'Prepaid airtime']
+GENERIC_WORDS = ['coffee', 'grocery', 'fuel', 'salary', 'rent', 'pharmacy', 'books', 'taxi']
+
+
+def format_amount(value):
+    """Money as printed on statements: -1,234.56"""
+    return f"{value:,.2f}"
+
+
+class SyntheticStatement:
+    """A generated statement: page lines plus the transactions a parser should find"""
+
+    def __init__(self, bank_name, pages, expected):
+        self.bank_name = bank_name
+        self.pages = pages          # List of pages, each a list of text lines
+        self.expected = expected    # List of (date, amount, type) tuples
+
+    @property
+    def page_count(self):
+        return len(self.pages)
+
+    def to_pdf(self):
+        """Render the statement as PDF bytes"""
+        return build_pdf(self.pages)
+
+
+def _paginate(header, footer, rows, pages):
+    """
+    Fill exactly `pages` pages with row line groups, never splitting a group
+
+    Args:
+        rows: Iterator of (lines, expected transactions) for successive rows
+    """
+    page_lines = []
+    expected = []
+    page = list(header)
+    for lines, row_expected in rows:
+        if len(page) + len(lines) > ROWS_PER_PAGE + len(header):
+            page_lines.append(page + footer)
+            if len(page_lines) == pages:
+                break
+            page = list(header)
+        page.extend(lines)
+        expected.extend(row_expected)
+
+    return [[line.replace('{page}', str(number)).replace('{pages}', str(pages)) for line in page]
+            for number, page in enumerate(page_lines, 1)], expected
+
+
+def _days(rng):
+    """Statement dates - several rows share a day"""
+    day = date(2024, 1, 1)
+    while True:
+        day += timedelta(days=rng.randint(0, 1))
+        yield day
+
+
+def _capitec_rows(rng):
+    balance = 5000.0
+    for day in _days(rng):
+        stamp = day.strftime('%d/%m/%Y')
+        # Debit accounts stay in credit, so top up before the balance runs low
+        if balance < 1600 or rng.random() < 0.35:
+            description, category = rng.choice(CAPITEC_CREDITS)
+            amount = round(rng.uniform(10, 3000), 2)
+        else:
+            description, category = rng.choice(CAPITEC_DEBITS)
+            amount = -round(rng.uniform(5, 1500), 2)
+        fee = rng.choice([1.0, 2.0, 3.5]) if amount < 0 and rng.random() < 0.3 else 0.0
+        balance = round(balance + amount - fee, 2)
+
+        columns = [format_amount(amount)]
+        if fee:
+            columns.append(format_amount(-fee))
+        columns.append(format_amount(balance))
+
+        if rng.random() < 0.15:
+            # Amounts wrapped onto the next line
+            lines = [f"{stamp} {description} {category}", ' '.join(columns)]
+        else:
+            lines = [f"{stamp} {description} {category} {' '.join(columns)}"]
+
+        expected = [(day, abs(amount), 'credit' if amount > 0 else 'debit')]
+        if fee:
+            expected.append((day, fee, 'debit'))
+        yield lines, expected
+
+
+def _tymebank_rows(rng):
+    balance = 5000.0
+    for day in _days(rng):
+        if balance < 1600 or rng.random() < 0.35:
+            description = rng.choice(TYMEBANK_CREDITS)
+            amount = round(rng.uniform(10, 3000), 2)
+            money_out, money_in = '-', format_amount(amount)
+        else:
+            description = rng.choice(TYMEBANK_DEBITS)
+            amount = -round(rng.uniform(5, 1500), 2)
+            money_out, money_in = format_amount(-amount), '-'
+        balance = round(balance + amount, 2)
+
+        lines = [
+            f"{day.strftime('%d %b %Y')} {description}",
+            f"Ref {rng.choice(GENERIC_WORDS).title()}",
+            f"- {money_out} {money_in} {format_amount(balance)}",
+        ]
+        yield lines, [(day, abs(amount), 'credit' if amount > 0 else 'debit')]
+
+
+def _generic_rows(rng):
+    for day in _days(rng):
+        description = f"{rng.choice(GENERIC_WORDS)} {rng.choice(GENERIC_WORDS)}"
+        amount = round(rng.uniform(5, 1500), 2) * rng.choice([1, -1])
+        yield [f"{day.isoformat()} {description} {amount:.2f}"], \
+            [(day, abs(amount), 'credit' if amount > 0 else 'debit')]
+
+
+def capitec_statement(pages=10, seed=0):
+    """Capitec layout with single-line rows, fee rows and wrapped amounts"""
+    header = [
+        'Capitec Bank Limited capitecbank.co.za',
+        'Transaction History',
+        'Date Description Category Money In Money Out Fee*Balance',
+    ]
+    footer = ['* Includes VAT at 15%', 'Page {page} of {pages}']
+    page_lines, expected = _paginate(header, footer, _capitec_rows(random.Random(seed)), pages)
+    return SyntheticStatement('capitec', page_lines, expected)
+
+
+def tymebank_statement(pages=10, seed=0):
+    """TymeBank layout with wrapped descriptions and four amount columns"""
+    header = [
+        'TymeBank Limited www.tymebank.co.za',
+        'Date Description Fees Money Out Money In Balance',
+    ]
+    footer = ['Page {page} of {pages}']
+    page_lines, expected = _paginate(header, footer, _tymebank_rows(random.Random(seed)), pages)
+    return SyntheticStatement('tymebank', page_lines, expected)
+
+
+def generic_statement(pages=10, seed=0):
+    """Unknown bank with one ISO-dated row per line"""
+    header = ['Account statement', 'Date Description Amount']
+    footer = ['Page {page} of {pages}']
+    page_lines, expected = _paginate(header, footer, _generic_rows(random.Random(seed)), pages)
+    return SyntheticStatement('other', page_lines, expected)
+
+
+GENERATORS = {
+    'capitec': capitec_statement,
+    'tymebank': tymebank_statement,
+    'other': generic_statement,
+}
+
+
+def generate(bank_name, pages=10, seed=0):
+    """Generate a synthetic statement for a bank"""
+    return GENERATORS[bank_name](pages=pages, seed=seed)
+
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def build_pdf(pages, font_size=8, leading=12):
+    """
+    Write a minimal PDF with one text line per statement line
+
+    Each line is drawn at its own baseline so text extraction returns the
+    lines in order, separated by newlines.
+    """
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        None,  # Pages tree, filled in once page object numbers are known
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+    ]
+    page_refs = []
+    for lines in pages:
+        shown = ' T*\n'.join(f'({_escape(line)}) Tj' for line in lines)
+        stream = f'BT /F1 {font_size} Tf {leading} TL 30 800 Td\n{shown}\nET'.encode('latin-1')
+
+        objects.append(b'<< /Length %d >>\nstream\n' % len(stream) + stream + b'\nendstream')
+        content_ref = len(objects)
+        objects.append(
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] '
+            b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % content_ref
+        )
+        page_refs.append(len(objects))
+
+    kids = ' '.join(f'{ref} 0 R' for ref in page_refs)
+    objects[1] = f'<< /Type /Pages /Kids [{kids}] /Count {len(page_refs)} >>'.encode()
+
+    output = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+
+    xref_offset = len(output)
+    output += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for offset in offsets:
+        output += b'%010d 00000 n \n' % offset
+    output += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref_offset)
+    return bytes(output)
@@ -13,7 +13,7 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 
 from lsuite import create_app
 from lsuite.extensions import db
-from lsuite.models import User, TransactionCategory
+from lsuite.models import User, TransactionCategory, GoogleCredential
 
 
 @pytest.fixture(scope='function')
@@ -87,6 +87,18 @@ def auth_client(client, app, user):
         client.get('/auth/logout', follow_redirects=True)
 
 
+@pytest.fixture(scope='function')
+def credential(app, user):
+    """Authenticated Gmail credential for the test user"""
+    cred = GoogleCredential(
+        user_id=user.id, name='Test Gmail', client_id='client', client_secret='secret',
+        access_token='token', refresh_token='refresh', is_authenticated=True
+    )
+    db.session.add(cred)
+    db.session.commit()
+    return cred
+
+
 @pytest.fixture(scope='function')
 def sample_categories(app):
     """Create sample transaction categories for testing"""
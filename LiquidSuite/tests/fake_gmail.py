@@ -0,0 +1,190 @@
+"""
+Fake Gmail Discovery Service
+Stands in for googleapiclient's gmail v1 resource in tests
+"""
+import base64
+import httplib2
+from googleapiclient.errors import HttpError
+
+
+def make_message(message_id, subject='Your bank statement', sender='statements@capitecbank.co.za',
+                 date='Mon, 07 Oct 2024 08:00:00 +0200', body='Statement attached', pdf=True,
+                 internal_date=None):
+    """
+    Full-format Gmail message with a text body and optionally PDF attachments
+
+    pdf is True for one attachment ('att-<id>') or the number to add; later
+    ones get IDs 'att-<id>-2', 'att-<id>-3', ...
+    """
+    parts = [{
+        'partId': '0',
+        'mimeType': 'text/plain',
+        'filename': '',
+        'body': {'data': base64.urlsafe_b64encode(body.encode()).decode()},
+    }]
+    for number in range(1, int(pdf) + 1):
+        parts.append({
+            'partId': str(number),
+            'mimeType': 'application/pdf',
+            'filename': 'statement.pdf' if number == 1 else f'statement-{number}.pdf',
+            'body': {'attachmentId': f'att-{message_id}' if number == 1 else f'att-{message_id}-{number}',
+                     'size': 1024},
+        })
+    return {
+        'id': message_id,
+        'threadId': f'thread-{message_id}',
+        'internalDate': str(internal_date or 1728280800000),
+        'payload': {
+            'headers': [
+                {'name': 'Subject', 'value': subject},
+                {'name': 'From', 'value': sender},
+                {'name': 'Date', 'value': date},
+            ],
+            'parts': parts,
+        },
+    }
+
+
+class FakeRequest:
+    """An API call that runs when executed, like googleapiclient's HttpRequest"""
+
+    def __init__(self, gmail, method, run):
+        self.gmail = gmail
+        self.method = method
+        self._run = run
+
+    def execute(self):
+        self.gmail.calls.append(self.method)
+        if self.gmail.on_call:
+            self.gmail.on_call()
+        return self._run()
+
+
+class FakeBatch:
+    """Batch HTTP request - runs every added request in one execute()"""
+
+    def __init__(self, gmail, callback):
+        self.gmail = gmail
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id=None):
+        if len(self.requests) >= 1000:
+            raise ValueError('Exceeded maximum number of requests in a batch')
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        self.gmail.batch_sizes.append(len(self.requests))
+        for request_id, request in self.requests:
+            try:
+                response, exception = request._run(), None
+            except Exception as e:
+                response, exception = None, e
+            self.callback(request_id, response, exception)
+
+
+class FakeGmail:
+    """
+    In-memory Gmail mailbox
+
+    Args:
+        messages: Full-format messages (see make_message)
+        searches: Query string -> message IDs it returns
+        failing: Message IDs whose fetch raises an error
+        history_id: Current historyId of the mailbox
+        on_call: Called before every directly executed request
+        attachments: Attachment ID -> file content
+    """
+
+    def __init__(self, messages, searches, failing=(), history_id=100, on_call=None, attachments=None):
+        self.mailbox = {message['id']: message for message in messages}
+        self.attachment_data = attachments or {}
+        self.searches = searches
+        self.failing = set(failing)
+        self.history_id = history_id
+        self.history_records = []
+        self.oldest_history_id = 0
+        self.on_call = on_call
+        self.calls = []
+        self.batch_sizes = []
+
+    def deliver(self, message, queries=()):
+        """Add a message to the mailbox and to the given searches' results"""
+        self.mailbox[message['id']] = message
+        for query in queries:
+            self.searches.setdefault(query, []).insert(0, message['id'])
+        self.history_id += 1
+        self.history_records.append({
+            'id': str(self.history_id),
+            'messagesAdded': [{'message': {'id': message['id']}}],
+        })
+
+    def expire_history(self):
+        """Drop all history so older watermarks get a 404"""
+        self.oldest_history_id = self.history_id + 1
+        self.history_records = []
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def history(self):
+        return self
+
+    def attachments(self):
+        return self
+
+    def getProfile(self, userId):
+        return FakeRequest(self, 'users.getProfile', lambda: {'historyId': str(self.history_id)})
+
+    def list(self, userId, q=None, maxResults=100, pageToken=None, startHistoryId=None, historyTypes=None):
+        if startHistoryId is not None:
+            return self._history_list(startHistoryId, maxResults, pageToken)
+        query, _, after = (q or '').partition(' after:')
+        ids = self.searches.get(query, [])
+        if after:
+            ids = [i for i in ids if int(self.mailbox[i]['internalDate']) // 1000 > int(after)]
+        return FakeRequest(self, 'messages.list', lambda: self._page(ids, maxResults, pageToken, 'messages',
+                                                                     lambda i: {'id': i}))
+
+    def _history_list(self, start_history_id, max_results, page_token):
+        def run():
+            if int(start_history_id) < self.oldest_history_id:
+                raise HttpError(httplib2.Response({'status': 404}), b'Requested entity was not found.')
+            records = [r for r in self.history_records if int(r['id']) > int(start_history_id)]
+            response = self._page(records, max_results, page_token, 'history', lambda r: r)
+            response['historyId'] = str(self.history_id)
+            return response
+        return FakeRequest(self, 'history.list', run)
+
+    @staticmethod
+    def _page(items, size, page_token, key, render):
+        start = int(page_token or 0)
+        page = items[start:start + size]
+        response = {key: [render(item) for item in page]} if page else {}
+        if start + size < len(items):
+            response['nextPageToken'] = str(start + size)
+        return response
+
+    def get(self, userId, id, format='full', messageId=None):
+        if messageId is not None:
+            return self._get_attachment(messageId, id)
+
+        def run():
+            if id in self.failing or id not in self.mailbox:
+                raise RuntimeError(f'Message {id} not found')
+            return self.mailbox[id]
+        return FakeRequest(self, 'messages.get', run)
+
+    def _get_attachment(self, message_id, attachment_id):
+        def run():
+            if message_id in self.failing or attachment_id not in self.attachment_data:
+                raise RuntimeError(f'Attachment {attachment_id} not found')
+            data = self.attachment_data[attachment_id]
+            return {'size': len(data), 'data': base64.urlsafe_b64encode(data).decode()}
+        return FakeRequest(self, 'messages.attachments.get', run)
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self, callback)
@@ -0,0 +1,88 @@
+"""
+Test Batch Statement Parsing CLI
+"""
+import os
+import json
+import shutil
+import pytest
+from lsuite.models import BankTransaction, EmailStatement
+from lsuite.utils.blob_store import get_blob_store
+
+
+SAMPLE_PDF = os.path.join(os.path.dirname(__file__), '..', 'data', 'account_statement.pdf')
+
+
+@pytest.fixture
+def statement_dir(tmp_path):
+    """Directory holding a copy of the sample statement"""
+    if not os.path.exists(SAMPLE_PDF):
+        pytest.skip('Sample statement PDF not available')
+    shutil.copy(SAMPLE_PDF, tmp_path / 'statement.pdf')
+    return tmp_path
+
+
+def test_parse_batch_writes_ndjson(runner, statement_dir):
+    """Test every transaction is written as one JSON line tagged with its file"""
+    result = runner.invoke(args=['parse-batch', str(statement_dir), '--workers', '1'])
+
+    assert result.exit_code == 0
+    records = [json.loads(line) for line in result.stdout.splitlines() if line.startswith('{')]
+    assert records
+    assert all(r['source_file'] == 'statement.pdf' for r in records)
+    assert all(r['bank'] == 'capitec' for r in records)
+    assert {'date', 'description', 'amount', 'type'} <= set(records[0])
+
+
+def test_parse_batch_reports_failures(runner, statement_dir):
+    """Test unreadable PDFs are reported and fail the command"""
+    (statement_dir / 'broken.pdf').write_bytes(b'not a pdf')
+
+    result = runner.invoke(args=['parse-batch', str(statement_dir), '--workers', '2'])
+
+    assert result.exit_code == 1
+    assert 'broken.pdf' in result.stderr
+    assert any('"statement.pdf"' in line for line in result.stdout.splitlines())
+
+
+def test_parse_batch_load_is_idempotent(runner, user, statement_dir):
+    """Test --load inserts transactions once per PDF"""
+    args = ['parse-batch', str(statement_dir), '--workers', '1', '--load', '--user-id', str(user.id)]
+
+    first = runner.invoke(args=args)
+    assert first.exit_code == 0
+    count = BankTransaction.query.filter_by(user_id=user.id).count()
+    statement = EmailStatement.query.filter_by(user_id=user.id).one()
+    assert count == statement.transaction_count > 0
+
+    second = runner.invoke(args=args)
+    assert second.exit_code == 0
+    assert 'already loaded' in second.stderr
+    assert BankTransaction.query.filter_by(user_id=user.id).count() == count
+
+
+def test_parse_batch_load_stores_pdf(app, runner, user, statement_dir):
+    """Test a loaded statement keeps its PDF in the blob store for re-parsing"""
+    args = ['parse-batch', str(statement_dir), '--workers', '1', '--load', '--user-id', str(user.id)]
+    assert runner.invoke(args=args).exit_code == 0
+
+    statement = EmailStatement.query.filter_by(user_id=user.id).one()
+    [attachment] = statement.attachments
+    assert attachment['filename'] == 'statement.pdf'
+    assert attachment['size'] == os.path.getsize(SAMPLE_PDF)
+    assert get_blob_store(app).get(attachment['sha256']) == (statement_dir / 'statement.pdf').read_bytes()
+
+
+def test_parse_batch_load_counts_inserted_rows(runner, user, statement_dir):
+    """Test a copy of an already loaded statement records only the rows it added"""
+    args = ['parse-batch', str(statement_dir), '--workers', '1', '--load', '--user-id', str(user.id)]
+    assert runner.invoke(args=args).exit_code == 0
+    count = BankTransaction.query.filter_by(user_id=user.id).count()
+
+    # Same statement lines in a file with a different digest
+    copy = statement_dir / 'statement.pdf'
+    copy.write_bytes(copy.read_bytes() + b'\n')
+    assert runner.invoke(args=args).exit_code == 0
+
+    statements = EmailStatement.query.filter_by(user_id=user.id).order_by(EmailStatement.id).all()
+    assert [s.transaction_count for s in statements] == [count, 0]
+    assert BankTransaction.query.filter_by(user_id=user.id).count() == count
@@ -0,0 +1,99 @@
+"""
+Test Content-Addressed Blob Store
+"""
+import mmap
+import pytest
+from lsuite.extensions import db
+from lsuite.models import EmailStatement, UploadedDocument
+from lsuite.utils.blob_store import BlobStore, LocalBlobBackend, get_blob_store
+
+
+PDF_BYTES = b'%PDF-1.4 statement ' + bytes(range(256)) * 8
+
+
+@pytest.fixture
+def store(app, tmp_path):
+    """App blob store in a temporary directory"""
+    app.config['BLOB_STORE_DIR'] = str(tmp_path / 'blobs')
+    return get_blob_store(app)
+
+
+def test_put_stores_identical_bytes_once(tmp_path):
+    """Test blobs are keyed on their SHA-256 and written once"""
+    store = BlobStore(LocalBlobBackend(str(tmp_path)))
+
+    first = store.put(PDF_BYTES)
+    second = store.put(bytearray(PDF_BYTES))
+
+    assert first == second == BlobStore.digest_for(PDF_BYTES)
+    assert store.get(first) == PDF_BYTES
+    assert store.size(first) == len(PDF_BYTES)
+    assert len([p for p in tmp_path.rglob('*') if p.is_file()]) == 1
+    assert store.get('0' * 64) is None
+    assert not store.exists(None)
+
+
+def test_put_accepts_memory_map(tmp_path):
+    """Test memory-mapped uploads are stored without copying to bytes first"""
+    source = tmp_path / 'upload.pdf'
+    source.write_bytes(PDF_BYTES)
+    store = BlobStore(LocalBlobBackend(str(tmp_path / 'blobs')))
+
+    with open(source, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        digest = store.put(data)
+
+    assert store.get(digest) == PDF_BYTES
+
+
+def test_statement_pdf_supports_ranges(app, auth_client, user, store):
+    """Test statement PDFs stream from the store and honour Range requests"""
+    digest = store.put(PDF_BYTES)
+    statement = EmailStatement(user_id=user.id, gmail_id='m1', has_pdf=True, attachments=[
+        {'attachment_id': 'att-m1', 'filename': 'statement.pdf', 'size': len(PDF_BYTES),
+         'part_id': '1', 'sha256': digest}
+    ])
+    db.session.add(statement)
+    db.session.commit()
+
+    full = auth_client.get(f'/gmail/statements/{statement.id}/pdf')
+    partial = auth_client.get(f'/gmail/statements/{statement.id}/pdf', headers={'Range': 'bytes=0-7'})
+
+    assert full.status_code == 200
+    assert full.data == PDF_BYTES
+    assert full.headers['Accept-Ranges'] == 'bytes'
+    assert partial.status_code == 206
+    assert partial.data == PDF_BYTES[:8]
+    full.close()
+    partial.close()
+
+
+def test_statement_detail_links_stored_attachments(app, auth_client, user, store):
+    """Test download links carry each attachment's own index when some are not stored"""
+    statement = EmailStatement(user_id=user.id, gmail_id='m1', has_pdf=True, attachments=[
+        {'attachment_id': 'att-1', 'filename': 'first.pdf', 'size': 10, 'part_id': '1', 'sha256': None},
+        {'attachment_id': 'att-2', 'filename': 'second.pdf', 'size': len(PDF_BYTES), 'part_id': '2',
+         'sha256': store.put(PDF_BYTES)},
+    ])
+    db.session.add(statement)
+    db.session.commit()
+
+    page = auth_client.get(f'/gmail/statements/{statement.id}').get_data(as_text=True)
+
+    assert f'/gmail/statements/{statement.id}/pdf/1"' in page
+    assert f'/gmail/statements/{statement.id}/pdf"' not in page
+
+
+def test_migrate_blobs_moves_inline_documents(app, runner, user, store):
+    """Test flask migrate-blobs empties file_data and keeps the PDF downloadable"""
+    document = UploadedDocument(user_id=user.id, filename='invoice.pdf', document_type='invoice',
+                                file_size=len(PDF_BYTES), file_data=PDF_BYTES)
+    db.session.add(document)
+    db.session.commit()
+
+    result = runner.invoke(args=['migrate-blobs'])
+
+    assert result.exit_code == 0
+    db.session.expire_all()
+    document = db.session.get(UploadedDocument, document.id)
+    assert document.file_data is None
+    assert store.get(document.file_sha256) == PDF_BYTES
@@ -0,0 +1,233 @@
+"""
+Test Bulk Transaction Insert
+"""
+import io
+import os
+import pytest
+from datetime import date, timedelta
+from decimal import Decimal
+from lsuite.extensions import db
+from lsuite.models import BankTransaction, EmailStatement
+from lsuite.utils.bulk_insert import BankTransactionWriter, _copy_value
+
+SAMPLE_PDF = os.path.join(os.path.dirname(__file__), '..', 'data', 'account_statement.pdf')
+
+
+def test_writer_fills_model_defaults(app, user):
+    """Test rows left without optional columns get the model defaults"""
+    with BankTransactionWriter(batch_size=2, user_id=user.id) as writer:
+        count = writer.write({
+            'date': date(2025, 1, 1) + timedelta(days=i),
+            'description': f'Payment {i}',
+            'withdrawal': Decimal('10.50'),
+        } for i in range(5))
+    db.session.commit()
+
+    assert count == writer.rows == 5
+    transactions = BankTransaction.query.order_by(BankTransaction.date).all()
+    assert [t.description for t in transactions] == [f'Payment {i}' for i in range(5)]
+    assert transactions[0].currency == 'ZAR'
+    assert transactions[0].erpnext_synced is False
+    assert transactions[0].created_at is not None
+    assert transactions[0].withdrawal == Decimal('10.50')
+
+
+def test_writer_discards_rows_on_error(app, user):
+    """Test buffered rows are not written when the import fails"""
+    try:
+        with BankTransactionWriter(user_id=user.id) as writer:
+            writer.add(date=date(2025, 1, 1), description='Half an import')
+            raise ValueError('parse failed')
+    except ValueError:
+        pass
+    db.session.commit()
+
+    assert BankTransaction.query.count() == 0
+
+
+def test_copy_value_escapes_text_format():
+    """Test values are written in PostgreSQL COPY text format"""
+    assert _copy_value(None) == '\\N'
+    assert _copy_value(True) == 't'
+    assert _copy_value(Decimal('1.20')) == '1.20'
+    assert _copy_value(date(2025, 9, 23)) == '2025-09-23'
+    assert _copy_value('a\tb\\c\nd') == 'a\\tb\\\\c\\nd'
+
+
+def test_upload_csv_imports_large_history(app, auth_client, user):
+    """Test a 20k row CSV streams into bank_transactions"""
+    lines = ['Transaction Date,Posting Date,Description,Debits,Credits,Balance,Bank account']
+    start = date(2020, 1, 1)
+    for i in range(20000):
+        day = (start + timedelta(days=i % 1500)).strftime('%Y/%m/%d')
+        lines.append(f'{day},{day},Card purchase {i},{i % 100}.25,,1000.00,5443 - Savings')
+    csv_bytes = '\n'.join(lines).encode()
+
+    response = auth_client.post('/gmail/upload-csv', data={
+        'csv_file': (io.BytesIO(csv_bytes), 'history.csv'),
+        'create_statement': 'on',
+    }, content_type='multipart/form-data')
+
+    assert response.status_code == 302
+    statement = EmailStatement.query.one()
+    assert BankTransaction.query.filter_by(statement_id=statement.id, user_id=user.id).count() == 20000
+
+
+def _csv(rows):
+    lines = ['Transaction Date,Posting Date,Description,Debits,Credits,Balance,Bank account']
+    lines += [f'{day},{day},{description},{debit},,{balance},5443 - Savings' for day, description, debit, balance in rows]
+    return '\n'.join(lines).encode()
+
+
+def test_overlapping_csv_upload_only_adds_new_lines(app, auth_client, user):
+    """Test re-uploading an overlapping export skips lines already imported"""
+    first = [('2025/01/01', 'Coffee', '30.00', '970.00'), ('2025/01/02', 'Coffee', '30.00', '940.00')]
+    second = first[1:] + [('2025/01/03', 'Rent', '500.00', '440.00')]
+
+    for rows in (first, second):
+        auth_client.post('/gmail/upload-csv', data={
+            'csv_file': (io.BytesIO(_csv(rows)), 'export.csv'),
+        }, content_type='multipart/form-data')
+
+    descriptions = [t.description for t in BankTransaction.query.order_by(BankTransaction.date)]
+    assert descriptions == ['Coffee', 'Coffee', 'Rent']
+
+
+def test_identical_lines_within_one_import_are_kept(app, user):
+    """Test repeated identical lines in one statement get distinct fingerprints"""
+    row = {'date': date(2025, 1, 1), 'description': 'Bank fee', 'withdrawal': Decimal('5.00')}
+
+    with BankTransactionWriter(user_id=user.id) as writer:
+        writer.write([row, row])
+    with BankTransactionWriter(user_id=user.id) as again:
+        again.write([row, row])
+    db.session.commit()
+
+    assert (writer.rows, again.rows, again.skipped) == (2, 0, 2)
+    assert BankTransaction.query.count() == 2
+
+
+def test_fingerprint_backfill_skips_lines_imported_again(app, user):
+    """Test flask fingerprint-transactions leaves a clash with a newer import unset"""
+    from lsuite.utils.db_checker import fingerprint_transactions
+    legacy = BankTransaction(user_id=user.id, date=date(2025, 1, 1), description='Salary',
+                             deposit=Decimal('1000.00'), withdrawal=Decimal('0'))
+    other = BankTransaction(user_id=user.id, date=date(2025, 1, 2), description='Rent',
+                            withdrawal=Decimal('500.00'))
+    db.session.add_all([legacy, other])
+    db.session.commit()
+    with BankTransactionWriter(user_id=user.id) as writer:
+        writer.add(date=date(2025, 1, 1), description='  salary ', deposit=Decimal('1000.00'))
+    db.session.commit()
+
+    assert fingerprint_transactions() == (1, 1)
+    assert legacy.fingerprint is None
+    assert other.fingerprint is not None
+
+
+def test_reparse_applies_minimal_diff(app, user):
+    """Test re-parsing keeps matched rows and their category and sync state"""
+    statement = EmailStatement(user_id=user.id, gmail_id='m1', has_pdf=True)
+    db.session.add(statement)
+    db.session.commit()
+    lines = [
+        {'date': date(2025, 1, 1), 'description': 'Salary', 'deposit': Decimal('1000.00'), 'reference_number': 'A'},
+        {'date': date(2025, 1, 2), 'description': 'Rent', 'withdrawal': Decimal('500.00'), 'reference_number': 'B'},
+        {'date': date(2025, 1, 3), 'description': 'Misread line', 'withdrawal': Decimal('1.00')},
+    ]
+    with BankTransactionWriter(user_id=user.id, statement_id=statement.id) as writer:
+        writer.write(lines)
+    db.session.commit()
+    salary = BankTransaction.query.filter_by(description='Salary').one()
+    salary.erpnext_synced = True
+    salary.erpnext_journal_entry = 'JV-0001'
+    db.session.commit()
+    salary_id = salary.id
+
+    upgraded = [
+        dict(lines[0]),
+        dict(lines[1], reference_number='B2'),
+        {'date': date(2025, 1, 4), 'description': 'Groceries', 'withdrawal': Decimal('80.00')},
+    ]
+    with BankTransactionWriter(reparse=True, user_id=user.id, statement_id=statement.id) as writer:
+        writer.write(upgraded)
+    db.session.commit()
+    db.session.expire_all()
+
+    assert (writer.rows, writer.updated, writer.unchanged, writer.deleted) == (1, 1, 1, 1)
+    assert writer.statement_rows == 3
+    salary = db.session.get(BankTransaction, salary_id)
+    assert salary.erpnext_synced is True
+    assert salary.erpnext_journal_entry == 'JV-0001'
+    assert BankTransaction.query.filter_by(description='Rent').one().reference_number == 'B2'
+    assert {t.description for t in statement.transactions} == {'Salary', 'Rent', 'Groceries'}
+
+
+def test_reparse_matches_rows_without_fingerprint(app, user):
+    """Test rows imported before fingerprints existed are matched and fingerprinted"""
+    statement = EmailStatement(user_id=user.id, gmail_id='m1', has_pdf=True)
+    db.session.add(statement)
+    db.session.flush()
+    legacy = BankTransaction(user_id=user.id, statement_id=statement.id, date=date(2025, 1, 1),
+                             description='Salary', deposit=Decimal('1000.00'), withdrawal=Decimal('0'),
+                             notes='checked')
+    db.session.add(legacy)
+    db.session.commit()
+
+    with BankTransactionWriter(reparse=True, user_id=user.id, statement_id=statement.id) as writer:
+        writer.add(date=date(2025, 1, 1), description='Salary', deposit=Decimal('1000.00'))
+    db.session.commit()
+    db.session.expire_all()
+
+    assert (writer.rows, writer.updated, writer.deleted) == (0, 1, 0)
+    assert legacy.notes == 'checked'
+    assert legacy.fingerprint is not None
+
+
+def test_reparse_of_uploaded_pdf_keeps_categorisation(app, auth_client, user, sample_categories):
+    """Test re-parsing a PDF upload matches its rows instead of replacing them"""
+    if not os.path.exists(SAMPLE_PDF):
+        pytest.skip('Sample statement not available')
+    with open(SAMPLE_PDF, 'rb') as f:
+        pdf_bytes = f.read()
+    auth_client.post('/gmail/upload-pdf', data={
+        'pdf_file': (io.BytesIO(pdf_bytes), 'statement.pdf'),
+        'bank_name': 'capitec',
+        'statement_date': '2025-01-31',
+        'auto_parse': 'yes',
+    }, content_type='multipart/form-data')
+    statement = EmailStatement.query.one()
+    ids = {t.id for t in statement.transactions}
+    assert ids
+    first = statement.transactions.order_by(BankTransaction.id).first()
+    first.category_id = sample_categories[0].id
+    first.erpnext_synced = True
+    db.session.commit()
+    first_id = first.id
+
+    response = auth_client.post(f'/gmail/statements/{statement.id}/reparse')
+
+    assert response.status_code == 302
+    db.session.expire_all()
+    assert {t.id for t in statement.transactions} == ids
+    first = db.session.get(BankTransaction, first_id)
+    assert first.category_id == sample_categories[0].id
+    assert first.erpnext_synced is True
+
+
+def test_reparse_matches_rows_stored_without_balance(app, user):
+    """Test rows fingerprinted without account and balance are matched and filled in"""
+    statement = EmailStatement(user_id=user.id, gmail_id='m1', has_pdf=True)
+    db.session.add(statement)
+    db.session.commit()
+    line = {'date': date(2025, 1, 1), 'description': 'Rent', 'withdrawal': Decimal('500.00')}
+    with BankTransactionWriter(user_id=user.id, statement_id=statement.id) as writer:
+        writer.add(**line)
+    db.session.commit()
+
+    with BankTransactionWriter(reparse=True, user_id=user.id, statement_id=statement.id) as writer:
+        writer.add(**line, balance=Decimal('440.00'))
+    db.session.commit()
+
+    assert (writer.rows, writer.updated, writer.deleted) == (0, 1, 0)
+    assert BankTransaction.query.one().balance == Decimal('440.00')
@@ -0,0 +1,154 @@
+"""
+Test Daily Transaction Rollups
+"""
+import io
+from datetime import date, timedelta
+from decimal import Decimal
+from lsuite.extensions import db
+from lsuite.models import BankTransaction, EmailStatement, TransactionDailyRollup
+from lsuite.utils.bulk_insert import BankTransactionWriter
+from lsuite.utils.daily_rollup import (
+    rebuild_rollups, period_totals, category_totals, uncategorized_totals, monthly_totals
+)
+
+TODAY = date.today()
+
+
+def _snapshot(user_id):
+    """Non-empty rollup totals per key, duplicates summed"""
+    rollup = TransactionDailyRollup
+    rows = db.session.query(
+        rollup.bank_account_id, rollup.date, rollup.category_id,
+        db.func.sum(rollup.transaction_count),
+        db.func.sum(rollup.deposit_total),
+        db.func.sum(rollup.withdrawal_total)
+    ).filter(rollup.user_id == user_id).group_by(
+        rollup.bank_account_id, rollup.date, rollup.category_id
+    ).all()
+    return {
+        (account, day, category): (int(count), Decimal(str(deposit)), Decimal(str(withdrawal)))
+        for account, day, category, count, deposit, withdrawal in rows if count
+    }
+
+
+def _import(user, rows, **defaults):
+    with BankTransactionWriter(user_id=user.id, **defaults) as writer:
+        writer.write(rows)
+    db.session.commit()
+    return writer
+
+
+def test_writer_adds_inserted_rows(app, user):
+    """Test imported rows are counted once, also when imported again"""
+    rows = [
+        {'date': TODAY, 'description': 'Salary', 'deposit': Decimal('1000.00')},
+        {'date': TODAY, 'description': 'Coffee', 'withdrawal': Decimal('30.00')},
+        {'date': TODAY - timedelta(days=1), 'description': 'Rent', 'withdrawal': Decimal('500.00')},
+    ]
+    _import(user, rows)
+    _import(user, rows)
+
+    totals = period_totals(user.id, TODAY - timedelta(days=30))
+    assert totals == {'count': 3, 'income': 1000.0, 'expenses': 530.0}
+    assert uncategorized_totals(user.id, TODAY - timedelta(days=30)) == {'count': 3, 'total': 1530.0}
+
+
+def test_categorising_moves_totals(app, user, sample_categories):
+    """Test ORM changes to category and amounts move totals between rollup rows"""
+    food = sample_categories[1]
+    _import(user, [
+        {'date': TODAY, 'description': 'Lunch', 'withdrawal': Decimal('80.00')},
+        {'date': TODAY, 'description': 'Dinner', 'withdrawal': Decimal('120.00')},
+    ])
+    start = TODAY - timedelta(days=7)
+
+    for transaction in BankTransaction.query.all():
+        transaction.category_id = food.id
+    db.session.commit()
+    lunch = BankTransaction.query.filter_by(description='Lunch').one()
+    lunch.withdrawal = Decimal('90.00')
+    db.session.commit()
+
+    [row] = category_totals(user.id, start)
+    assert (row.name, int(row.count), float(row.expenses)) == ('Test Food', 2, 210.0)
+    assert uncategorized_totals(user.id, start)['count'] == 0
+
+    lunch.category_id = None
+    db.session.commit()
+    assert [int(r.count) for r in category_totals(user.id, start)] == [1]
+    assert uncategorized_totals(user.id, start) == {'count': 1, 'total': 90.0}
+
+
+def test_deletes_subtract(app, auth_client, user):
+    """Test deleting a transaction or a whole statement takes its rows out"""
+    statement = EmailStatement(user_id=user.id, gmail_id='m1', has_pdf=True)
+    db.session.add(statement)
+    db.session.commit()
+    _import(user, [
+        {'date': TODAY, 'description': 'Fuel', 'withdrawal': Decimal('600.00')},
+        {'date': TODAY, 'description': 'Toll', 'withdrawal': Decimal('40.00')},
+    ], statement_id=statement.id)
+    _import(user, [{'date': TODAY, 'description': 'Salary', 'deposit': Decimal('1000.00')}])
+
+    db.session.delete(BankTransaction.query.filter_by(description='Toll').one())
+    db.session.commit()
+    assert period_totals(user.id, TODAY)['expenses'] == 600.0
+
+    response = auth_client.post(f'/gmail/statements/{statement.id}/delete')
+    assert response.status_code == 302
+    assert period_totals(user.id, TODAY) == {'count': 1, 'income': 1000.0, 'expenses': 0.0}
+
+
+def test_reparse_keeps_rollups_current(app, user):
+    """Test a re-parse adds new lines and subtracts lines it deletes"""
+    statement = EmailStatement(user_id=user.id, gmail_id='m1', has_pdf=True)
+    db.session.add(statement)
+    db.session.commit()
+    _import(user, [
+        {'date': TODAY, 'description': 'Rent', 'withdrawal': Decimal('500.00')},
+        {'date': TODAY, 'description': 'Misread line', 'withdrawal': Decimal('1.00')},
+    ], statement_id=statement.id)
+    _import(user, [
+        {'date': TODAY, 'description': 'Rent', 'withdrawal': Decimal('500.00')},
+        {'date': TODAY, 'description': 'Groceries', 'withdrawal': Decimal('80.00')},
+    ], reparse=True, statement_id=statement.id)
+
+    assert period_totals(user.id, TODAY) == {'count': 2, 'income': 0.0, 'expenses': 580.0}
+
+
+def test_rebuild_matches_incremental(app, user, sample_categories):
+    """Test incremental maintenance ends where a full rebuild does"""
+    rows = [
+        {'date': TODAY - timedelta(days=i % 70), 'description': f'Payment {i}',
+         'withdrawal': Decimal(i % 9) + Decimal('0.25'), 'deposit': Decimal('0')}
+        for i in range(300)
+    ]
+    _import(user, rows, batch_size=64)
+    for transaction in BankTransaction.query.filter(BankTransaction.id % 3 == 0):
+        transaction.category_id = sample_categories[transaction.id % 2].id
+    for transaction in BankTransaction.query.filter(BankTransaction.id % 7 == 0):
+        db.session.delete(transaction)
+    db.session.commit()
+
+    incremental = _snapshot(user.id)
+    assert rebuild_rollups() > 0
+    assert _snapshot(user.id) == incremental
+    assert sum(count for count, _, _ in incremental.values()) == BankTransaction.query.count()
+    assert [int(m.count) for m in monthly_totals(user.id, TODAY - timedelta(days=365))]
+
+
+def test_dashboards_render_from_rollups(app, auth_client, user):
+    """Test the dashboards show totals from the rollups"""
+    lines = ['Transaction Date,Posting Date,Description,Debits,Credits,Balance,Bank account']
+    day = TODAY.strftime('%Y/%m/%d')
+    lines += [f'{day},{day},Card purchase {i},12.50,,1000.00,5443 - Savings' for i in range(4)]
+    auth_client.post('/gmail/upload-csv', data={
+        'csv_file': (io.BytesIO('\n'.join(lines).encode()), 'export.csv'),
+    }, content_type='multipart/form-data')
+
+    for path in ('/', '/insights/dashboard', '/insights/categories', '/ai-insights/dashboard'):
+        response = auth_client.get(path)
+        assert response.status_code == 200, path
+    assert b'Card purchase' in auth_client.get('/ai-insights/dashboard').data
+    data = auth_client.get('/insights/api/chart-data?type=monthly').get_json()
+    assert sum(data['expenses']) == 50.0
@@ -0,0 +1,369 @@
+"""
+Test Gmail Statement Import
+"""
+import os
+import time
+import threading
+import pytest
+from sqlalchemy import event
+from lsuite.extensions import db
+from lsuite.models import EmailStatement, GoogleCredential
+from lsuite.gmail.services import GmailService, STATEMENT_QUERIES, GMAIL_BATCH_SIZE, LIST_PAGE_SIZE
+from lsuite.gmail.rate_limit import TokenBucket, get_quota_bucket
+from lsuite.gmail.service_cache import ServiceCache
+from fake_gmail import FakeGmail, make_message
+
+
+TYME_QUERY, CAPITEC_QUERY, GENERIC_QUERY = STATEMENT_QUERIES
+SAMPLE_PDF = os.path.join(os.path.dirname(__file__), '..', 'data', 'account_statement.pdf')
+
+
+def use_fake(monkeypatch, gmail):
+    monkeypatch.setattr(GmailService, 'build_service', lambda self, credential, creds=None: gmail)
+
+
+def test_fetch_statements_dedupes_and_batches(app, credential, monkeypatch):
+    """Test IDs found by several searches are fetched once, in a batch"""
+    gmail = FakeGmail(
+        messages=[make_message('m1'), make_message('m2', sender='TymeBank <hello@tymebank.co.za>'),
+                  make_message('m3', pdf=False)],
+        searches={
+            CAPITEC_QUERY: ['m1', 'm3'],
+            TYME_QUERY: ['m2'],
+            GENERIC_QUERY: ['m1', 'm2', 'm3', 'm0'],
+        }
+    )
+    db.session.add(EmailStatement(user_id=credential.user_id, gmail_id='m0', subject='Old'))
+    db.session.commit()
+    use_fake(monkeypatch, gmail)
+
+    imported, skipped = GmailService(app).fetch_statements(credential)
+
+    assert (imported, skipped) == (3, 1)
+    assert gmail.batch_sizes == [len(STATEMENT_QUERIES), 3]
+    assert gmail.calls.count('messages.get') == 0
+    statements = {s.gmail_id: s for s in EmailStatement.query.all()}
+    assert statements['m1'].bank_name == 'capitec'
+    assert statements['m1'].has_pdf and not statements['m3'].has_pdf
+    assert statements['m1'].attachments == [
+        {'attachment_id': 'att-m1', 'filename': 'statement.pdf', 'size': 1024, 'part_id': '1'}
+    ]
+    assert statements['m3'].attachments == []
+    assert statements['m1'].thread_id == 'thread-m1'
+    assert statements['m1'].body_text == 'Statement attached'
+    assert statements['m2'].bank_name == 'tymebank'
+    assert statements['m2'].state == 'new'
+
+
+def test_fetch_statements_checks_existing_in_one_query(app, credential, monkeypatch):
+    """Test duplicate filtering is a single query however many messages match"""
+    ids = [f'm{i}' for i in range(30)]
+    gmail = FakeGmail(messages=[make_message(i) for i in ids], searches={GENERIC_QUERY: ids})
+    use_fake(monkeypatch, gmail)
+    selects = []
+
+    def count_selects(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and 'email_statements' in statement:
+            selects.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', count_selects)
+    try:
+        imported, skipped = GmailService(app).fetch_statements(credential)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', count_selects)
+
+    assert (imported, skipped) == (30, 0)
+    assert len(selects) == 1
+
+
+def test_get_messages_chunks_batches(app):
+    """Test batches never exceed the Gmail limit and failed fetches yield None"""
+    ids = [f'm{i}' for i in range(GMAIL_BATCH_SIZE * 2 + 50)]
+    gmail = FakeGmail(messages=[make_message(i) for i in ids], searches={}, failing=['m7'])
+
+    fetched = list(GmailService(app)._get_messages(gmail, ids))
+
+    assert gmail.batch_sizes == [GMAIL_BATCH_SIZE, GMAIL_BATCH_SIZE, 50]
+    assert [message_id for message_id, _ in fetched] == ids
+    assert dict(fetched)['m7'] is None
+    assert dict(fetched)['m8']['id'] == 'm8'
+
+
+def test_first_sync_scans_and_stores_watermark(app, credential, monkeypatch):
+    """Test the first import pages through every search and saves the historyId"""
+    ids = [f'm{i}' for i in range(LIST_PAGE_SIZE + 20)]
+    gmail = FakeGmail(messages=[make_message(i) for i in ids], searches={GENERIC_QUERY: ids}, history_id=500)
+    use_fake(monkeypatch, gmail)
+
+    imported, skipped = GmailService(app).fetch_statements(credential)
+
+    assert (imported, skipped) == (len(ids), 0)
+    # All searches share a batch per page; only the generic one has a second page
+    assert gmail.batch_sizes[:2] == [len(STATEMENT_QUERIES), 1]
+    assert 'messages.list' not in gmail.calls
+    assert 'history.list' not in gmail.calls
+    db.session.refresh(credential)
+    assert credential.history_id == '500'
+    assert credential.last_sync_date is not None
+
+
+def test_incremental_sync_without_new_mail_is_one_call(app, credential, monkeypatch):
+    """Test a sync with nothing new only asks the history API"""
+    gmail = FakeGmail(messages=[make_message('m1')], searches={CAPITEC_QUERY: ['m1']})
+    use_fake(monkeypatch, gmail)
+    service = GmailService(app)
+    service.fetch_statements(credential)
+    gmail.calls.clear()
+
+    imported, skipped = service.fetch_statements(credential)
+
+    assert (imported, skipped) == (0, 0)
+    assert gmail.calls == ['history.list']
+    assert gmail.batch_sizes == [len(STATEMENT_QUERIES), 1]
+
+
+def test_incremental_sync_imports_new_statements(app, credential, monkeypatch):
+    """Test only statements added since the watermark are listed and fetched"""
+    gmail = FakeGmail(messages=[make_message('m1')], searches={CAPITEC_QUERY: ['m1']})
+    use_fake(monkeypatch, gmail)
+    service = GmailService(app)
+    service.fetch_statements(credential)
+    now = int(time.time() * 1000)
+    gmail.deliver(make_message('m2', internal_date=now), queries=[CAPITEC_QUERY])
+    gmail.deliver(make_message('newsletter', subject='Weekly news', internal_date=now))
+
+    imported, skipped = service.fetch_statements(credential)
+
+    assert (imported, skipped) == (1, 0)
+    assert gmail.batch_sizes == [len(STATEMENT_QUERIES), 1] * 2
+    assert EmailStatement.query.filter_by(gmail_id='newsletter').count() == 0
+    db.session.refresh(credential)
+    assert credential.history_id == str(gmail.history_id)
+
+
+def test_expired_watermark_falls_back_to_full_scan(app, credential, monkeypatch):
+    """Test a 404 from the history API triggers a paginated full scan"""
+    gmail = FakeGmail(messages=[make_message('m1')], searches={CAPITEC_QUERY: ['m1']})
+    use_fake(monkeypatch, gmail)
+    service = GmailService(app)
+    service.fetch_statements(credential)
+    gmail.deliver(make_message('m2', internal_date=1), queries=[CAPITEC_QUERY])
+    gmail.expire_history()
+    gmail.calls.clear()
+
+    imported, skipped = service.fetch_statements(credential)
+
+    assert (imported, skipped) == (1, 1)
+    assert gmail.calls[:2] == ['history.list', 'users.getProfile']
+    db.session.refresh(credential)
+    assert credential.history_id == str(gmail.history_id)
+
+
+def test_failed_fetch_keeps_watermark(app, credential, monkeypatch):
+    """Test the watermark does not move past messages that could not be fetched"""
+    gmail = FakeGmail(messages=[make_message('m1')], searches={CAPITEC_QUERY: ['m1', 'm2']}, failing=['m2'])
+    use_fake(monkeypatch, gmail)
+
+    imported, skipped = GmailService(app).fetch_statements(credential)
+
+    assert (imported, skipped) == (1, 0)
+    db.session.refresh(credential)
+    assert credential.history_id is None
+
+
+def test_fetch_all_statements_runs_mailboxes_concurrently(app, user, monkeypatch):
+    """Test every credential is imported at the same time on its own session"""
+    credentials = []
+    for name in ('one', 'two', 'three'):
+        cred = GoogleCredential(user_id=user.id, name=name, client_id='c', client_secret='s',
+                                access_token='t', is_authenticated=True)
+        db.session.add(cred)
+        credentials.append(cred)
+    db.session.commit()
+    # Each mailbox blocks until all three have started - a serial import would time out
+    started = threading.Barrier(3, timeout=10)
+    mailboxes = {
+        name: FakeGmail(messages=[make_message(f'{name}-m1')], searches={CAPITEC_QUERY: [f'{name}-m1']},
+                        on_call=started.wait)
+        for name in ('one', 'two', 'three')
+    }
+    mailboxes['three'].failing.add('three-m1')
+    sessions = set()
+    original = GmailService.fetch_statements
+
+    def tracked(self, credential, full_scan=False):
+        sessions.add(id(db.session()))
+        return original(self, credential, full_scan)
+
+    monkeypatch.setattr(GmailService, 'build_service', lambda self, credential, creds=None: mailboxes[credential.name])
+    monkeypatch.setattr(GmailService, 'fetch_statements', tracked)
+
+    results = GmailService(app).fetch_all_statements([c.id for c in credentials], max_workers=3)
+
+    assert [r['name'] for r in results] == ['one', 'two', 'three']
+    assert [r['imported'] for r in results] == [1, 1, 0]
+    assert all(r['error'] is None for r in results)
+    assert len(sessions) == 3 and id(db.session()) not in sessions
+    assert EmailStatement.query.count() == 2
+
+
+def test_fetch_all_statements_reports_errors(app, credential, monkeypatch):
+    """Test a failing mailbox is reported without stopping the others"""
+    def broken(self, credential, creds=None):
+        raise RuntimeError('token revoked')
+    monkeypatch.setattr(GmailService, 'build_service', broken)
+
+    results = GmailService(app).fetch_all_statements([credential.id])
+
+    assert results[0]['error'] == 'token revoked'
+    assert results[0]['imported'] == 0
+
+
+def test_token_bucket_waits_off_debt():
+    """Test charges beyond the bucket sleep until the refill covers them"""
+    now = [0.0]
+    waits = []
+    bucket = TokenBucket(250, clock=lambda: now[0], sleep=waits.append)
+
+    assert bucket.acquire(200) == 0
+    assert bucket.acquire(100) == pytest.approx(0.2)
+    now[0] += 1.0
+    # Refilled to 200 of 250 - a 500 unit batch leaves 300 units of debt
+    assert bucket.acquire(500) == pytest.approx(1.2)
+    assert waits == [pytest.approx(0.2), pytest.approx(1.2)]
+
+
+def test_fetch_statements_charges_quota(app, credential, monkeypatch):
+    """Test each Gmail call is charged to the mailbox's bucket in quota units"""
+    ids = [f'm{i}' for i in range(3)]
+    gmail = FakeGmail(messages=[make_message(i) for i in ids], searches={CAPITEC_QUERY: ids})
+    use_fake(monkeypatch, gmail)
+    app.config['GMAIL_QUOTA_UNITS_PER_SECOND'] = 10 ** 6
+    bucket = get_quota_bucket(credential.id, 10 ** 6)
+    charges = []
+    monkeypatch.setattr(bucket, 'acquire', charges.append)
+
+    GmailService(app).fetch_statements(credential)
+
+    # getProfile, one round of searches, one batch of gets
+    assert charges == [1, 5 * len(STATEMENT_QUERIES), 5 * 3]
+    assert get_quota_bucket(credential.id, 0) is None
+
+
+def test_build_service_uses_bundled_discovery(app, credential, monkeypatch):
+    """Test building a client needs no discovery fetch over the network"""
+    import httplib2
+    def no_network(*args, **kwargs):
+        raise AssertionError('network request made')
+    monkeypatch.setattr(httplib2.Http, 'request', no_network)
+
+    service = GmailService(app).build_service(credential)
+
+    assert hasattr(service.users(), 'history')
+
+
+def test_gmail_service_reuses_client_and_saves_refresh(app, credential, monkeypatch):
+    """Test one client is built per credential and refreshed tokens are copied back"""
+    built = []
+
+    def build_service(self, credential, creds=None):
+        built.append(creds)
+        return FakeGmail(messages=[], searches={})
+
+    monkeypatch.setattr(GmailService, 'build_service', build_service)
+    service = GmailService(app)
+
+    with service.gmail_service(credential) as first:
+        built[0].token = 'refreshed'
+    with service.gmail_service(credential) as second:
+        pass
+
+    assert first is second
+    assert len(built) == 1
+    assert credential.access_token == 'refreshed'
+
+
+def test_service_cache_is_bounded_and_thread_safe():
+    """Test least recently used credentials are evicted and busy clients are not shared"""
+    class Cred:
+        def __init__(self, id):
+            self.id, self.refresh_token = id, 'r'
+
+    cache = ServiceCache(max_credentials=2)
+    make_credentials = lambda credential: object()
+    build = lambda credential, creds: object()
+    one, two, three = Cred(1), Cred(2), Cred(3)
+
+    with cache.checkout(one, make_credentials, build) as (outer, _):
+        with cache.checkout(one, make_credentials, build) as (inner, _):
+            assert inner is not outer
+    with cache.checkout(two, make_credentials, build):
+        pass
+    with cache.checkout(one, make_credentials, build):
+        pass
+    with cache.checkout(three, make_credentials, build):
+        pass
+
+    assert len(cache) == 2
+    assert cache.builds == 4
+    with cache.checkout(one, make_credentials, build):
+        pass
+    with cache.checkout(two, make_credentials, build):
+        pass
+    assert cache.builds == 5
+
+    one.refresh_token = 'reauthorised'
+    with cache.checkout(one, make_credentials, build):
+        pass
+    assert cache.builds == 6
+
+
+@pytest.fixture
+def sample_pdf():
+    if not os.path.exists(SAMPLE_PDF):
+        pytest.skip('Sample statement PDF not available')
+    with open(SAMPLE_PDF, 'rb') as f:
+        return f.read()
+
+
+def test_parse_downloads_recorded_attachments_directly(app, credential, monkeypatch, sample_pdf):
+    """Test every PDF of an email is fetched in one batch without re-reading the message"""
+    gmail = FakeGmail(messages=[make_message('m1', pdf=2)], searches={CAPITEC_QUERY: ['m1']},
+                      attachments={'att-m1': sample_pdf, 'att-m1-2': sample_pdf})
+    use_fake(monkeypatch, gmail)
+    service = GmailService(app)
+    service.fetch_statements(credential)
+    statement = EmailStatement.query.filter_by(gmail_id='m1').one()
+    assert [a['attachment_id'] for a in statement.attachments] == ['att-m1', 'att-m1-2']
+    gmail.calls.clear()
+    gmail.batch_sizes.clear()
+
+    count = service.download_and_parse_pdf(credential, statement)
+
+    assert gmail.calls == []
+    assert gmail.batch_sizes == [2]
+    assert count > 0 and count % 2 == 0
+    assert statement.transactions.count() == count
+
+    # Both PDFs are now in the blob store - parsing again needs no Gmail call
+    assert all(attachment['sha256'] for attachment in statement.attachments)
+    assert service.download_and_parse_pdf(credential, statement) == count
+    assert gmail.batch_sizes == [2]
+
+
+def test_parse_legacy_statement_records_attachments(app, credential, monkeypatch, sample_pdf):
+    """Test statements imported without attachment metadata read the message once"""
+    gmail = FakeGmail(messages=[make_message('m1')], searches={}, attachments={'att-m1': sample_pdf})
+    use_fake(monkeypatch, gmail)
+    statement = EmailStatement(user_id=credential.user_id, gmail_id='m1', bank_name='capitec', has_pdf=True)
+    db.session.add(statement)
+    db.session.commit()
+    service = GmailService(app)
+
+    service.download_and_parse_pdf(credential, statement)
+
+    assert gmail.calls == ['messages.get']
+    assert statement.attachments[0]['attachment_id'] == 'att-m1'
+    gmail.calls.clear()
+    service.download_and_parse_pdf(credential, statement)
+    assert gmail.calls == []
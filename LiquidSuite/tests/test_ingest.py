@@ -0,0 +1,154 @@
+"""
+Test Statement Ingest Pipeline
+"""
+import os
+import pytest
+from lsuite.extensions import db
+from lsuite.models import BankTransaction, EmailStatement
+from lsuite.gmail.parsers import PDFParser
+from lsuite.gmail.services import GmailService, STATEMENT_QUERIES
+from lsuite.gmail.ingest import IngestPipeline, STAGES
+from fake_gmail import FakeGmail, make_message
+
+
+SAMPLE_PDF = os.path.join(os.path.dirname(__file__), '..', 'data', 'account_statement.pdf')
+CAPITEC_QUERY = STATEMENT_QUERIES[1]
+
+
+@pytest.fixture
+def mailbox(monkeypatch):
+    """Mailbox with a parseable statement, one without a PDF and one whose download fails"""
+    if not os.path.exists(SAMPLE_PDF):
+        pytest.skip('Sample statement PDF not available')
+    with open(SAMPLE_PDF, 'rb') as f:
+        pdf_data = f.read()
+    gmail = FakeGmail(
+        messages=[make_message('m1'), make_message('m2', pdf=False), make_message('m3')],
+        searches={CAPITEC_QUERY: ['m1', 'm2', 'm3']},
+        attachments={'att-m1': pdf_data},
+        history_id=300
+    )
+    monkeypatch.setattr(GmailService, 'build_service', lambda self, credential, creds=None: gmail)
+    return gmail
+
+
+def test_pipeline_imports_and_parses(app, credential, mailbox):
+    """Test statements are stored with their transactions in one run"""
+    pipeline = IngestPipeline(app, [credential.id], parse_workers=1)
+
+    stats = pipeline.run()
+
+    statements = {s.gmail_id: s for s in EmailStatement.query.all()}
+    assert set(statements) == {'m1', 'm2', 'm3'}
+    assert statements['m1'].state == 'parsed'
+    assert statements['m1'].transaction_count == BankTransaction.query.filter_by(
+        statement_id=statements['m1'].id).count() > 0
+    assert statements['m2'].state == 'new'
+    assert statements['m3'].state == 'error'
+    assert 'download' in statements['m3'].error_message
+
+    assert [stats[name].items for name in STAGES] == [1, 3, 3, 3, 3]
+    assert stats['download'].errors == 1
+    assert all(stats[name].busy >= 0 for name in STAGES)
+    db.session.refresh(credential)
+    assert credential.history_id == '300'
+
+
+def test_pipeline_parses_in_process_pool(app, credential, mailbox):
+    """Test parsing through worker processes gives the same transactions"""
+    IngestPipeline(app, [credential.id], parse_workers=2).run()
+
+    statement = EmailStatement.query.filter_by(gmail_id='m1').one()
+    assert statement.state == 'parsed'
+    assert statement.transactions.count() == statement.transaction_count > 0
+
+
+def test_pipeline_keeps_watermark_after_fetch_failure(app, credential, mailbox):
+    """Test messages that could not be fetched are retried on the next run"""
+    mailbox.failing.add('m2')
+
+    stats = IngestPipeline(app, [credential.id], parse_workers=1).run()
+
+    assert stats['metadata'].errors == 1
+    assert EmailStatement.query.count() == 2
+    db.session.refresh(credential)
+    assert credential.history_id is None
+
+
+def test_ingest_command_reports_stage_counters(runner, credential, mailbox):
+    """Test flask ingest prints a line of counters per stage"""
+    result = runner.invoke(args=['ingest', '--workers', '1'])
+
+    assert result.exit_code == 0
+    lines = result.stderr.splitlines() + result.stdout.splitlines()
+    for name in STAGES:
+        assert any(line.startswith(name) for line in lines)
+    assert 'Imported 3 statements' in result.output
+
+
+def test_parsing_again_keeps_categorisation(app, credential, mailbox):
+    """Test a re-parse leaves unchanged transactions and their sync state alone"""
+    IngestPipeline(app, [credential.id], parse_workers=1).run()
+    statement = EmailStatement.query.filter_by(gmail_id='m1').one()
+    first = statement.transactions.order_by(BankTransaction.id).first()
+    first.erpnext_synced = True
+    db.session.commit()
+    ids = {t.id for t in statement.transactions}
+
+    count = GmailService(app).download_and_parse_pdf(credential, statement)
+
+    db.session.expire_all()
+    assert count == len(ids)
+    assert {t.id for t in statement.transactions} == ids
+    assert db.session.get(BankTransaction, first.id).erpnext_synced is True
+
+
+def test_pipeline_parses_with_saved_password(app, credential, mailbox, monkeypatch):
+    """Test new statements are parsed with the password saved for the same bank"""
+    import lsuite.gmail.ingest as ingest
+    db.session.add(EmailStatement(user_id=credential.user_id, gmail_id='old', bank_name='capitec',
+                                  pdf_password='8001015009087'))
+    db.session.commit()
+    passwords = []
+    parse = ingest.parse_statement
+
+    def recording_parse(pdfs, bank_name, password=None):
+        passwords.append(password)
+        return parse(pdfs, bank_name, password)
+    monkeypatch.setattr(ingest, 'parse_statement', recording_parse)
+
+    IngestPipeline(app, [credential.id], parse_workers=1).run()
+
+    statement = EmailStatement.query.filter_by(gmail_id='m1').one()
+    assert passwords == ['8001015009087']
+    assert statement.pdf_password is None
+
+    # Re-parsing looks the saved password up again
+    iter_transactions = PDFParser.iter_transactions
+
+    def recording_iter(self, pdf_data, bank_name, password=None):
+        passwords.append(password)
+        return iter_transactions(self, pdf_data, bank_name, password)
+    monkeypatch.setattr(PDFParser, 'iter_transactions', recording_iter)
+    GmailService(app).download_and_parse_pdf(credential, statement)
+    assert passwords == ['8001015009087'] * 2
+
+
+def test_reparse_command_skips_unstored_and_keeps_failed(app, runner, credential, mailbox):
+    """Test re-parsing skips uploads without a stored PDF and leaves failed statements parsed"""
+    IngestPipeline(app, [credential.id], parse_workers=1).run()
+    db.session.add_all([
+        EmailStatement(user_id=credential.user_id, gmail_id='PDF-20240101-000000', bank_name='capitec',
+                       has_pdf=True, state='parsed', transaction_count=5),
+        EmailStatement(user_id=credential.user_id, gmail_id='gone', bank_name='capitec',
+                       has_pdf=True, state='parsed', transaction_count=7),
+    ])
+    db.session.commit()
+
+    result = runner.invoke(args=['reparse-statements'])
+
+    assert 'Re-parsed 1 statements (1 failed, 1 skipped)' in result.output
+    statements = {s.gmail_id: s for s in EmailStatement.query.all()}
+    assert statements['m1'].state == 'parsed'
+    assert [(statements[gmail_id].state, statements[gmail_id].error_message)
+            for gmail_id in ('PDF-20240101-000000', 'gone')] == [('parsed', None), ('parsed', None)]
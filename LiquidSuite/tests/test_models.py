@@ -197,3 +197,51 @@ def test_google_credential_model(app, user):
         
         assert cred.is_authenticated
         assert cred.access_token == 'test_token'
+
+
+def test_email_statement_body_is_compressed_and_deferred(app, user):
+    """Test bodies are stored compressed and not loaded with the row"""
+    html = '<table><tr><td>Statement</td></tr></table>' * 200
+    statement = EmailStatement(user_id=user.id, gmail_id='body123', body_html=html, body_text='Hello')
+    db.session.add(statement)
+    db.session.commit()
+
+    stored = db.session.execute(
+        db.text("SELECT body_html_z FROM email_statements WHERE gmail_id = 'body123'")
+    ).scalar()
+    assert len(stored) < len(html) // 10
+
+    db.session.expunge_all()
+    statement = EmailStatement.query.filter_by(gmail_id='body123').one()
+    assert 'body_html' not in statement.__dict__
+    assert statement.body_html == html
+    assert statement.body_text == 'Hello'
+
+
+def test_compress_bodies_backfills_legacy_rows(app, runner, user):
+    """Test flask compress-bodies moves raw bodies into the compressed columns"""
+    db.session.add(EmailStatement(user_id=user.id, gmail_id='old1', body_text_legacy='Old text',
+                                  body_html_legacy='<p>Old</p>'))
+    db.session.commit()
+
+    result = runner.invoke(args=['compress-bodies'])
+
+    assert result.exit_code == 0
+    db.session.expunge_all()
+    statement = EmailStatement.query.filter_by(gmail_id='old1').one()
+    assert statement.body_text == 'Old text'
+    assert statement.body_html == '<p>Old</p>'
+    assert statement.body_text_legacy is None and statement.body_html_legacy is None
+
+
+def test_transaction_query_indexes_are_used(app, user):
+    """Test per-user date-window queries are planned on the composite indexes"""
+    from lsuite.models import TRANSACTION_QUERY_INDEXES
+    indexes = {index['name'] for index in db.inspect(db.engine).get_indexes('bank_transactions')}
+    assert set(TRANSACTION_QUERY_INDEXES) <= indexes
+
+    plan = db.session.execute(db.text(
+        "EXPLAIN QUERY PLAN SELECT count(*) FROM bank_transactions "
+        "WHERE user_id = :user_id AND category_id IS NULL AND date >= :start"
+    ), {'user_id': user.id, 'start': date(2025, 1, 1)}).fetchall()
+    assert 'ix_bank_transactions_user_category_date' in ' '.join(row[-1] for row in plan)
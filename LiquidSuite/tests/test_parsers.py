@@ -0,0 +1,361 @@
+"""
+Test Bank Statement Parsers
+"""
+import io
+import os
+import mmap
+import tempfile
+import pytest
+from datetime import date
+from lsuite.utils import pdf_text
+from lsuite.gmail.statement_lexer import (
+    AMOUNTS, BLANK, CONTINUATION, DATE_ROW, DATE_START, HEADER, split_amount_tail
+)
+from lsuite.gmail.parsers import (
+    PDFParser, CAPITEC_LEXER, GENERIC_PATTERNS, STATEMENT_FORMATS, CapitecMachine, TymeBankMachine
+)
+from lsuite.gmail.parsers_capitec import CapitecPDFParser
+from lsuite.gmail.keyword_matcher import KeywordClassifier, SuffixIndex
+from lsuite.gmail.parsed_transaction import ParsedTransaction, parse_cents
+from lsuite.gmail.balance_chain import order_by_balance
+
+
+SAMPLE_PDF = os.path.join(os.path.dirname(__file__), '..', 'data', 'account_statement.pdf')
+
+
+CAPITEC_TEXT = """Transaction History
+Date Description Category Money In Money Out Fee*Balance
+21/10/2024 Payment Received: 1070143456004 Vault M Other Income 58.00 73.54
+21/10/2024 Banking App External Payment: Tyme Savings -43.00 -2.00 28.54
+25/10/2024 Eft Debit Order Insufficient Funds: Clientele
+(70010174114)
+31/10/2024 Online Purchase: First World Trader Investments
+-6.71 165.19
+31/10/2024 Interest Received Interest 0.05 16.99
+* Includes VAT at 15%
+"""
+
+TYMEBANK_TEXT = """Date Description Fees Money Out Money In Balance
+01 Sep 2025 Salary deposit
+ACME Holdings
+- - 5,000.00 5,120.00
+02 Sep 2025 Card purchase Checkers
+1234567890123
+- 250.50 - 4,869.50
+"""
+
+
+def test_lexer_labels_each_line():
+    """Test that the Capitec lexer labels lines in one pass"""
+    kinds = [token.kind for token in CAPITEC_LEXER.tokenize(CAPITEC_TEXT.split('\n'))]
+
+    assert kinds == [
+        HEADER, HEADER, DATE_ROW, DATE_ROW, DATE_START, CONTINUATION,
+        DATE_START, AMOUNTS, DATE_ROW, HEADER, BLANK
+    ]
+
+
+def test_lexer_splits_amount_tail():
+    """Test that a dated row is split into description and amounts"""
+    token = CAPITEC_LEXER.classify(
+        '21/10/2024 Banking App External Payment: Tyme Savings -43.00 -2.00 28.54'
+    )
+
+    assert token.kind == DATE_ROW
+    assert token.date == '21/10/2024'
+    assert token.description == 'Banking App External Payment: Tyme Savings'
+    assert token.amounts == ('-43.00', '-2.00', '28.54')
+
+
+def test_split_amount_tail():
+    """Test right-to-left amount column extraction"""
+    assert split_amount_tail('Interest Received Interest 0.05 16.99') == \
+        ('Interest Received Interest', ('0.05', '16.99'))
+    assert split_amount_tail('Transfer 1.00 -1,234.56 -2.00 28.54') == \
+        ('Transfer 1.00', ('-1,234.56', '-2.00', '28.54'))
+    # Description keeps its own spacing when fewer columns are present
+    assert split_amount_tail('Card  5897)Investments  -6.71 165.19') == \
+        ('Card  5897)Investments', ('-6.71', '165.19'))
+    # At least one field is left as the description
+    assert split_amount_tail('1.00 2.00 3.00') == ('1.00', ('2.00', '3.00'))
+    assert split_amount_tail('Only one amount 5.00') is None
+    assert split_amount_tail('No amounts here') is None
+
+
+def test_split_amount_tail_long_description():
+    """Test that long wrapped descriptions do not slow the scan down"""
+    description = ' '.join(['1.00 word'] * 5000)
+
+    assert split_amount_tail(f'{description} Other Income') is None
+    assert split_amount_tail(f'{description} 58.00 73.54') == (description, ('58.00', '73.54'))
+
+
+def test_keyword_classifier_priority():
+    """Test that earlier keyword groups win wherever they appear"""
+    classifier = KeywordClassifier([('credit', ['received', 'refund']), ('debit', ['fee', 'purchase'])])
+
+    assert classifier.classify('Card Purchase Refund') == 'credit'
+    assert classifier.classify('Monthly FEE') == 'debit'
+    assert classifier.classify('Transfer') is None
+
+
+def test_suffix_index_matches_first_listed():
+    """Test category suffix lookup keeps list order for overlapping phrases"""
+    index = SuffixIndex(['Other Income', 'Income', 'Fees', 'Transfers'])
+
+    assert index.split('Salary Other Income') == ('Salary', 'Other Income')
+    assert index.split('Sweep Income') == ('Sweep', 'Income')
+    assert index.split('Admin Fees') == ('Admin', 'Fees')
+    assert index.split('Admin Fee') == ('Admin Fee', None)
+    assert index.split('ees') == ('ees', None)
+
+
+def test_parse_cents():
+    """Test amount strings convert to exact integer cents"""
+    assert parse_cents('1,234.56') == 123456
+    assert parse_cents('-7.05') == -705
+    assert parse_cents('3 465.00') == 346500
+    assert parse_cents('5') == 500
+    assert parse_cents('-') == 0
+    assert parse_cents('R12.00') == 0
+    assert parse_cents('12,345,678.00', limit=10_000_000 * 100) == 0
+
+
+def test_parsed_transaction_record():
+    """Test the slotted record's derived fields and dict-style access"""
+    trans = ParsedTransaction(
+        date(2024, 10, 3), 'Card purchase', 4310, 'debit', balance_cents=16519,
+        reference_format='CAP-{date:%Y%m%d}-{seq:04d}', sequence=7
+    )
+
+    assert not hasattr(trans, '__dict__')
+    assert trans.reference == 'CAP-20241003-0007'
+    assert trans.amount == 43.10 and trans['amount'] == 43.10
+    assert str(trans.withdrawal) == '43.10' and str(trans.deposit) == '0.00'
+    assert str(trans.balance_decimal) == '165.19'
+    assert trans.get('category') is None
+    assert trans.to_dict()['balance'] == 165.19
+    with pytest.raises(KeyError):
+        trans['amount_cents']
+
+
+def test_capitec_parser_rows():
+    """Test PDFParser Capitec parsing including fees and wrapped amounts"""
+    transactions = PDFParser()._parse_capitec_improved(CAPITEC_TEXT)
+
+    assert [t['description'] for t in transactions] == [
+        'Payment Received: 1070143456004 Vault M',
+        'Banking App External Payment: Tyme',
+        'Banking App External Payment: Tyme (Fee)',
+        'Online Purchase: First World Trader',
+        'Interest Received',
+    ]
+    assert transactions[0]['type'] == 'credit'
+    assert transactions[0]['category'] == 'Other Income'
+    assert transactions[1]['amount'] == 43.00
+    assert transactions[2]['amount'] == 2.00
+    assert transactions[3]['balance'] == 165.19
+    assert transactions[3]['date'] == date(2024, 10, 31)
+
+
+def test_tymebank_parser_rows():
+    """Test TymeBank multi-line descriptions and amount columns"""
+    transactions = PDFParser()._parse_tymebank(TYMEBANK_TEXT)
+
+    assert len(transactions) == 2
+    assert transactions[0]['description'] == 'Salary deposit ACME Holdings'
+    assert transactions[0]['type'] == 'credit'
+    assert transactions[0]['amount'] == 5000.00
+    assert transactions[1]['description'] == 'Card purchase Checkers'
+    assert transactions[1]['type'] == 'debit'
+    assert transactions[1]['balance'] == 4869.50
+
+
+def test_capitec_pdf_parser_rows():
+    """Test CapitecPDFParser on the same statement layout"""
+    transactions = CapitecPDFParser()._parse_capitec_transactions(CAPITEC_TEXT)
+
+    assert [(t['date'], t['amount'], t['type']) for t in transactions] == [
+        (date(2024, 10, 21), 58.00, 'credit'),
+        (date(2024, 10, 21), 43.00, 'debit'),
+        (date(2024, 10, 21), 2.00, 'debit'),
+        (date(2024, 10, 31), 6.71, 'debit'),
+        (date(2024, 10, 31), 0.05, 'credit'),
+    ]
+    assert transactions[3]['category'] == 'Investments'
+
+
+def test_stream_joins_rows_across_pages():
+    """Test that a row split over a page break is parsed like the joined text"""
+    lines = TYMEBANK_TEXT.split('\n')
+    pages = ['\n'.join(lines[:3]), '\n'.join(lines[3:-1])]
+
+    streamed = list(TymeBankMachine().stream(iter(pages)))
+
+    assert streamed == TymeBankMachine().run(lines)
+    assert streamed[0]['description'] == 'Salary deposit ACME Holdings'
+
+
+def test_stream_yields_before_input_ends():
+    """Test that transactions are handed over as each page completes"""
+    lines = CAPITEC_TEXT.split('\n')
+    machine = CapitecMachine()
+    stream = machine.stream(iter(['\n'.join(lines[:4]), '\n'.join(lines[4:-1])]))
+
+    first = next(stream)
+
+    assert first['description'] == 'Payment Received: 1070143456004 Vault M'
+    assert len(list(stream)) == 4
+    assert machine.emitted == 5
+
+
+def _row(day, description, cents, trans_type, balance, fee=0):
+    return ParsedTransaction(date(2024, 10, day), description, cents, trans_type,
+                             balance_cents=balance, fee_cents=fee)
+
+
+def test_balance_chain_orders_same_day_deposits():
+    """Test rows are ordered by balance chain even when a deposit raises the balance"""
+    rows = [
+        _row(2, 'Salary', 500000, 'credit', 505000),
+        _row(1, 'Opening deposit', 10000, 'credit', 10000),
+        _row(2, 'Card purchase', 4800, 'debit', 5000, fee=200),
+        _row(2, 'Card purchase (Fee)', 200, 'debit', 5000),
+    ]
+
+    ordered, gaps = order_by_balance(rows)
+
+    # Sorting lowest balance first would wrongly put the purchase after the salary
+    assert [t.description for t in ordered] == [
+        'Salary', 'Card purchase', 'Card purchase (Fee)', 'Opening deposit'
+    ]
+    assert gaps == []
+
+
+def test_balance_chain_reports_gaps():
+    """Test a missing row shows up as a gap of its amount"""
+    rows = [
+        _row(1, 'Deposit', 10000, 'credit', 10000),
+        _row(3, 'Purchase', 2500, 'debit', 5000),
+    ]
+
+    ordered, gaps = order_by_balance(rows)
+
+    assert [t.description for t in ordered] == ['Purchase', 'Deposit']
+    assert len(gaps) == 1
+    assert gaps[0].after is rows[0] and gaps[0].before is rows[1]
+    assert gaps[0].missing_cents == -2500
+
+
+def test_balance_chain_orders_rows_sharing_a_balance():
+    """Test zero-amount rows on one balance are chained by date"""
+    rows = [_row(day % 28 + 1, f'Fee reversal {day}', 0, 'credit', 10000) for day in range(2000)]
+
+    ordered, gaps = order_by_balance(rows)
+
+    assert [t.date for t in ordered] == sorted((t.date for t in rows), reverse=True)
+    assert gaps == []
+
+
+def test_iter_transactions_matches_parse_pdf():
+    """Test that streaming the sample PDF finds the same rows as parse_pdf"""
+    with open(SAMPLE_PDF, 'rb') as f:
+        pdf_data = f.read()
+    parser = PDFParser()
+
+    streamed = list(parser.iter_transactions(pdf_data, 'capitec'))
+
+    assert streamed
+    assert parser._sort_by_balance(streamed) == parser.parse_pdf(pdf_data, 'capitec')
+
+
+def test_registry_detects_bank_from_first_page():
+    """Test first-page fingerprinting with the bank name as fallback"""
+    assert STATEMENT_FORMATS.detect(CAPITEC_TEXT).bank_name == 'capitec'
+    assert STATEMENT_FORMATS.detect(TYMEBANK_TEXT).bank_name == 'tymebank'
+    assert STATEMENT_FORMATS.detect('Statement', 'tymebank').bank_name == 'tymebank'
+    assert STATEMENT_FORMATS.detect('Statement', 'unknown').bank_name == 'other'
+    assert STATEMENT_FORMATS.detect('Statement').machine_class is None
+
+
+def test_parse_pdf_detects_capitec_statement():
+    """Test that a Capitec PDF is parsed as Capitec whatever bank was selected"""
+    with open(SAMPLE_PDF, 'rb') as f:
+        pdf_data = f.read()
+    parser = PDFParser()
+
+    transactions = parser.parse_pdf(pdf_data, 'other')
+
+    assert parser.parser_version == 'capitec-v2'
+    assert transactions == PDFParser().parse_pdf(pdf_data, 'capitec')
+
+
+def test_generic_layout_from_first_page():
+    """Test that the layout seen on the first page is scanned first"""
+    parser = PDFParser()
+    text = "2024-10-21 Coffee shop 45.00\n2024-10-22 Grocery store -120.50\n"
+
+    patterns = parser._generic_patterns(text)
+    transactions = parser._parse_generic(text, patterns)
+
+    assert patterns[0] is GENERIC_PATTERNS[2]
+    assert [(t['description'], t['type']) for t in transactions] == [
+        ('Coffee shop', 'credit'), ('Grocery store', 'debit')
+    ]
+
+
+def test_generic_layouts_share_one_scan():
+    """Test an unrecognised statement returns the rows of the highest priority layout found"""
+    parser = PDFParser()
+    text = "Header\n2024-10-21 Coffee shop 45.00\n21/10/2024 Book store 99.00\n"
+
+    transactions = parser._parse_generic(text, parser._generic_patterns('Header'))
+
+    assert [t['description'] for t in transactions] == ['Book store']
+
+
+def test_resolve_workers():
+    """Test worker count resolution"""
+    assert pdf_text.resolve_workers(3) == 3
+    assert pdf_text.resolve_workers(0) == (os.cpu_count() or 1)
+    assert pdf_text.resolve_workers(None) == (os.cpu_count() or 1)
+
+
+def test_parallel_extraction_matches_sequential(monkeypatch):
+    """Test that the process pool returns the same text in page order"""
+    with open(SAMPLE_PDF, 'rb') as f:
+        pdf_data = f.read()
+    monkeypatch.setattr(pdf_text, 'MIN_PAGES_PER_WORKER', 1)
+
+    sequential = pdf_text.extract_text(pdf_data, workers=1)
+
+    assert sequential
+    assert pdf_text.extract_text(pdf_data, workers=3) == sequential
+
+
+def test_extract_from_mmap_and_buffers(tmp_path):
+    """Test that mapped files and buffers extract the same text as bytes"""
+    with open(SAMPLE_PDF, 'rb') as f:
+        pdf_data = f.read()
+    expected = pdf_text.extract_text(pdf_data)
+
+    with pdf_text.map_file(SAMPLE_PDF) as mapped:
+        assert isinstance(mapped, mmap.mmap)
+        assert pdf_text.extract_text(mapped) == expected
+    assert pdf_text.extract_text(memoryview(pdf_data)) == expected
+
+    with pdf_text.pdf_buffer(io.BytesIO(pdf_data)) as buffer:
+        assert buffer == pdf_data
+
+
+def test_pdf_buffer_maps_large_spooled_files(monkeypatch):
+    """Test that uploads already spooled to disk are mapped, not read"""
+    with open(SAMPLE_PDF, 'rb') as f:
+        pdf_data = f.read()
+    monkeypatch.setattr(pdf_text, 'MMAP_MIN_BYTES', 1)
+
+    with tempfile.TemporaryFile() as upload:
+        upload.write(pdf_data)
+        with pdf_text.pdf_buffer(upload) as buffer:
+            assert isinstance(buffer, mmap.mmap)
+            assert next(pdf_text.iter_pages(buffer)) == next(pdf_text.iter_pages(pdf_data))
@@ -0,0 +1,100 @@
+"""
+Test Extracted PDF Text Cache
+"""
+import os
+import zlib
+import pytest
+from lsuite.utils import pdf_text
+from lsuite.utils.text_cache import PageTextCache, get_text_cache
+
+
+SAMPLE_PDF = os.path.join(os.path.dirname(__file__), '..', 'data', 'account_statement.pdf')
+
+
+@pytest.fixture
+def cache(tmp_path):
+    """Empty page text cache in a temp directory"""
+    return PageTextCache(str(tmp_path / 'text_cache'), max_bytes=1024 * 1024)
+
+
+def test_cache_round_trip(cache):
+    """Test storing and loading page text"""
+    key = cache.key_for(b'%PDF-1.4 data')
+
+    assert cache.get(key) is None
+    cache.put(key, ['page one', 'page two'])
+    assert cache.get(key) == ['page one', 'page two']
+
+
+def test_cache_key_includes_password():
+    """Test that encrypted PDFs are keyed by bytes and password"""
+    data = b'%PDF-1.4 data'
+
+    assert PageTextCache.key_for(data) == PageTextCache.key_for(data)
+    assert PageTextCache.key_for(data) != PageTextCache.key_for(data, 'secret')
+    assert PageTextCache.key_for(data, 'secret') != PageTextCache.key_for(data, 'other')
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    """Test size-based eviction of the oldest entries"""
+    cache = PageTextCache(str(tmp_path), max_bytes=1024 * 1024)
+    pages = [os.urandom(500).hex()]
+
+    cache.put('first', pages)
+    cache.put('second', pages)
+    # Room for two entries but not three
+    cache.max_bytes = os.path.getsize(os.path.join(str(tmp_path), 'first.pages')) * 5 // 2
+    os.utime(os.path.join(str(tmp_path), 'first.pages'), (0, 0))
+    os.utime(os.path.join(str(tmp_path), 'second.pages'), (1, 1))
+    cache.get('first')
+    cache.put('third', pages)
+
+    assert cache.get('first') == pages
+    assert cache.get('second') is None
+    assert cache.get('third') == pages
+
+
+def test_iter_pages_uses_cache(cache):
+    """Test that a cache hit skips PDF extraction"""
+    with open(SAMPLE_PDF, 'rb') as f:
+        pdf_data = f.read()
+
+    extracted = pdf_text.extract_text(pdf_data, cache=cache)
+    key = cache.key_for(pdf_data)
+    cache.put(key, ['cached page'])
+
+    assert extracted
+    assert pdf_text.extract_text(pdf_data, cache=cache) == 'cached page\n'
+
+
+def test_protected_entries_are_encrypted(cache):
+    """Test page text of a protected PDF is stored encrypted and read back with its password"""
+    key = cache.key_for(b'%PDF-1.4 data', 'secret')
+
+    cache.put(key, ['account 1234567890'], 'secret')
+
+    with open(cache._path(key), 'rb') as f:
+        stored = f.read()
+    with pytest.raises(zlib.error):
+        zlib.decompress(stored)
+    assert b'1234567890' not in stored
+    assert cache.get(key, 'secret') == ['account 1234567890']
+
+
+def test_iter_pages_caches_protected_pdfs(cache):
+    """Test re-reading a PDF opened with a password is served from the cache"""
+    with open(SAMPLE_PDF, 'rb') as f:
+        pdf_data = f.read()
+
+    extracted = pdf_text.extract_text(pdf_data, 'secret', cache=cache)
+    key = cache.key_for(pdf_data, 'secret')
+    assert cache.get(key, 'secret')
+    cache.put(key, ['cached page'], 'secret')
+
+    assert extracted
+    assert pdf_text.extract_text(pdf_data, 'secret', cache=cache) == 'cached page\n'
+
+
+def test_text_cache_disabled_in_tests(app):
+    """Test that the test config turns the cache off"""
+    assert get_text_cache(app) is None